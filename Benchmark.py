@@ -0,0 +1,346 @@
+#!/usr/bin/python
+# *------------------------------------------------------------ *
+# * Script: Benchmark.py
+# * --------------------
+# * measures the frames per second and per-stage latency of the
+# * synth pipeline (Leap_Synth.synth_main) on synthetic or
+# * recorded frames, for varying numbers of gesture classes and
+# * hmm states
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Frame_Source import Replay_Frame_Source, Synthetic_Frame_Source, generate_synthetic_records, get_synthetic_gesture_types, record_to_frame
+from Gesture import Gesture
+from Gesture_Recognizer import Gesture_Recognizer
+from Gesture_Segmenter import Gesture_Segmenter
+from Max_Interface import Max_Interface
+from Metrics import clock
+from Classification_Scheduler import Classification_Scheduler
+from run import Leap_Synth
+
+#--- Numpy ---
+import numpy as np
+
+
+
+# Class: Benchmark
+# ----------------
+# trains a recognizer on synthetic gestures, then runs Leap_Synth.synth_main
+# itself on replayed or synthetic frames and reads its Metrics
+class Benchmark:
+
+	#--- Stages (in the order they run each frame), then overall timings ---
+	stages = Leap_Synth.synth_stages
+
+	#--- Model ---
+	model_dir 				= None		# temporary classifiers dir the trained model is saved to, for synth_main to load
+
+	#--- Parameters ---
+	window_lengths 			= None		# passed on to Leap_Synth (see run.py --window-lengths)
+	segment 				= False		# wether synth_main classifies segments (see run.py --segment)
+	quiet 					= True		# wether to hide what synth_main prints
+	num_training_examples 	= 20		# per gesture class
+	percentiles 			= [50, 95, 99]
+	num_detection_examples 	= 10		# per gesture class, for the stride sweep
+	max_detection_delay 	= 40		# frames after a gesture ends that a detection of it still counts
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# num_classes synthetic gesture classes, hmms with num_states states
+	def __init__ (self, num_classes, num_states, transport=Max_Interface.BINARY, seed=0):
+
+		self.num_classes 	= num_classes
+		self.num_states 	= num_states
+		self.seed 			= seed
+		self.gesture_types 	= get_synthetic_gesture_types (num_classes)
+		self.transport 		= transport
+		self.model_dir 		= tempfile.mkdtemp ()
+
+
+	# Function: close
+	# ---------------
+	# removes the saved model
+	def close (self):
+
+		shutil.rmtree (self.model_dir, True)
+
+
+
+
+
+
+	########################################################################################################################
+	##############################[ --- Training --- ]######################################################################
+	########################################################################################################################
+
+	# Function: get_training_gestures
+	# -------------------------------
+	# performs each gesture type num_training_examples times with a synthetic
+	# hand; returns a dict gesture_type -> list of the Gestures ending at
+	# the end of each performance
+	def get_training_gestures (self):
+
+		gestures = {}
+		for i, gesture_type in enumerate (self.gesture_types):
+
+			(records, events) = generate_synthetic_records ([gesture_type] * self.num_training_examples, seed=self.seed + i)
+			end_frames = set ([last_frame for (gesture_name, first_frame, last_frame) in events])
+
+			gestures[gesture_type] = []
+			observed_gesture = Gesture ()
+			for frame_index, record in enumerate (records):
+				observed_gesture.add_frame (record_to_frame (record))
+				if frame_index in end_frames and observed_gesture.is_full ():
+					example = Gesture (gesture_type)
+					example.set_observations (observed_gesture.get_observations ())
+					gestures[gesture_type].append (example)
+
+		return gestures
+
+
+	# Function: train
+	# ---------------
+	# returns a Gesture_Recognizer trained on synthetic gestures, its model
+	# saved to model_dir (not the working directory's classifiers/)
+	def train (self):
+
+		gesture_recognizer = Gesture_Recognizer ()
+		gesture_recognizer.classifiers_dir 		= self.model_dir
+		gesture_recognizer.hmms_filename 		= os.path.join (self.model_dir, 'hmms.pkl')
+		gesture_recognizer.classifier_filename 	= os.path.join (self.model_dir, 'classifier.pkl')
+		gesture_recognizer.model_filename 		= os.path.join (self.model_dir, 'model.lrm')
+		gesture_recognizer.gesture_types 	= self.gesture_types
+		gesture_recognizer.gestures 		= self.get_training_gestures ()
+		gesture_recognizer.hmms 			= {}
+		gesture_recognizer.num_hmm_states 	= self.num_states
+		gesture_recognizer.hmm_random_seed 	= self.seed
+		gesture_recognizer.use_feature_cache = False
+
+		gesture_recognizer.get_hmms (print_diagnostics=False)
+		gesture_recognizer.get_all_examples ()
+		gesture_recognizer.training_examples = gesture_recognizer.all_examples
+		gesture_recognizer.train_classifier ()
+		gesture_recognizer.save_model ()
+
+		return gesture_recognizer
+
+
+
+
+
+
+	########################################################################################################################
+	##############################[ --- Running --- ]#######################################################################
+	########################################################################################################################
+
+	# Function: run_synth
+	# -------------------
+	# runs Leap_Synth.synth_main on frame_source with the trained model (and
+	# scheduler, if given) until max_frames frames or the end of the source;
+	# returns the Leap_Synth (its metrics hold the run as a single window, and
+	# its detections every detection) and the wall-clock and CPU seconds taken
+	def run_synth (self, gesture_recognizer, frame_source, max_frames=None, scheduler=None):
+
+		stdout = sys.stdout
+		if self.quiet:
+			sys.stdout = open (os.devnull, 'w')
+		try:
+
+			### Step 1: a Leap_Synth set up as run.py would, with the trained model ###
+			leap_synth = Leap_Synth (self.transport, frame_source, stats_interval=float('inf'), print_stats=False)
+			leap_synth.gesture_recognizer 	= gesture_recognizer
+			leap_synth.scheduler 			= scheduler
+			leap_synth.window_lengths 		= self.window_lengths
+			leap_synth.detections 			= []
+			if self.segment:
+				leap_synth.segmenter 		= Gesture_Segmenter ()
+
+			### Step 2: run it ###
+			start_time = clock ()
+			cpu_start = sum (os.times ()[:2])
+			leap_synth.synth_main (max_frames)
+			cpu_time = sum (os.times ()[:2]) - cpu_start
+			elapsed = clock () - start_time
+			frame_source.stop ()
+
+		finally:
+			if self.quiet:
+				sys.stdout.close ()
+				sys.stdout = stdout
+
+		return (leap_synth, elapsed, cpu_time)
+
+
+	# Function: run
+	# -------------
+	# drives frames from frame_source through synth_main; returns a dict of
+	# results. Stage timings are synth_main's own, per frame: 'frame' is from
+	# when the frame was taken off the source's queue to when its datagram was
+	# sent, and 'latency' from when the source queued it (Frame.queued_time)
+	# to then.
+	def run (self, gesture_recognizer, frame_source, max_frames):
+
+		(leap_synth, elapsed, cpu_time) = self.run_synth (gesture_recognizer, frame_source, max_frames)
+		snapshot = leap_synth.metrics.get_snapshot ()
+
+		### --- summarize (times in microseconds) --- ###
+		num_frames = snapshot['totals']['frames']
+		results = {
+					'num_classes': 			self.num_classes,
+					'num_states': 			self.num_states,
+					'num_frames': 			num_frames,
+					'num_classifications': 	snapshot['totals']['classifications'],
+					'num_detections': 		snapshot['totals']['detections'],
+					'fps': 					num_frames / elapsed
+				}
+		for stage in self.stages:
+			for percentile in self.percentiles:
+				results[stage + '_p' + str(percentile) + '_us'] = snapshot['stages'][stage]['p' + str(percentile) + '_us']
+
+		return results
+
+
+	# Function: run_detection
+	# -----------------------
+	# runs synth_main over a synthetic hand performing every gesture type
+	# num_detection_examples times (as fast as possible), classifying the
+	# windows scheduler picks; returns a dict of results: the detection
+	# delay (frames from the end of a gesture to its detection), the share
+	# of gestures missed, the number of detections that matched no gesture,
+	# and the CPU time used per frame
+	def run_detection (self, gesture_recognizer, scheduler):
+
+		### Step 1: run the synth loop ###
+		frame_source = Synthetic_Frame_Source (self.gesture_types * self.num_detection_examples, speed=None, seed=self.seed + 2000)
+		(leap_synth, elapsed, cpu_time) = self.run_synth (gesture_recognizer, frame_source, scheduler=scheduler)
+		totals = leap_synth.metrics.get_snapshot ()['totals']
+
+		### Step 2: match detections to the gestures performed ###
+		delays = []
+		matched = set ()
+		for (gesture_name, first_frame, last_frame) in frame_source.events:
+			for i, (frame_id, hand_id, prediction) in enumerate (leap_synth.detections):
+				if not i in matched and prediction == gesture_name and first_frame <= frame_id <= last_frame + self.max_detection_delay:
+					delays.append (frame_id - last_frame)
+					matched.add (i)
+					break
+
+		num_events = len(frame_source.events)
+		results = {
+					'num_classes': 			self.num_classes,
+					'num_states': 			self.num_states,
+					'stride': 				scheduler.base_stride,
+					'max_stride': 			scheduler.max_stride,
+					'adaptive': 			scheduler.adaptive,
+					'num_gestures': 		num_events,
+					'miss_rate': 			1.0 - len(delays) / float(max (num_events, 1)),
+					'false_detections': 	len(leap_synth.detections) - len(matched),
+					'classified_ratio': 	totals['classifications'] / float(max (totals['frames'], 1)),
+					'cpu_us_per_frame': 	1e6 * cpu_time / max (totals['frames'], 1)
+				}
+		for percentile, value in zip (self.percentiles, np.percentile (delays or [np.nan], self.percentiles)):
+			results['delay_p' + str(percentile) + '_frames'] = float(value)
+
+		return results
+
+
+
+
+
+
+# Function: print_results
+# -----------------------
+# prints a human-readable table of per-stage percentiles
+def print_results (results):
+
+	print_message ("classes: " + str(results['num_classes']) + " | states: " + str(results['num_states']) + " | fps: " + str(int(results['fps'])) + " | frames: " + str(results['num_frames']))
+	for stage in Benchmark.stages:
+		print "	%-12s" % stage, " ".join (["p%d: %9.1fus" % (p, results[stage + '_p' + str(p) + '_us']) for p in Benchmark.percentiles])
+
+
+# Function: print_detection_results
+# ---------------------------------
+# prints one line of a stride sweep
+def print_detection_results (results):
+
+	stride = str(results['stride']) + ('-' + str(results['max_stride']) + ' (adaptive)' if results['adaptive'] else '')
+	delays = " ".join (["p%d: %5.1f" % (p, results['delay_p' + str(p) + '_frames']) for p in Benchmark.percentiles])
+	print "	stride %-16s delay (frames) %s | missed: %4.1f%% | false: %3d | classified: %5.1f%% | cpu: %7.1fus/frame" % (stride, delays, 100 * results['miss_rate'], results['false_detections'], 100 * results['classified_ratio'], results['cpu_us_per_frame'])
+
+
+
+
+
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser (description="Benchmark the synth pipeline")
+	parser.add_argument ('--classes', default='2,5,10', help="comma-separated numbers of gesture classes")
+	parser.add_argument ('--states', default='7', help="comma-separated numbers of hmm states")
+	parser.add_argument ('--frames', type=int, default=5000, help="frames to run per configuration")
+	parser.add_argument ('--source', default='synthetic', help="'synthetic' or a .npy file of recorded frames")
+	parser.add_argument ('--speed', type=float, default=0, help="replay speed as a multiple of real time (0 = as fast as possible)")
+	parser.add_argument ('--transport', choices=Max_Interface.transports, default=Max_Interface.BINARY)
+	parser.add_argument ('--window-lengths', default=None, help="comma-separated window lengths to score at once (see run.py --window-lengths)")
+	parser.add_argument ('--segment', action='store_true', help="classify each gesture once, when its segment ends (see run.py --segment)")
+	parser.add_argument ('--seed', type=int, default=0)
+	parser.add_argument ('--strides', default=None, help="instead of timing stages, sweep these comma-separated classification strides and report detection delay, miss rate and cpu per frame")
+	parser.add_argument ('--max-stride', type=int, default=None, help="with --strides: also run each stride adaptively, backing off up to this stride")
+	parser.add_argument ('--json', default=None, help="also write the results, one JSON object per line, to this file ('-' for stdout only)")
+	args = parser.parse_args ()
+
+	all_results = []
+	for num_classes in [int(c) for c in args.classes.split (',')]:
+		for num_states in [int(s) for s in args.states.split (',')]:
+
+			benchmark = Benchmark (num_classes, num_states, args.transport, args.seed)
+			benchmark.segment = args.segment
+			if args.window_lengths:
+				benchmark.window_lengths = [int(length) for length in args.window_lengths.split (',')]
+			print_status ("Benchmark", "Training " + str(num_classes) + " classes with " + str(num_states) + " states")
+			gesture_recognizer = benchmark.train ()
+
+			### --- stride sweep --- ###
+			if args.strides:
+				print_message ("classes: " + str(num_classes) + " | states: " + str(num_states))
+				schedulers = [Classification_Scheduler (int(stride), window_lengths=benchmark.window_lengths) for stride in args.strides.split (',')]
+				if args.max_stride:
+					schedulers += [Classification_Scheduler (int(stride), args.max_stride, adaptive=True, window_lengths=benchmark.window_lengths) for stride in args.strides.split (',')]
+				for scheduler in schedulers:
+					results = benchmark.run_detection (gesture_recognizer, scheduler)
+					all_results.append (results)
+					if args.json == '-':
+						print json.dumps (results, sort_keys=True)
+					else:
+						print_detection_results (results)
+				benchmark.close ()
+				continue
+
+			if args.source == 'synthetic':
+				frame_source = Synthetic_Frame_Source (benchmark.gesture_types, speed=args.speed or None, loop=True, seed=args.seed + 1000)
+			else:
+				frame_source = Replay_Frame_Source (args.source, speed=args.speed or None, loop=True)
+
+			results = benchmark.run (gesture_recognizer, frame_source, args.frames)
+			benchmark.close ()
+			all_results.append (results)
+			if args.json == '-':
+				print json.dumps (results, sort_keys=True)
+			else:
+				print_results (results)
+
+	if args.json and args.json != '-':
+		output_file = open (args.json, 'w')
+		for results in all_results:
+			output_file.write (json.dumps (results, sort_keys=True) + '\n')
+		output_file.close ()
@@ -0,0 +1,171 @@
+# *------------------------------------------------------------ *
+# * Class: Classification_Scheduler
+# * -------------------------------
+# * decides on which frames synth mode classifies the observed
+# * gesture: every stride'th window, with the stride either fixed
+# * or adapted to recent confidence and a CPU budget
+# *------------------------------------------------------------ *
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Gesture import Gesture
+from Metrics import clock
+
+#--- Numpy ---
+import numpy as np
+
+
+
+# Class: Classification_Scheduler
+# -------------------------------
+# A window of the observed gesture is classified when its start frame
+# (gesture.frame_count - its length, counted from the last clear) is a
+# multiple of the current stride, as in Forward_Scorer; with several
+# window lengths, each length is due on its own frames. Strides are kept to divisors or multiples
+# of frame_reduction_const, so the windows that are classified all share
+# the same subsampling phase: every subsampled observation on that phase is
+# still part of some classified window, and the Forward_Scorer (created
+# with stride=base_stride) only does work for the frames on it.
+#
+# In adaptive mode the stride backs off while the classifier's confidence
+# stays below confidence_threshold, and drops back to base_stride as soon
+# as it reaches it. Backing off goes to the next allowed stride at least
+# twice the current one (up to max_stride); the allowed strides are the
+# multiples of base_stride that divide or are multiples of
+# frame_reduction_const. If cpu_budget is set, the stride is also kept
+# high enough that classification takes at most that fraction of the time
+# between frames.
+class Classification_Scheduler:
+
+	#--- State ---
+	stride 				= 1
+
+	#--- CPU Tracking ---
+	mean_cost 			= None		# running mean of seconds per classification
+	mean_frame_interval = None		# running mean of seconds between frames
+	last_frame_time 	= None
+	last_frame_count 	= None		# gesture.frame_count at last_frame_time
+
+	#--- Parameters ---
+	base_stride 			= 1
+	max_stride 				= 1
+	adaptive 				= False
+	strides 				= []		# allowed strides from base_stride to max_stride, ascending
+	confidence_threshold 	= 0.5		# max class probability at which the stride drops back to base_stride
+	cpu_budget 				= None		# maximum fraction of frame time to spend classifying; None for no limit
+	smoothing 				= 0.1		# weight of the newest sample in the running means
+	window_lengths 			= None		# (num_lengths,) lengths (in frames) of the windows scheduled, as passed to Forward_Scorer
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# base_stride must divide or be a multiple of frame_reduction_const (the
+	# one the windows are subsampled with, see Gesture.get_frame_reduction_const);
+	# max_stride (adaptive mode only) must too, be a multiple of base_stride,
+	# and be at most the shortest of window_lengths (so that every frame is
+	# in some window of each length that is classified). window_lengths
+	# defaults to just Gesture.gesture_length
+	def __init__ (self, base_stride=Gesture.frame_reduction_const, max_stride=None, adaptive=False, confidence_threshold=0.5, cpu_budget=None, frame_reduction_const=Gesture.frame_reduction_const, window_lengths=None):
+
+		if base_stride < 1 or (frame_reduction_const % base_stride != 0 and base_stride % frame_reduction_const != 0):
+			print_error ("Classification Scheduler", "base_stride (" + str(base_stride) + ") must divide or be a multiple of frame_reduction_const (" + str(frame_reduction_const) + ")")
+
+		self.base_stride 			= base_stride
+		self.max_stride 			= max_stride or base_stride
+		self.adaptive 				= adaptive
+		self.confidence_threshold 	= confidence_threshold
+		self.cpu_budget 			= cpu_budget
+		self.window_lengths 		= np.array (window_lengths or [Gesture.gesture_length], dtype=int)
+
+		if self.max_stride % self.base_stride != 0 or (frame_reduction_const % self.max_stride != 0 and self.max_stride % frame_reduction_const != 0):
+			print_error ("Classification Scheduler", "max_stride (" + str(self.max_stride) + ") must be a multiple of base_stride (" + str(base_stride) + ") that divides or is a multiple of frame_reduction_const (" + str(frame_reduction_const) + ")")
+		if self.max_stride > self.window_lengths.min ():
+			print_error ("Classification Scheduler", "max_stride (" + str(self.max_stride) + ") must not exceed the window length (" + str(self.window_lengths.min ()) + ")")
+
+		self.strides = [stride for stride in range(self.base_stride, self.max_stride + 1, self.base_stride) if frame_reduction_const % stride == 0 or stride % frame_reduction_const == 0]
+
+		self.reset ()
+
+
+	# Function: reset
+	# ---------------
+	# back to base_stride, with counters zeroed
+	def reset (self):
+
+		self.stride 				= self.base_stride
+		self.mean_cost 				= None
+		self.mean_frame_interval 	= None
+		self.last_frame_time 		= None
+		self.last_frame_count 		= None
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Scheduling --- ]##########################################################
+	########################################################################################################################
+
+	# Function: should_classify
+	# -------------------------
+	# call for each frame that may be classified (e.g. that the motion gate
+	# let through), after the frame was added to gesture; returns a
+	# (num_lengths,) boolean array of wether to classify gesture's current
+	# window of each of window_lengths
+	def should_classify (self, gesture):
+
+		### Step 1: keep track of the frame rate, from consecutive frames only ###
+		now = clock ()
+		if self.last_frame_time is not None and gesture.frame_count == self.last_frame_count + 1:
+			self.mean_frame_interval = self.update_mean (self.mean_frame_interval, now - self.last_frame_time)
+		self.last_frame_time = now
+		self.last_frame_count = gesture.frame_count
+
+		### Step 2: only full windows that start on the stride ###
+		return (gesture.num_frames >= self.window_lengths) & ((gesture.frame_count - self.window_lengths) % self.stride == 0)
+
+
+	# Function: report
+	# ----------------
+	# call after each classification with the classifier's highest
+	# probability and the seconds it took (hmm scoring included)
+	def report (self, max_probability, cost):
+
+		self.mean_cost = self.update_mean (self.mean_cost, cost)
+		if not self.adaptive:
+			return
+
+		### Step 1: back off while nothing looks like a gesture; snap back when something does ###
+		if max_probability >= self.confidence_threshold:
+			stride = self.base_stride
+		else:
+			stride = self.get_backoff_stride (self.stride)
+
+		### Step 2: stay within the cpu budget ###
+		if self.cpu_budget and self.mean_frame_interval:
+			while stride < self.max_stride and self.mean_cost / stride > self.cpu_budget * self.mean_frame_interval:
+				stride = self.get_backoff_stride (stride)
+
+		self.stride = stride
+
+
+	# Function: get_backoff_stride
+	# ----------------------------
+	# the smallest allowed stride at least twice 'stride'; max_stride if there is none
+	def get_backoff_stride (self, stride):
+
+		for backoff_stride in self.strides:
+			if backoff_stride >= 2 * stride:
+				return backoff_stride
+		return self.max_stride
+
+
+	# Function: update_mean
+	# ---------------------
+	# exponentially-weighted running mean
+	def update_mean (self, mean, value):
+
+		if mean is None:
+			return value
+		return (1.0 - self.smoothing) * mean + self.smoothing * value
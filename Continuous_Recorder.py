@@ -0,0 +1,254 @@
+# *------------------------------------------------------------ *
+# * Class: Continuous_Recorder
+# * --------------------------
+# * records continuously into a bounded ring of raw frames; the
+# * operator marks gestures after making them, and the examples
+# * are cut out of the ring and saved on a background thread
+# *------------------------------------------------------------ *
+#--- Standard ---
+import threading
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Frame_Source import record_width, frame_to_record, TIMESTAMP
+from Frame_Queue import Frame_Queue
+from Frame_Log import records_to_observations, cut_gesture
+from Gesture import Gesture
+
+#--- Numpy ---
+import numpy as np
+
+
+
+# Class: Frame_Ring
+# -----------------
+# the last 'size' frames' records, in a preallocated array. Frames are
+# numbered from 0 in the order they were added; frames [get_oldest_index (),
+# num_frames) are still in the ring. Safe to add to from one thread while
+# another reads.
+class Frame_Ring:
+
+	#--- Data ---
+	records 	= None		# (size, record_width); frame i is at row i % size
+	num_frames 	= 0			# frames added so far
+	lock 		= None
+
+	#--- Parameters ---
+	size 		= 6000		# ~60 seconds at 100 fps, ~670KB
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# allocates the ring
+	def __init__ (self, size=6000):
+
+		self.size 		= size
+		self.records 	= np.zeros ((size, record_width))
+		self.num_frames = 0
+		self.lock 		= threading.Lock ()
+
+
+	# Function: add_frame
+	# -------------------
+	# adds a (Leap or stand-in) frame, overwriting the oldest once the ring is full
+	def add_frame (self, frame):
+
+		record = frame_to_record (frame)
+		with self.lock:
+			self.records[self.num_frames % self.size] = record
+			self.num_frames += 1
+
+
+	# Function: get_oldest_index
+	# --------------------------
+	# number of the oldest frame still in the ring
+	def get_oldest_index (self):
+
+		return max (self.num_frames - self.size, 0)
+
+
+	# Function: get_newest_timestamp
+	# ------------------------------
+	# timestamp of the newest frame (seconds); None if there are none
+	def get_newest_timestamp (self):
+
+		with self.lock:
+			if self.num_frames == 0:
+				return None
+			return self.records[(self.num_frames - 1) % self.size, TIMESTAMP]
+
+
+	# Function: get_records
+	# ---------------------
+	# returns a copy of the records of frames [start_index, end_index), clipped
+	# to those still in the ring, and the number of the first one returned
+	def get_records (self, start_index, end_index):
+
+		with self.lock:
+			start_index = max (start_index, self.get_oldest_index ())
+			end_index = min (end_index, self.num_frames)
+			rows = np.arange (start_index, max (end_index, start_index)) % self.size
+			return (self.records.take (rows, axis=0), start_index)
+
+
+	# Function: find_frame
+	# --------------------
+	# returns the number of the last frame before end_index with a timestamp
+	# at or before 'timestamp'; None if it is no longer in the ring
+	def find_frame (self, timestamp, end_index):
+
+		with self.lock:
+			start_index = self.get_oldest_index ()
+			rows = np.arange (start_index, min (end_index, self.num_frames)) % self.size
+			timestamps = self.records[rows, TIMESTAMP]
+
+		position = np.searchsorted (timestamps, timestamp, 'right') - 1
+		if position < 0:
+			return None
+		return start_index + position
+
+
+
+
+
+# Class: Continuous_Recorder
+# --------------------------
+# Every frame goes into a Frame_Ring. mark () says a gesture ended at a
+# given time (now, or some seconds ago); a background thread then cuts the
+# gesture_length frames that ended then out of the ring, featurizes them
+# (with enough frames before them for the derivatives, so they match what
+# Gesture.add_frame would have made live) and hands the Gesture to 'save',
+# e.g. Gesture_Recognizer.save_gesture. If a frame_log (Frame_Log_Writer)
+# is given, each example's timestamps are also recorded in it.
+class Continuous_Recorder:
+
+	#--- Member Objects ---
+	frame_ring 		= None		# Frame_Ring
+	save 			= None		# function taking each extracted Gesture
+	frame_log 		= None		# Frame_Log_Writer the examples' timestamps are recorded in; None if not used
+	mark_queue 		= None		# Frame_Queue of (gesture_type, end_timestamp, end_index) for the extraction thread
+	thread 			= None
+
+	#--- Counters ---
+	num_marked 		= 0
+	num_saved 		= 0
+	num_lost 		= 0			# marks whose frames weren't all in the ring, or had no hand in them
+
+	#--- Parameters ---
+	gesture_length 	= Gesture.gesture_length	# frames per example
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# keeps the last ring_size frames; examples are passed to save
+	def __init__ (self, save, ring_size=6000, gesture_length=Gesture.gesture_length, frame_log=None):
+
+		self.frame_ring 	= Frame_Ring (ring_size)
+		self.save 			= save
+		self.frame_log 		= frame_log
+		self.gesture_length = gesture_length
+		self.mark_queue 	= Frame_Queue (max_size=1024, overflow_policy=Frame_Queue.BLOCK)
+		self.num_marked 	= 0
+		self.num_saved 		= 0
+		self.num_lost 		= 0
+
+
+	# Function: start
+	# ---------------
+	# starts the extraction thread
+	def start (self):
+
+		self.thread = threading.Thread (target=self.extract)
+		self.thread.daemon = True
+		self.thread.start ()
+
+
+	# Function: close
+	# ---------------
+	# waits for the examples that were marked to be saved
+	def close (self):
+
+		self.mark_queue.close ()
+		if self.thread:
+			self.thread.join ()
+
+
+	# Function: add_frame
+	# -------------------
+	# adds a frame to the ring
+	def add_frame (self, frame):
+
+		self.frame_ring.add_frame (frame)
+
+
+	# Function: mark
+	# --------------
+	# says a gesture of gesture_type ended seconds_ago seconds before the
+	# newest frame; returns immediately (the example is cut out and saved on
+	# the extraction thread)
+	def mark (self, gesture_type, seconds_ago=0.0):
+
+		newest_timestamp = self.frame_ring.get_newest_timestamp ()
+		if newest_timestamp is None:
+			return
+
+		self.mark_queue.put ((gesture_type, newest_timestamp - seconds_ago, self.frame_ring.num_frames))
+		self.num_marked += 1
+
+
+	# Function: extract
+	# -----------------
+	# thread body: cuts each marked example out of the ring and saves it,
+	# until the queue is closed and drained
+	def extract (self):
+
+		while True:
+
+			item = self.mark_queue.get ()
+			if item is None:
+				return
+
+			(gesture_type, end_timestamp, end_index) = item
+			gesture = self.extract_gesture (gesture_type, end_timestamp, end_index)
+			if gesture is None:
+				self.num_lost += 1
+				continue
+
+			self.save (gesture)
+			self.num_saved += 1
+
+
+	# Function: extract_gesture
+	# -------------------------
+	# returns the Gesture of the gesture_length frames up to end_timestamp
+	# (looking only at frames before end_index), or None if they are no
+	# longer in the ring or the hand wasn't seen throughout
+	def extract_gesture (self, gesture_type, end_timestamp, end_index):
+
+		### Step 1: find the example's last frame ###
+		last_index = self.frame_ring.find_frame (end_timestamp, end_index)
+		if last_index is None:
+			print_inner_status ("Continuous Recorder", "The " + gesture_type + " gesture is no longer in the ring; skipping it")
+			return None
+
+		### Step 2: copy out its frames, and the ones its derivatives look back to ###
+		first_index = last_index - self.gesture_length + 1
+		(records, start_index) = self.frame_ring.get_records (first_index - Gesture.d2_length - 1, last_index + 1)
+		if start_index > first_index:
+			print_inner_status ("Continuous Recorder", "The " + gesture_type + " gesture is no longer in the ring; skipping it")
+			return None
+
+		### Step 3: featurize them and cut out the example ###
+		timestamps = records[:, TIMESTAMP]
+		gesture = cut_gesture (gesture_type, records_to_observations (records), timestamps, timestamps[first_index - start_index], timestamps[-1])
+		if gesture is None or gesture.num_frames < self.gesture_length:
+			print_inner_status ("Continuous Recorder", "The hand wasn't seen throughout the " + gesture_type + " gesture; skipping it")
+			return None
+
+		### Step 4: note it in the frame log ###
+		if self.frame_log:
+			self.frame_log.add_gesture (gesture_type, timestamps[first_index - start_index], timestamps[-1])
+
+		return gesture
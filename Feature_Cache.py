@@ -0,0 +1,203 @@
+# *------------------------------------------------------------ *
+# * Class: Feature_Cache
+# * --------------------
+# * persistent cache of hmm scores (the classifier's features),
+# * keyed by (example content hash, hmm parameter hash), so that
+# * an example is never scored twice against the same hmm
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+
+#--- Numpy ---
+import numpy as np
+
+
+
+# Class: Feature_Cache
+# --------------------
+# Scores are kept in a dense (num examples, num models) matrix, NaN where
+# a pair hasn't been scored, and saved as a single .npz file along with
+# the row and column hashes (see Gesture_Recognizer.get_example_hash and
+# HMM_Bank.get_model_hashes). Retraining adds a column per changed hmm;
+# once there are more than max_models, the least recently used columns
+# are dropped on save.
+class Feature_Cache:
+
+	#--- Data ---
+	example_hashes 		= []		# row keys
+	model_hashes 		= []		# column keys
+	scores 				= None		# (len(example_hashes), len(model_hashes)); NaN where not cached
+	model_last_used 	= None		# (len(model_hashes),) value of use_count when each column was last read or written
+	use_count 			= 0
+
+	#--- Indices ---
+	example_index 		= {}		# example hash -> row
+	model_index 		= {}		# model hash -> column
+
+	#--- File ---
+	filename 			= None
+	is_dirty 			= False		# wether there are changes that aren't saved
+
+	#--- Parameters ---
+	max_models 			= 256		# columns kept on save
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# loads the cache in filename if there is one; empty otherwise
+	def __init__ (self, filename=None):
+
+		self.filename = filename
+		self.clear ()
+		if filename is not None and os.path.exists (filename):
+			self.load ()
+
+
+	# Function: clear
+	# ---------------
+	# empties the cache (the file is left alone until the next save)
+	def clear (self):
+
+		self.example_hashes 	= []
+		self.model_hashes 		= []
+		self.scores 			= np.zeros ((0, 0))
+		self.model_last_used 	= np.zeros (0, dtype=int)
+		self.use_count 			= 0
+		self.example_index 		= {}
+		self.model_index 		= {}
+		self.is_dirty 			= False
+
+
+	# Function: get_num_scores
+	# ------------------------
+	# number of (example, model) pairs cached
+	def get_num_scores (self):
+
+		return int(np.sum (~np.isnan (self.scores)))
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Lookup --- ]##############################################################
+	########################################################################################################################
+
+	# Function: get_scores
+	# --------------------
+	# returns the (len(example_hashes), len(model_hashes)) matrix of cached
+	# scores, NaN for pairs that aren't cached
+	def get_scores (self, example_hashes, model_hashes):
+
+		scores = np.empty ((len(example_hashes), len(model_hashes)))
+		scores.fill (np.nan)
+
+		### Step 1: find the rows and columns the cache has ###
+		rows = [(i, self.example_index[example_hash]) for i, example_hash in enumerate (example_hashes) if example_hash in self.example_index]
+		columns = [(m, self.model_index[model_hash]) for m, model_hash in enumerate (model_hashes) if model_hash in self.model_index]
+		if len(rows) == 0 or len(columns) == 0:
+			return scores
+
+		### Step 2: copy them out ###
+		(indices, cache_rows) = zip (*rows)
+		(models, cache_columns) = zip (*columns)
+		scores[np.ix_ (indices, models)] = self.scores[np.ix_ (cache_rows, cache_columns)]
+		self.use_count += 1
+		self.model_last_used[list(cache_columns)] = self.use_count
+		return scores
+
+
+	# Function: add_scores
+	# --------------------
+	# caches a (len(example_hashes), len(model_hashes)) matrix of scores;
+	# NaN entries are ignored
+	def add_scores (self, example_hashes, model_hashes, scores):
+
+		### Step 1: add rows and columns for new hashes ###
+		new_examples = [example_hash for example_hash in set (example_hashes) if not example_hash in self.example_index]
+		new_models = [model_hash for model_hash in set (model_hashes) if not model_hash in self.model_index]
+		for example_hash in new_examples:
+			self.example_index[example_hash] = len(self.example_hashes)
+			self.example_hashes.append (example_hash)
+		for model_hash in new_models:
+			self.model_index[model_hash] = len(self.model_hashes)
+			self.model_hashes.append (model_hash)
+		if len(new_examples) > 0 or len(new_models) > 0:
+			grown_scores = np.empty ((len(self.example_hashes), len(self.model_hashes)))
+			grown_scores.fill (np.nan)
+			grown_scores[:self.scores.shape[0], :self.scores.shape[1]] = self.scores
+			self.scores = grown_scores
+			self.model_last_used = np.append (self.model_last_used, np.zeros (len(new_models), dtype=int))
+
+		### Step 2: fill them in ###
+		scores = np.asarray (scores, dtype=float)
+		cache_rows = [self.example_index[example_hash] for example_hash in example_hashes]
+		cache_columns = [self.model_index[model_hash] for model_hash in model_hashes]
+		is_scored = ~np.isnan (scores)
+		self.scores[np.ix_ (cache_rows, cache_columns)] = np.where (is_scored, scores, self.scores[np.ix_ (cache_rows, cache_columns)])
+		self.use_count += 1
+		self.model_last_used[cache_columns] = self.use_count
+		self.is_dirty = True
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Saving/Loading --- ]######################################################
+	########################################################################################################################
+
+	# Function: save
+	# --------------
+	# writes the cache to self.filename (if anything changed), keeping the
+	# max_models most recently used columns
+	def save (self):
+
+		if not self.is_dirty:
+			return
+
+		### Step 1: drop the least recently used columns ###
+		if len(self.model_hashes) > self.max_models:
+			kept = np.sort (np.argsort (-self.model_last_used, kind='mergesort')[:self.max_models])
+			self.model_hashes 		= [self.model_hashes[m] for m in kept]
+			self.model_last_used 	= self.model_last_used[kept]
+			self.scores 			= self.scores[:, kept]
+			self.model_index 		= dict ([(model_hash, m) for m, model_hash in enumerate (self.model_hashes)])
+
+		### Step 2: write it out (via a temporary file, so readers never see half of one) ###
+		directory = os.path.dirname (self.filename)
+		if directory and not os.path.exists (directory):
+			os.makedirs (directory)
+		temporary_filename = self.filename + '.tmp'
+		cache_file = open (temporary_filename, 'wb')
+		np.savez (cache_file, 	example_hashes=np.array (self.example_hashes, dtype='S16'),
+								model_hashes=np.array (self.model_hashes, dtype='S16'),
+								scores=self.scores,
+								model_last_used=self.model_last_used)
+		cache_file.close ()
+		os.rename (temporary_filename, self.filename)
+		self.is_dirty = False
+
+
+	# Function: load
+	# --------------
+	# reads the cache from self.filename
+	def load (self):
+
+		cache_file = np.load (self.filename)
+		self.example_hashes 	= [str(example_hash) for example_hash in cache_file['example_hashes']]
+		self.model_hashes 		= [str(model_hash) for model_hash in cache_file['model_hashes']]
+		self.scores 			= np.array (cache_file['scores'], dtype=float).reshape ((len(self.example_hashes), len(self.model_hashes)))
+		self.model_last_used 	= np.array (cache_file['model_last_used'], dtype=int)
+		cache_file.close ()
+
+		self.use_count 		= int(self.model_last_used.max ()) if len(self.model_last_used) > 0 else 0
+		self.example_index 	= dict ([(example_hash, i) for i, example_hash in enumerate (self.example_hashes)])
+		self.model_index 	= dict ([(model_hash, m) for m, model_hash in enumerate (self.model_hashes)])
+		self.is_dirty 		= False
@@ -0,0 +1,240 @@
+# *------------------------------------------------------------ *
+# * Class: Forward_Scorer
+# * ---------------------
+# * keeps forward-algorithm state for every gesture hmm so that
+# * the scores of a gesture's hmm rep can be updated per frame
+# * instead of being recomputed from scratch
+# *------------------------------------------------------------ *
+#--- Numpy ---
+import numpy as np
+
+#--- My Files ---
+from common_utilities import print_error
+from Gesture import Gesture
+from hmm_utilities import logsumexp
+
+
+
+# Class: Forward_Scorer
+# ---------------------
+# The hmm rep of a window that starts at frame w and ends at frame t is
+# O[w], O[w + k], O[w + 2k], ... (k = frame_reduction_const), followed
+# by O[t] unless it is one of those. We keep one forward 'chain' per
+# possible start frame w; each new observation advances the chains whose
+# next strided frame it is (one (S, S) step each) and the window's score
+# is a single extra step of the chain at the window's start (none if the
+# chain just advanced on O[t]).
+#
+# In sliding-window mode (the default) the window is the last
+# gesture_length frames, exactly as in Gesture.get_hmm_rep, so the scores
+# equal hmm.score (gesture.get_hmm_rep ()). Otherwise the window grows
+# from the last reset and only one chain is kept.
+#
+# With a stride > 1 (sliding-window mode only), only windows whose start
+# frame is a multiple of the stride are scored, so only those chains are
+# kept, and observations that neither start, advance nor end one of them
+# are skipped entirely. With a stride that is a multiple of
+# frame_reduction_const, that leaves two observations in every
+# frame_reduction_const to do any work for.
+#
+# With window_lengths (sliding-window mode only), the windows of each of
+# those lengths that end at the current frame are scored at once. A
+# chain only depends on its start frame, so the chains are shared by all
+# lengths, and each extra length costs one more closing step; the scores
+# are then (num_lengths, num_models), with NaN rows for windows that are
+# not full yet or not scored (see stride).
+#
+# With length_normalized, each window's scores are divided by the length
+# of its hmm rep, as Gesture_Recognizer.score_hmm_reps does.
+class Forward_Scorer:
+
+	#--- Models ---
+	hmm_bank 		= None		# HMM_Bank of all models; scores come back in hmm_bank.gesture_types order
+
+	#--- State ---
+	chains 			= None		# (num_chains, M, S) log forward variables, one row per start frame
+	num_observations = 0		# index (since the gesture was last cleared) of the next observation
+	first_observation = 0		# index of the first observation added since the last reset
+	frame_count 	= 0			# gesture.frame_count this scorer is in sync with
+	scores 			= None		# (num_models,) scores of the current window (or (num_lengths, num_models), see window_lengths); None if it is not scored
+
+	#--- Parameters ---
+	gesture_length 			= Gesture.gesture_length
+	frame_reduction_const 	= Gesture.frame_reduction_const
+	sliding_window 			= True
+	stride 					= 1			# score the windows starting at every stride'th frame
+	window_lengths 			= None		# (num_lengths,) lengths of the windows scored; just gesture_length unless multi_scale
+	multi_scale 			= False		# wether window_lengths were given
+	length_normalized 		= False		# wether scores are divided by the length of the window's hmm rep
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# takes the HMM_Bank to score against; with window_lengths, gesture_length
+	# is the longest of them
+	def __init__ (self, hmm_bank, sliding_window=True, gesture_length=Gesture.gesture_length, frame_reduction_const=Gesture.frame_reduction_const, stride=1, window_lengths=None, length_normalized=False):
+
+		### Step 1: set parameters ###
+		self.sliding_window 		= sliding_window
+		self.stride 				= stride if sliding_window else 1
+		self.multi_scale 			= sliding_window and window_lengths is not None
+		if self.multi_scale:
+			if min (window_lengths) < 1:
+				print_error ("Forward Scorer", "window lengths must be at least 1")
+			gesture_length = max (window_lengths)
+		self.gesture_length 		= gesture_length
+		self.window_lengths 		= np.array (window_lengths if self.multi_scale else [gesture_length], dtype=int)
+		self.frame_reduction_const 	= frame_reduction_const
+		self.length_normalized 		= length_normalized
+
+		### Step 2: the models ###
+		self.hmm_bank = hmm_bank
+
+		### Step 3: strides (in frames) back to the chains that each observation advances ###
+		self.chain_offsets 	= self.frame_reduction_const * np.arange (1, (self.gesture_length - 1) // self.frame_reduction_const + 1)
+
+		self.reset ()
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Updating --- ]############################################################
+	########################################################################################################################
+
+	# Function: reset
+	# ---------------
+	# forgets all observations
+	def reset (self):
+
+		num_chains = self.gesture_length if self.sliding_window else 1
+		self.chains = np.empty ((num_chains,) + self.hmm_bank.log_startprob.shape)
+		self.num_observations 	= 0
+		self.first_observation 	= 0
+		self.frame_count 		= 0
+		self.scores 			= None
+
+
+	# Function: get_rep_lengths
+	# -------------------------
+	# returns the lengths of the hmm reps of windows of num_frames frames
+	# (see Gesture.get_hmm_rep_positions)
+	def get_rep_lengths (self, num_frames):
+
+		return (num_frames + self.frame_reduction_const - 1) // self.frame_reduction_const + ((num_frames - 1) % self.frame_reduction_const != 0)
+
+
+	# Function: add_observation
+	# -------------------------
+	# advances the forward state with a new observation; returns the
+	# (num_models,) array of log-likelihoods of the current window (or the
+	# (num_lengths, num_models) array, see window_lengths), or None if no
+	# window is scored (see stride)
+	def add_observation (self, observation):
+
+		t = self.num_observations
+		self.num_observations += 1
+		bank = self.hmm_bank
+		chains = self.chains
+
+		if self.sliding_window:
+
+			### Step 1: find the chains this observation starts, advances or closes off ###
+			num_advancing = min (len(self.chain_offsets), (t - self.first_observation) // self.frame_reduction_const)
+			starts = t - self.chain_offsets[:num_advancing]
+			if self.stride > 1:
+				starts = starts[starts % self.stride == 0]
+			window_starts = t - self.window_lengths + 1
+			is_scored = window_starts % self.stride == 0
+			if self.multi_scale:
+				is_scored &= window_starts >= self.first_observation
+			else:
+				window_starts = np.maximum (window_starts, self.first_observation)
+				is_scored &= window_starts % self.stride == 0
+			is_start = t % self.stride == 0
+			if len(starts) == 0 and not is_start and not is_scored.any ():
+				self.scores = None
+				return None
+			log_b = bank.log_emission_densities (observation)[0]		# (M, S)
+
+			### Step 2: advance the chains for which this is the next strided frame ###
+			if len(starts) > 0:
+				rows = starts % self.gesture_length
+				chains[rows] = bank.forward_step (chains[rows], log_b)
+
+			### Step 3: start a chain at this frame ###
+			if is_start:
+				chains[t % self.gesture_length] = bank.log_startprob + log_b
+
+			### Step 4: find the chains at the start of the scored windows ###
+			if not is_scored.any ():
+				self.scores = None
+				return None
+			window_starts = window_starts[is_scored]
+			window_chains = chains[window_starts % self.gesture_length]
+
+		else:
+
+			log_b = bank.log_emission_densities (observation)[0]		# (M, S)
+
+			### Step 1: start or advance the single chain ###
+			if t == self.first_observation:
+				chains[0] = bank.log_startprob + log_b
+			elif (t - self.first_observation) % self.frame_reduction_const == 0:
+				chains[0] = bank.forward_step (chains[0:1], log_b)[0]
+
+			### Step 2: the window is that chain's ###
+			window_starts = np.array ([self.first_observation])
+			window_chains = chains[0:1]
+
+		### --- close off the windows' chains with this observation, unless they just advanced on it --- ###
+		log_alpha = bank.forward_step (window_chains, log_b)
+		is_closed = (t - window_starts) % self.frame_reduction_const == 0
+		if is_closed.any ():
+			log_alpha[is_closed] = window_chains[is_closed]
+		scores = logsumexp (log_alpha, axis=2)
+		if self.length_normalized:
+			scores = scores / self.get_rep_lengths (t - window_starts + 1)[:, np.newaxis]
+
+		if self.multi_scale:
+			self.scores = np.empty ((len(self.window_lengths), bank.get_num_models ()))
+			self.scores.fill (np.nan)
+			self.scores[is_scored] = scores
+		else:
+			self.scores = scores[0]
+		return self.scores
+
+
+	# Function: update
+	# ----------------
+	# brings the scorer in sync with the passed gesture and returns the
+	# scores of its current window (None if the gesture is empty or the
+	# window is not scored). When
+	# called once per added frame this costs one observation's worth of
+	# work; if the gesture was cleared or frames were missed, the window
+	# is replayed from the gesture's observations (numbered as they were in
+	# the gesture, so strided windows stay where they were).
+	def update (self, gesture):
+
+		### Step 1: nothing to score ###
+		if gesture.frame_count == 0:
+			self.reset ()
+			return None
+
+		### Step 2: exactly one new frame - the common case ###
+		if gesture.frame_count == self.frame_count + 1:
+			self.add_observation (gesture.get_newest_observation ())
+
+		### Step 3: out of sync - replay what the gesture still holds ###
+		elif gesture.frame_count != self.frame_count:
+			self.reset ()
+			self.num_observations 	= gesture.frame_count - gesture.num_frames
+			self.first_observation 	= self.num_observations
+			for observation in gesture.get_observations ():
+				self.add_observation (observation)
+
+		self.frame_count = gesture.frame_count
+		return self.scores
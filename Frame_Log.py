@@ -0,0 +1,606 @@
+#!/usr/bin/python
+# *------------------------------------------------------------ *
+# * Class: Frame_Log
+# * ----------------
+# * append-only log of raw frame records, in compressed chunks,
+# * with an index of the chunks' timestamps and of the gestures
+# * recorded in it, so examples can be re-featurized offline
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+import sys
+import zlib
+import struct
+import threading
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Frame_Source import record_fields, record_width, frame_to_records, records_to_positional_features, get_hand_records, TIMESTAMP, HAS_HAND
+from Frame_Queue import Frame_Queue
+from Gesture import Gesture
+from Position import Position, compute_features_batch
+
+#--- Numpy ---
+import numpy as np
+
+
+
+#--- Chunk Layout ---
+# magic (4 bytes), number of records, compressed length, CRC32 of the
+# compressed data (uint32s), then the zlib-compressed records: float64,
+# little-endian, one column after another (which compresses better than
+# one row after another, as most columns barely change from frame to frame)
+chunk_magic 		= 'FLCK'
+chunk_header_format = '<4sIII'
+chunk_header_size 	= struct.calcsize (chunk_header_format)
+record_dtype 		= np.dtype ('<f8')
+
+
+
+# Function: records_to_observations
+# ---------------------------------
+# given (N, record_width) records of consecutive frames, one per frame (see
+# Frame_Source.get_hand_records), returns the (N, num_features)
+# observations Gesture.add_frame would make of them, all at once: the
+# derivatives start over wherever the hand went missing, as a Gesture
+# clears then, and at the rows in restarts (e.g. where frames were lost,
+# see Frame_Log.get_restarts). Rows of records without a hand are NaN.
+def records_to_observations (records, restarts=None, d1_length=Gesture.d1_length, d2_length=Gesture.d2_length):
+
+	observations = np.empty ((len(records), Position.num_features))
+	observations.fill (np.nan)
+	if len(records) == 0:
+		return observations
+
+	### Step 1: find the runs of frames with a hand ###
+	has_hand = records[:, HAS_HAND] != 0
+	is_run_start = has_hand.copy ()
+	is_run_start[1:] &= ~has_hand[:-1]
+	if restarts is not None:
+		is_run_start[restarts] = has_hand[restarts]
+	run_starts = np.flatnonzero (is_run_start)
+	run_boundaries = np.append (np.flatnonzero (is_run_start | ~has_hand), len(records))
+	run_ends = run_boundaries[np.searchsorted (run_boundaries, run_starts, 'right')]
+
+	### Step 2: featurize each run ###
+	positional_features = records_to_positional_features (records)
+	for (start, end) in zip (run_starts, run_ends):
+		observations[start:end] = compute_features_batch (positional_features[start:end], d1_length, d2_length)
+
+	return observations
+
+
+# Function: get_frame_interval
+# ----------------------------
+# given the timestamps of consecutive frames, returns the (median) seconds
+# between them, to the microsecond the timestamps have; None if there are
+# too few to tell
+def get_frame_interval (timestamps):
+
+	intervals = np.diff (timestamps)
+	intervals = intervals[intervals > 0]
+	if len(intervals) == 0:
+		return None
+	return round (float(np.median (intervals)), 6)
+
+
+# Function: cut_gesture
+# ---------------------
+# given the observations of consecutive records (see records_to_observations)
+# and their timestamps, returns a Gesture of gesture_type holding those
+# between start_timestamp and end_timestamp - only the part after the hand
+# was last missing (or after the last of the rows in restarts), as a
+# Gesture recording them live would - or None if the hand wasn't seen at
+# the end of it
+def cut_gesture (gesture_type, observations, timestamps, start_timestamp, end_timestamp, restarts=None):
+
+	### Step 1: find the rows ###
+	start = np.searchsorted (timestamps, start_timestamp, 'left')
+	end = np.searchsorted (timestamps, end_timestamp, 'right')
+	missing = np.flatnonzero (np.isnan (observations[start:end, 0]))
+	if len(missing) > 0:
+		start += missing[-1] + 1
+	if restarts is not None:
+		later_restarts = restarts[(restarts > start) & (restarts < end)]
+		if len(later_restarts) > 0:
+			start = later_restarts[-1]
+	if end <= start:
+		return None
+
+	### Step 2: make the gesture ###
+	gesture = Gesture (name=gesture_type)
+	gesture.set_observations (observations[start:end], get_frame_interval (timestamps[start:end]))
+	return gesture
+
+
+
+# Class: Frame_Log
+# ----------------
+# On disk, a log is a directory containing:
+#	- frames.log: the chunks, back to back
+#	- index.txt: a 'fields' header line, then tab-separated lines of
+#	  'chunk offset length num_records first_timestamp last_timestamp',
+#	  'gesture gesture_type start_timestamp end_timestamp' or
+#	  'gap first_timestamp last_timestamp' (frames that were lost, e.g.
+#	  a chunk the writer dropped)
+# Both files are only ever appended to, and a chunk is written before its
+# index line, so an interrupted write never leaves the index pointing past
+# the end of the chunks. Records are those of Frame_Source (one per hand);
+# a frame's records are never split across chunks.
+class Frame_Log:
+
+	#--- Filenames ---
+	log_dir 			= None
+	log_filename 		= None
+	index_filename 		= None
+
+	#--- Index ---
+	chunks 				= []		# list of (offset, length, num_records, first_timestamp, last_timestamp), one per chunk
+	gestures 			= []		# list of (gesture_type, start_timestamp, end_timestamp), one per recorded gesture
+	gaps 				= []		# list of (first_timestamp, last_timestamp), one per run of lost frames
+	num_records 		= 0			# total number of records in the log
+
+	#--- Parameters ---
+	compression_level 	= 6
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# points the log at a directory and reads its index, if it exists
+	def __init__ (self, log_dir):
+
+		### Step 1: set filenames ###
+		self.log_dir 		= log_dir
+		self.log_filename 	= os.path.join (log_dir, 'frames.log')
+		self.index_filename = os.path.join (log_dir, 'index.txt')
+
+		### Step 2: read in the index ###
+		self.chunks 		= []
+		self.gestures 		= []
+		self.gaps 			= []
+		self.num_records 	= 0
+		if self.exists ():
+			self.load_index ()
+
+
+
+
+
+
+	########################################################################################################################
+	##############################[ --- Reading --- ]#######################################################################
+	########################################################################################################################
+
+	# Function: exists
+	# ----------------
+	# returns wether there is a log on disk at log_dir
+	def exists (self):
+
+		return os.path.exists (self.index_filename)
+
+
+	# Function: load_index
+	# --------------------
+	# reads index.txt into self.chunks, self.gestures and self.gaps
+	def load_index (self):
+
+		index_file = open (self.index_filename, 'r')
+		fields = index_file.readline ().rstrip ('\n').split ('\t')[1].split (',')
+		if fields != record_fields:
+			print_error ("Frame Log", self.log_dir + " has records with fields " + str(fields) + "; this code reads " + str(record_fields))
+
+		self.chunks = []
+		self.gestures = []
+		self.gaps = []
+		for line in index_file:
+			entry = line.rstrip ('\n').split ('\t')
+			if entry[0] == 'chunk':
+				self.chunks.append ((int(entry[1]), int(entry[2]), int(entry[3]), float(entry[4]), float(entry[5])))
+			elif entry[0] == 'gesture':
+				self.gestures.append ((entry[1], float(entry[2]), float(entry[3])))
+			elif entry[0] == 'gap':
+				self.gaps.append ((float(entry[1]), float(entry[2])))
+		index_file.close ()
+
+		self.num_records = sum ([chunk[2] for chunk in self.chunks])
+
+
+	# Function: read_chunk
+	# --------------------
+	# returns the (num_records, record_width) records of the i'th chunk
+	def read_chunk (self, i, log_file=None):
+
+		(offset, length, num_records, first_timestamp, last_timestamp) = self.chunks[i]
+
+		### Step 1: read it in ###
+		close_file = log_file is None
+		if close_file:
+			log_file = open (self.log_filename, 'rb')
+		log_file.seek (offset)
+		(magic, header_num_records, compressed_length, checksum) = struct.unpack (chunk_header_format, log_file.read (chunk_header_size))
+		data = log_file.read (compressed_length)
+		if close_file:
+			log_file.close ()
+
+		### Step 2: check it ###
+		if magic != chunk_magic or header_num_records != num_records or compressed_length + chunk_header_size != length:
+			print_error ("Frame Log", "Chunk " + str(i) + " of " + self.log_filename + " doesn't match the index")
+		if zlib.crc32 (data) & 0xffffffff != checksum:
+			print_error ("Frame Log", "Chunk " + str(i) + " of " + self.log_filename + " is corrupt (checksum mismatch)")
+
+		### Step 3: decompress it ###
+		columns = np.frombuffer (zlib.decompress (data), dtype=record_dtype).reshape ((record_width, num_records))
+		return columns.T.astype (float)
+
+
+	# Function: get_records
+	# ---------------------
+	# returns the records with timestamps in [start_timestamp, end_timestamp]
+	# (either may be None for no bound); only the chunks that overlap the
+	# range are decompressed
+	def get_records (self, start_timestamp=None, end_timestamp=None):
+
+		### Step 1: find the chunks that overlap the range ###
+		chunk_indices = [i for i, (offset, length, num_records, first_timestamp, last_timestamp) in enumerate (self.chunks)
+							if (start_timestamp is None or last_timestamp >= start_timestamp) and (end_timestamp is None or first_timestamp <= end_timestamp)]
+		if len(chunk_indices) == 0:
+			return np.zeros ((0, record_width))
+
+		### Step 2: read them ###
+		log_file = open (self.log_filename, 'rb')
+		records = np.vstack ([self.read_chunk (i, log_file) for i in chunk_indices])
+		log_file.close ()
+
+		### Step 3: trim to the range ###
+		is_in_range = np.ones (len(records), dtype=bool)
+		if start_timestamp is not None:
+			is_in_range &= records[:, TIMESTAMP] >= start_timestamp
+		if end_timestamp is not None:
+			is_in_range &= records[:, TIMESTAMP] <= end_timestamp
+		return records[is_in_range]
+
+
+	# Function: get_gesture_types
+	# ---------------------------
+	# returns the (sorted) list of gesture types recorded in the log
+	def get_gesture_types (self):
+
+		return sorted (set ([gesture_type for (gesture_type, start_timestamp, end_timestamp) in self.gestures]))
+
+
+	# Function: get_restarts
+	# ----------------------
+	# given the timestamps of consecutive frames read from the log, returns
+	# the (sorted) rows that follow a gap, where derivatives must start over
+	def get_restarts (self, timestamps):
+
+		last_timestamps = np.array ([last_timestamp for (first_timestamp, last_timestamp) in self.gaps])
+		restarts = np.unique (np.searchsorted (timestamps, last_timestamps, 'right'))
+		return restarts[(restarts > 0) & (restarts < len(timestamps))]
+
+
+
+
+
+
+	########################################################################################################################
+	##############################[ --- Re-Featurizing --- ]################################################################
+	########################################################################################################################
+
+	# Function: get_gestures
+	# ----------------------
+	# returns a list of Gestures, one per gesture recorded in the log (only
+	# those of gesture_type, if given), with their observations recomputed
+	# from the raw records by the current Position/Gesture code. Gestures
+	# are recorded with the first hand in view, as record mode follows.
+	def get_gestures (self, gesture_type=None):
+
+		### Step 1: featurize the whole log in one go ###
+		records = get_hand_records (self.get_records ())
+		timestamps = records[:, TIMESTAMP]
+		restarts = self.get_restarts (timestamps)
+		observations = records_to_observations (records, restarts)
+
+		### Step 2: cut out each gesture ###
+		gestures = []
+		for (example_type, start_timestamp, end_timestamp) in self.gestures:
+
+			if gesture_type is not None and example_type != gesture_type:
+				continue
+
+			gesture = cut_gesture (example_type, observations, timestamps, start_timestamp, end_timestamp, restarts)
+			if gesture is None:
+				print_inner_status ("Frame Log (get_gestures)", "No hand seen in the " + example_type + " gesture at " + str(start_timestamp) + "; skipping it")
+				continue
+			gestures.append (gesture)
+
+		return gestures
+
+
+	# Function: convert_to_dataset
+	# ----------------------------
+	# appends every gesture recorded in the log, re-featurized, to a Gesture_Dataset
+	def convert_to_dataset (self, dataset):
+
+		gestures = self.get_gestures ()
+		for gesture in gestures:
+			dataset.append (gesture.name, gesture.get_observations (), gesture.frame_interval)
+
+		return len(gestures)
+
+
+
+
+
+
+	########################################################################################################################
+	##############################[ --- Writing --- ]#######################################################################
+	########################################################################################################################
+
+	# Function: create
+	# ----------------
+	# creates an empty log on disk
+	def create (self):
+
+		if not os.path.exists (self.log_dir):
+			os.makedirs (self.log_dir)
+
+		open (self.log_filename, 'wb').close ()
+		index_file = open (self.index_filename, 'w')
+		index_file.write ('fields\t' + ','.join (record_fields) + '\n')
+		index_file.close ()
+
+		self.chunks 		= []
+		self.gestures 		= []
+		self.gaps 			= []
+		self.num_records 	= 0
+
+
+	# Function: append_chunk
+	# ----------------------
+	# compresses an (N, record_width) array of records and adds it to the log
+	def append_chunk (self, records):
+
+		if not self.exists ():
+			self.create ()
+
+		records = np.atleast_2d (records)
+		if len(records) == 0:
+			return
+
+		### Step 1: compress the records, column by column ###
+		data = zlib.compress (np.ascontiguousarray (records.T, dtype=record_dtype).tostring (), self.compression_level)
+		header = struct.pack (chunk_header_format, chunk_magic, len(records), len(data), zlib.crc32 (data) & 0xffffffff)
+
+		### Step 2: append the chunk ###
+		log_file = open (self.log_filename, 'ab')
+		log_file.seek (0, os.SEEK_END)
+		offset = log_file.tell ()
+		log_file.write (header)
+		log_file.write (data)
+		log_file.close ()
+
+		### Step 3: append its index entry ###
+		entry = (offset, len(header) + len(data), len(records), records[0, TIMESTAMP], records[-1, TIMESTAMP])
+		self.append_index_line (['chunk'] + [repr (field) for field in entry])
+		self.chunks.append (entry)
+		self.num_records += len(records)
+
+
+	# Function: append_gesture
+	# ------------------------
+	# records that a gesture of gesture_type was made between two timestamps
+	def append_gesture (self, gesture_type, start_timestamp, end_timestamp):
+
+		if not self.exists ():
+			self.create ()
+
+		entry = (gesture_type, float(start_timestamp), float(end_timestamp))
+		self.append_index_line (['gesture', gesture_type, repr (entry[1]), repr (entry[2])])
+		self.gestures.append (entry)
+
+
+	# Function: append_gap
+	# --------------------
+	# records that the frames between two timestamps were lost
+	def append_gap (self, first_timestamp, last_timestamp):
+
+		if not self.exists ():
+			self.create ()
+
+		entry = (float(first_timestamp), float(last_timestamp))
+		self.append_index_line (['gap', repr (entry[0]), repr (entry[1])])
+		self.gaps.append (entry)
+
+
+	# Function: append_index_line
+	# ---------------------------
+	# adds a line of tab-separated fields to index.txt
+	def append_index_line (self, fields):
+
+		index_file = open (self.index_filename, 'a')
+		index_file.write ('\t'.join (fields) + '\n')
+		index_file.close ()
+
+
+
+
+
+# Class: Frame_Log_Writer
+# -----------------------
+# captures frames into a Frame_Log without holding up the thread that
+# adds them: add_frame only copies the frame's records (one per hand) into
+# the current chunk; full chunks are compressed and written by a
+# background thread. If the writer falls more than max_queued_chunks
+# behind, chunks are dropped (and counted) rather than making the capture
+# wait, and the frames they held are recorded as a gap in the index so
+# that re-featurizing doesn't take derivatives across it. Gestures and
+# gaps are never dropped: they are kept in lists of their own, which the
+# writer thread writes out after each chunk (and when closed).
+class Frame_Log_Writer:
+
+	#--- Log ---
+	frame_log 			= None		# Frame_Log being written to
+	write_queue 		= None		# Frame_Queue of chunks (records arrays) for the writer thread
+	gestures 			= None		# (gesture_type, start_timestamp, end_timestamp) entries not yet written
+	gaps 				= None		# (first_timestamp, last_timestamp) of dropped chunks, not yet written
+	gestures_lock 		= None		# guards gestures and gaps
+	thread 				= None
+
+	#--- Current Chunk ---
+	chunk 				= None		# (chunk_size, record_width) records not yet handed to the writer thread
+	num_buffered 		= 0			# rows of chunk in use
+
+	#--- Counters ---
+	num_frames 			= 0			# frames added
+	num_chunks_written 	= 0
+
+	#--- Parameters ---
+	chunk_size 			= 256		# records per chunk
+	max_queued_chunks 	= 64
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# writes to frame_log (a Frame_Log or the directory of one)
+	def __init__ (self, frame_log, chunk_size=256, max_queued_chunks=64):
+
+		if isinstance (frame_log, basestring):
+			frame_log = Frame_Log (frame_log)
+
+		self.frame_log 			= frame_log
+		self.chunk_size 		= chunk_size
+		self.max_queued_chunks 	= max_queued_chunks
+		self.write_queue 		= Frame_Queue (max_queued_chunks, Frame_Queue.DROP_NEWEST)
+		self.gestures 			= []
+		self.gaps 				= []
+		self.gestures_lock 		= threading.Lock ()
+		self.chunk 				= np.zeros ((chunk_size, record_width))
+		self.num_buffered 		= 0
+		self.num_frames 		= 0
+		self.num_chunks_written = 0
+
+
+	# Function: start
+	# ---------------
+	# starts the writer thread
+	def start (self):
+
+		self.thread = threading.Thread (target=self.write)
+		self.thread.daemon = True
+		self.thread.start ()
+
+
+	# Function: close
+	# ---------------
+	# writes out whatever is buffered and waits for the writer thread to finish
+	def close (self):
+
+		self.flush ()
+		self.write_queue.close ()
+		if self.thread:
+			self.thread.join ()
+
+
+	# Function: add_frame
+	# -------------------
+	# adds a (Leap or stand-in) frame to the log
+	def add_frame (self, frame):
+
+		records = frame_to_records (frame)
+		if self.num_buffered + len(records) > self.chunk_size:
+			self.flush ()
+
+		self.chunk[self.num_buffered:self.num_buffered + len(records)] = records
+		self.num_buffered += len(records)
+		self.num_frames += 1
+		if self.num_buffered == self.chunk_size:
+			self.flush ()
+
+
+	# Function: add_gesture
+	# ---------------------
+	# records that a gesture of gesture_type was made between two timestamps
+	# (seconds, as in the records); it is written with the next chunk
+	def add_gesture (self, gesture_type, start_timestamp, end_timestamp):
+
+		with self.gestures_lock:
+			self.gestures.append ((gesture_type, start_timestamp, end_timestamp))
+
+
+	# Function: flush
+	# ---------------
+	# hands the current (possibly partial) chunk to the writer thread; if it
+	# is dropped, its frames are noted as a gap
+	def flush (self):
+
+		if self.num_buffered == 0:
+			return
+
+		chunk = self.chunk[:self.num_buffered]
+		if not self.write_queue.put (chunk):
+			with self.gestures_lock:
+				self.gaps.append ((chunk[0, TIMESTAMP], chunk[-1, TIMESTAMP]))
+		self.chunk = np.zeros ((self.chunk_size, record_width))
+		self.num_buffered = 0
+
+
+	# Function: get_num_dropped
+	# -------------------------
+	# number of chunks dropped because the writer thread fell behind
+	def get_num_dropped (self):
+
+		return self.write_queue.num_dropped
+
+
+	# Function: write
+	# ---------------
+	# thread body: writes what's queued until the queue is closed and drained
+	def write (self):
+
+		while True:
+
+			### Step 1: the next chunk ###
+			chunk = self.write_queue.get ()
+			if chunk is not None:
+				self.frame_log.append_chunk (chunk)
+				self.num_chunks_written += 1
+
+			### Step 2: the gestures and gaps added since ###
+			with self.gestures_lock:
+				(gestures, self.gestures) = (self.gestures, [])
+				(gaps, self.gaps) = (self.gaps, [])
+			for gesture in gestures:
+				self.frame_log.append_gesture (*gesture)
+			for gap in gaps:
+				self.frame_log.append_gap (*gap)
+
+			if chunk is None:
+				return
+
+
+
+
+
+
+if __name__ == "__main__":
+
+	### Usage: ./Frame_Log.py [log_dir] [dataset_dir] ###
+	### re-featurizes the gestures recorded in a log into a (new) Gesture_Dataset ###
+	from Gesture_Dataset import Gesture_Dataset
+	log_dir 	= sys.argv[1] if len(sys.argv) > 1 else os.path.join (os.getcwd (), 'frame_log/')
+	dataset_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join (os.getcwd (), 'dataset/')
+
+	frame_log = Frame_Log (log_dir)
+	if not frame_log.exists ():
+		print_error ("Frame Log", "No frame log at " + log_dir)
+	dataset = Gesture_Dataset (dataset_dir)
+	if dataset.exists ():
+		print_error ("Frame Log", "A dataset already exists at " + dataset_dir)
+
+	print_message ("Re-featurizing " + log_dir + " -> " + dataset_dir)
+	dataset.create ()
+	num_gestures = frame_log.convert_to_dataset (dataset)
+	print_status ("Frame Log", "Converted " + str(num_gestures) + " gestures from " + str(frame_log.num_records) + " records (" + str(len(frame_log.chunks)) + " chunks)")
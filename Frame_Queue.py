@@ -0,0 +1,185 @@
+# *------------------------------------------------------------ *
+# * Class: Frame_Queue
+# * ------------------
+# * bounded, thread-safe queue for handing frames from the thread
+# * that produces them (e.g. the Leap SDK) to the main loop
+# *
+# *------------------------------------------------------------ *
+#--- Standard ---
+import threading
+from collections import deque
+
+#--- My Files ---
+from common_utilities import print_error
+from Metrics import clock
+
+
+
+# Class: Frame_Queue
+# ------------------
+# FIFO of frames guarded by a condition variable; consumers sleep
+# until a frame arrives (or the queue is closed) instead of spinning or
+# polling, and are woken by put/get/close directly. No single wait is
+# longer than max_wait: on Python 2 an untimed wait can't be interrupted,
+# so a thread blocked on an idle queue would not see Ctrl-C.
+class Frame_Queue:
+
+	#--- Overflow Policies ---
+	DROP_OLDEST 	= 'drop_oldest'		# discard the oldest queued frame to make room
+	DROP_NEWEST 	= 'drop_newest'		# discard the incoming frame
+	BLOCK 			= 'block'			# make the producer wait for room
+	overflow_policies = [DROP_OLDEST, DROP_NEWEST, BLOCK]
+
+	#--- Data ---
+	frames 			= None		# deque of queued frames
+	condition 		= None		# guards everything below
+	is_closed 		= False		# once closed, get () returns None when empty
+	last_frame_id 	= None		# id of the most recently queued frame
+
+	#--- Counters ---
+	num_put 		= 0			# frames accepted into the queue
+	num_dropped 	= 0			# frames lost to the overflow policy
+	num_duplicated 	= 0			# frames rejected because they were already queued
+
+	#--- Parameters ---
+	max_size 		= 16		# maximum number of queued frames
+	overflow_policy = DROP_OLDEST
+	max_wait 		= 0.5		# longest single wait (in seconds) before checking again
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# initializes an empty queue
+	def __init__ (self, max_size=16, overflow_policy=DROP_OLDEST):
+
+		if not overflow_policy in self.overflow_policies:
+			print_error ("Frame Queue", "Unknown overflow policy: " + str(overflow_policy))
+
+		### Step 1: set parameters ###
+		self.max_size 			= max_size
+		self.overflow_policy 	= overflow_policy
+
+		### Step 2: initialize data and counters ###
+		self.frames 			= deque ()
+		self.condition 			= threading.Condition ()
+		self.is_closed 			= False
+		self.last_frame_id 		= None
+		self.num_put 			= 0
+		self.num_dropped 		= 0
+		self.num_duplicated 	= 0
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Producing/Consuming --- ]#################################################
+	########################################################################################################################
+
+	# Function: put
+	# -------------
+	# adds a frame to the queue, applying the overflow policy if it is full.
+	# frames with the same id as the last one queued are counted and ignored.
+	# returns wether the frame was queued.
+	def put (self, frame):
+
+		with self.condition:
+
+			### Step 1: ignore frames we have already seen ###
+			frame_id = getattr (frame, 'id', None)
+			if frame_id is not None and frame_id == self.last_frame_id:
+				self.num_duplicated += 1
+				return False
+
+			### Step 2: make room according to the overflow policy ###
+			if len(self.frames) >= self.max_size:
+
+				if self.overflow_policy == self.DROP_OLDEST:
+					self.frames.popleft ()
+					self.num_dropped += 1
+
+				elif self.overflow_policy == self.DROP_NEWEST:
+					self.num_dropped += 1
+					return False
+
+				else:
+					while len(self.frames) >= self.max_size and not self.is_closed:
+						self.condition.wait (self.max_wait)
+
+			if self.is_closed:
+				return False
+
+			### Step 3: queue it and wake up a consumer ###
+			self.frames.append (frame)
+			self.last_frame_id = frame_id
+			self.num_put += 1
+			self.condition.notify_all ()
+			return True
+
+
+	# Function: get
+	# -------------
+	# blocks until a frame is available and returns it. returns None if
+	# the queue is closed and empty, or if 'timeout' seconds pass first.
+	def get (self, timeout=None):
+
+		with self.condition:
+
+			deadline = clock () + timeout if timeout is not None else None
+			while len(self.frames) == 0:
+				if self.is_closed:
+					return None
+				if deadline is None:
+					self.condition.wait (self.max_wait)
+					continue
+				remaining = deadline - clock ()
+				if remaining <= 0:
+					return None
+				self.condition.wait (min (remaining, self.max_wait))
+
+			frame = self.frames.popleft ()
+			self.condition.notify_all ()
+			return frame
+
+
+	# Function: close
+	# ---------------
+	# wakes up everyone waiting on the queue; no more frames will be accepted
+	def close (self):
+
+		with self.condition:
+			self.is_closed = True
+			self.condition.notify_all ()
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Stats --- ]###############################################################
+	########################################################################################################################
+
+	# Function: size
+	# --------------
+	# returns the number of frames currently queued
+	def size (self):
+
+		with self.condition:
+			return len(self.frames)
+
+
+	# Function: get_stats
+	# -------------------
+	# returns a dict of the queue's counters
+	def get_stats (self):
+
+		with self.condition:
+			return {
+						'queued': 		len(self.frames),
+						'put': 			self.num_put,
+						'dropped': 		self.num_dropped,
+						'duplicated': 	self.num_duplicated
+					}
@@ -0,0 +1,471 @@
+#!/usr/bin/python
+# *------------------------------------------------------------ *
+# * Class: Frame_Source
+# * -------------------
+# * where Leap_Synth gets its frames from: a live Leap, a replay
+# * of recorded frames, or a synthetic hand performing known
+# * gestures (the latter two need no Leap device or SDK)
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+import sys
+import math
+import time
+import threading
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Frame_Queue import Frame_Queue
+from Metrics import clock
+
+#--- Numpy ---
+import numpy as np
+
+
+
+########################################################################################################################
+########################################[ --- Frame Records --- ]#######################################################
+########################################################################################################################
+# Frames are stored/replayed as rows of a float64 array with the following
+# columns (one row per hand in view, keyed by hand_id; a frame without any
+# hand is a single row with has_hand = 0). The rows of a frame are
+# consecutive and share its timestamp and frame_id.
+record_fields = [	'timestamp',						# seconds
+					'frame_id',
+					'has_hand', 'hand_id',
+					'palm_x', 'palm_y', 'palm_z',
+					'direction_x', 'direction_y', 'direction_z',
+					'normal_x', 'normal_y', 'normal_z',
+					'num_fingers']
+record_width 	= len(record_fields)
+TIMESTAMP, FRAME_ID, HAS_HAND, HAND_ID = 0, 1, 2, 3
+PALM, DIRECTION, NORMAL, NUM_FINGERS = slice (4, 7), slice (7, 10), slice (10, 13), 13
+
+
+# Class: Vector
+# -------------
+# stand-in for Leap.Vector (indexable, with yaw/pitch/roll in radians)
+class Vector:
+
+	def __init__ (self, x, y, z):
+
+		self.x, self.y, self.z = float(x), float(y), float(z)
+		self.yaw 	= math.atan2 (self.x, -self.z)
+		self.pitch 	= math.atan2 (self.y, -self.z)
+		self.roll 	= math.atan2 (self.x, -self.y)
+
+	def __getitem__ (self, i):
+
+		return (self.x, self.y, self.z)[i]
+
+
+# Class: Hand
+# -----------
+# stand-in for Leap.Hand
+class Hand:
+
+	def __init__ (self, hand_id, palm_position, direction, palm_normal, num_fingers):
+
+		self.id 			= int(hand_id)
+		self.palm_position 	= Vector (*palm_position)
+		self.direction 		= Vector (*direction)
+		self.palm_normal 	= Vector (*palm_normal)
+		self.fingers 		= [None] * int(num_fingers)
+
+
+# Class: Frame
+# ------------
+# stand-in for Leap.Frame
+class Frame:
+
+	def __init__ (self, frame_id, timestamp, hands):
+
+		self.id 			= int(frame_id)
+		self.timestamp 		= int(timestamp * 1e6)		# microseconds, as in the Leap SDK
+		self.hands 			= hands
+		self.queued_time 	= None						# Metrics.clock () when a frame source queued it
+
+
+# Function: frame_to_records
+# --------------------------
+# given a (Leap or stand-in) frame, returns its (num_hands, record_width)
+# records, one per hand (a single hand-less one if there are none)
+def frame_to_records (frame):
+
+	records = np.zeros ((max (len(frame.hands), 1), record_width))
+	records[:, TIMESTAMP] 	= frame.timestamp * 1e-6
+	records[:, FRAME_ID] 	= frame.id
+	for record, hand in zip (records, frame.hands):
+		record[HAS_HAND] 	= 1
+		record[HAND_ID] 	= hand.id
+		record[PALM] 		= [hand.palm_position[i] for i in range(3)]
+		record[DIRECTION] 	= [hand.direction[i] for i in range(3)]
+		record[NORMAL] 		= [hand.palm_normal[i] for i in range(3)]
+		record[NUM_FINGERS] = len(hand.fingers)
+
+	return records
+
+
+# Function: frame_to_record
+# -------------------------
+# given a (Leap or stand-in) frame, returns the record of its first hand
+def frame_to_record (frame):
+
+	return frame_to_records (frame)[0]
+
+
+# Function: record_to_frame
+# -------------------------
+# given the record(s) of a frame, returns a stand-in Frame with a hand per
+# record that has one
+def record_to_frame (records):
+
+	records = np.atleast_2d (records)
+	hands = [Hand (record[HAND_ID], record[PALM], record[DIRECTION], record[NORMAL], record[NUM_FINGERS]) for record in records if record[HAS_HAND]]
+	return Frame (records[0, FRAME_ID], records[0, TIMESTAMP], hands)
+
+
+# Function: get_frame_starts
+# --------------------------
+# given an (N, record_width) array of records, returns the rows at which
+# each frame's records start
+def get_frame_starts (records):
+
+	records = np.atleast_2d (records)
+	is_start = np.ones (len(records), dtype=bool)
+	is_start[1:] = (records[1:, FRAME_ID] != records[:-1, FRAME_ID]) | (records[1:, TIMESTAMP] != records[:-1, TIMESTAMP])
+	return np.flatnonzero (is_start)
+
+
+# Function: get_hand_records
+# --------------------------
+# given an (N, record_width) array of records, returns one record per frame:
+# that of the hand with hand_id (hand-less where it isn't in view) or, if
+# hand_id is None, that of the frame's first hand, which is the one a
+# Gesture follows by default
+def get_hand_records (records, hand_id=None):
+
+	records = np.atleast_2d (records)
+	frame_starts = get_frame_starts (records)
+	if hand_id is None:
+		return records[frame_starts]
+
+	hand_records = records[frame_starts]
+	hand_records[:, HAS_HAND:] = 0
+	is_hand = (records[:, HAS_HAND] != 0) & (records[:, HAND_ID] == hand_id)
+	frame_numbers = np.searchsorted (frame_starts, np.flatnonzero (is_hand), 'right') - 1
+	hand_records[frame_numbers] = records[is_hand]
+	return hand_records
+
+
+# Function: records_to_positional_features
+# ----------------------------------------
+# given an (N, record_width) array of records, returns the (N, 6) array of
+# positional features Position computes from their frames (palm x, y, z,
+# then yaw/pitch of the direction and roll of the normal, as in Vector);
+# rows of records without a hand are meaningless
+def records_to_positional_features (records):
+
+	records = np.atleast_2d (records)
+	direction = records[:, DIRECTION]
+	normal = records[:, NORMAL]
+	return np.column_stack ((	records[:, PALM],
+								np.arctan2 (direction[:, 0], -direction[:, 2]),
+								np.arctan2 (direction[:, 1], -direction[:, 2]),
+								np.arctan2 (normal[:, 0], -normal[:, 1])))
+
+
+
+
+
+
+########################################################################################################################
+########################################[ --- Synthetic Hands --- ]#####################################################
+########################################################################################################################
+
+#--- Parameters of the synthetic hand ---
+rest_position 		= np.array ([0.0, 200.0, 0.0])		# mm above the device
+rest_direction 		= np.array ([0.0, 0.0, -1.0])
+rest_normal 		= np.array ([0.0, -1.0, 0.0])
+synthetic_gestures 	= ['circle', 'swipe_left', 'swipe_right', 'push', 'wave']
+
+
+# Function: get_gesture_trajectory
+# --------------------------------
+# given a gesture name and phase u in [0, 1] (an array), returns
+# (palm positions, palm normals) as (len(u), 3) arrays. A name of the
+# form 'circle:1.5' scales the gesture's motion by 1.5.
+def get_gesture_trajectory (gesture_name, u):
+
+	amplitude = 1.0
+	if ':' in gesture_name:
+		(gesture_name, amplitude) = gesture_name.split (':')
+		amplitude = float(amplitude)
+
+	offset 	= np.zeros ((len(u), 3))
+	angle 	= np.zeros (len(u))
+
+	if gesture_name == 'circle':
+		offset[:, 0] = 60.0 * np.sin (2 * np.pi * u)
+		offset[:, 1] = 60.0 * (1 - np.cos (2 * np.pi * u))
+	elif gesture_name == 'swipe_left':
+		offset[:, 0] = 100.0 - 200.0 * u
+	elif gesture_name == 'swipe_right':
+		offset[:, 0] = -100.0 + 200.0 * u
+	elif gesture_name == 'push':
+		offset[:, 2] = -80.0 * np.sin (np.pi * u)
+	elif gesture_name == 'wave':
+		angle = 0.8 * np.sin (4 * np.pi * u)
+	elif gesture_name != 'idle':
+		print_error ("Frame Source", "Unknown synthetic gesture: " + str(gesture_name))
+
+	position = rest_position + amplitude * offset
+	normal = np.zeros ((len(u), 3))
+	normal[:, 0] = np.sin (amplitude * angle)
+	normal[:, 1] = -np.cos (amplitude * angle)
+
+	return (position, normal)
+
+
+# Function: get_synthetic_gesture_types
+# -------------------------------------
+# returns num_types distinct synthetic gesture names: the basic gestures,
+# then scaled versions of them
+def get_synthetic_gesture_types (num_types):
+
+	gesture_types = []
+	for i in range(num_types):
+		gesture_name = synthetic_gestures[i % len(synthetic_gestures)]
+		scale = 1.0 + 0.5 * (i // len(synthetic_gestures))
+		gesture_types.append (gesture_name if scale == 1.0 else gesture_name + ':' + str(scale))
+
+	return gesture_types
+
+
+# Function: generate_synthetic_records
+# ------------------------------------
+# given a script (list of gesture names; 'idle' and 'absent' are also
+# allowed), returns (records, events): the records of a hand performing
+# each in turn, separated by idle_frames of hovering, and a list of
+# (gesture_name, first_frame, last_frame) for the gestures performed
+def generate_synthetic_records (script, fps=100.0, gesture_frames=40, idle_frames=60, speed_variation=0.2, noise=1.0, seed=0):
+
+	random_state = np.random.RandomState (seed)
+	records = []
+	events = []
+	num_frames = 0
+
+	for gesture_name in script:
+		for segment_name in ['idle', gesture_name]:
+
+			### Step 1: how long is this segment? ###
+			if segment_name == 'idle':
+				length = idle_frames
+			else:
+				length = int(round (gesture_frames * random_state.uniform (1 - speed_variation, 1 + speed_variation)))
+			if length == 0:
+				continue
+
+			### Step 2: fill in the records ###
+			segment = np.zeros ((length, record_width))
+			segment[:, FRAME_ID] = np.arange (num_frames, num_frames + length)
+			if segment_name != 'absent':
+				(position, normal) = get_gesture_trajectory (segment_name, np.linspace (0, 1, length))
+				segment[:, HAS_HAND] 	= 1
+				segment[:, PALM] 		= position + noise * random_state.randn (length, 3)
+				segment[:, DIRECTION] 	= rest_direction
+				segment[:, NORMAL] 		= normal
+				segment[:, NUM_FINGERS] = 5
+			if not segment_name in ['idle', 'absent']:
+				events.append ((segment_name, num_frames, num_frames + length - 1))
+
+			records.append (segment)
+			num_frames += length
+
+	records = np.vstack (records)
+	records[:, TIMESTAMP] = records[:, FRAME_ID] / fps
+	return (records, events)
+
+
+
+
+
+
+########################################################################################################################
+########################################[ --- Frame Sources --- ]#######################################################
+########################################################################################################################
+
+# Class: Frame_Source
+# -------------------
+# base class; frames are handed to consumers through a Frame_Queue
+class Frame_Source:
+
+	frame_queue = None
+
+	# Function: start
+	# ---------------
+	# starts producing frames
+	def start (self):
+		pass
+
+	# Function: stop
+	# --------------
+	# stops producing frames; get_frame returns None once the queue is drained
+	def stop (self):
+		self.frame_queue.close ()
+
+	# Function: get_frame
+	# -------------------
+	# blocks until the next frame is available and returns it; None if the source is exhausted
+	def get_frame (self, timeout=None):
+		return self.frame_queue.get (timeout)
+
+
+# Class: Leap_Frame_Source
+# ------------------------
+# frames from a Leap device, via Synth_Listener
+class Leap_Frame_Source (Frame_Source):
+
+	listener 	= None
+	controller 	= None
+
+	def __init__ (self, max_queue_size=16, overflow_policy=Frame_Queue.DROP_OLDEST):
+
+		### Step 1: only the live source needs the Leap SDK (Synth_Listener puts it on sys.path) ###
+		from Synth_Listener import Synth_Listener, Leap
+
+		### Step 2: create the listener and controller ###
+		self.listener 		= Synth_Listener (max_queue_size, overflow_policy)
+		self.frame_queue 	= self.listener.frame_queue
+		self.controller 	= Leap.Controller ()
+
+	def start (self):
+		self.controller.add_listener (self.listener)
+
+	def stop (self):
+		self.controller.remove_listener (self.listener)
+		self.frame_queue.close ()
+
+
+# Class: Replay_Frame_Source
+# --------------------------
+# replays an array (or .npy file) of frame records (see frame_to_records)
+# from a background thread. speed is a multiple of real time (1.0 = as recorded); None replays as fast
+# as the consumer takes frames, without dropping any.
+class Replay_Frame_Source (Frame_Source):
+
+	records 	= None
+	frame_starts = None		# rows of records at which each frame's records start...
+	frame_ends 	= None		# ...and end (exclusive)
+	speed 		= 1.0
+	loop 		= False		# wether to start over at the end
+	thread 		= None
+
+	def __init__ (self, records, speed=1.0, loop=False, max_queue_size=16):
+
+		if isinstance (records, basestring):
+			records = np.load (records)
+
+		self.records 		= records
+		self.frame_starts 	= get_frame_starts (records)
+		self.frame_ends 	= np.append (self.frame_starts[1:], len(records))
+		self.speed 			= speed
+		self.loop 			= loop
+
+		### --- as-fast-as-possible must not drop frames; real-time behaves like the sensor --- ###
+		overflow_policy = Frame_Queue.BLOCK if speed is None else Frame_Queue.DROP_OLDEST
+		self.frame_queue = Frame_Queue (max_queue_size, overflow_policy)
+
+	def start (self):
+
+		self.thread = threading.Thread (target=self.replay)
+		self.thread.daemon = True
+		self.thread.start ()
+
+	def stop (self):
+
+		self.frame_queue.close ()
+		if self.thread:
+			self.thread.join (1.0)
+
+	# Function: replay
+	# ----------------
+	# thread body: puts each record's frame on the queue at its (scaled) time
+	def replay (self):
+
+		while not self.frame_queue.is_closed:
+
+			start_time = time.time ()
+			first_timestamp = self.records[0, TIMESTAMP]
+			for (start, end) in zip (self.frame_starts, self.frame_ends):
+
+				if self.frame_queue.is_closed:
+					return
+
+				### --- wait until this frame is due --- ###
+				if self.speed is not None:
+					delay = start_time + (self.records[start, TIMESTAMP] - first_timestamp) / self.speed - time.time ()
+					if delay > 0:
+						time.sleep (delay)
+
+				frame = record_to_frame (self.records[start:end])
+				frame.queued_time = clock ()
+				self.frame_queue.put (frame)
+
+			if not self.loop:
+				break
+
+		self.frame_queue.close ()
+
+
+# Class: Synthetic_Frame_Source
+# -----------------------------
+# replays a synthetic hand performing the gestures in 'script'; see
+# generate_synthetic_records for the parameters. self.events holds the
+# ground truth (gesture_name, first_frame, last_frame).
+class Synthetic_Frame_Source (Replay_Frame_Source):
+
+	events = []
+
+	def __init__ (self, script=synthetic_gestures, speed=1.0, loop=False, fps=100.0, seed=0, **kwargs):
+
+		(records, self.events) = generate_synthetic_records (script, fps=fps, seed=seed, **kwargs)
+		Replay_Frame_Source.__init__ (self, records, speed=speed, loop=loop)
+
+
+# Function: get_frame_source
+# --------------------------
+# given a description of a frame source - 'leap', 'synthetic', the
+# filename of recorded frames or a Frame_Log directory - returns the frame source
+def get_frame_source (description, speed=1.0):
+
+	if description == 'leap':
+		return Leap_Frame_Source ()
+	elif description == 'synthetic':
+		return Synthetic_Frame_Source (synthetic_gestures * 10, speed=speed)
+	elif os.path.isdir (description):
+		from Frame_Log import Frame_Log
+		return Replay_Frame_Source (Frame_Log (description).get_records (), speed=speed)
+	else:
+		return Replay_Frame_Source (description, speed=speed)
+
+
+
+
+
+
+if __name__ == "__main__":
+
+	### Usage: ./Frame_Source.py [output .npy filename] [number of frames] ###
+	### records frames from the Leap for later replay ###
+	output_filename = sys.argv[1] if len(sys.argv) > 1 else 'frames.npy'
+	num_frames 		= int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+	frame_source = Leap_Frame_Source (overflow_policy=Frame_Queue.BLOCK)
+	frame_source.start ()
+	print_message ("Recording " + str(num_frames) + " frames to " + output_filename)
+	records = np.vstack ([frame_to_records (frame_source.get_frame ()) for i in range(num_frames)])
+	frame_source.stop ()
+
+	np.save (output_filename, records)
+	print_status ("Frame Source", "Saved " + str(num_frames) + " frames (" + str(len(records)) + " records)")
@@ -9,15 +9,9 @@ import os
 import sys
 import pickle
 
-#--- Leap ---
-
-### NOTE: change the path below to the location of your local installation ###
-sys.path.append ('/Users/jayhack/CS/NI/LeapDeveloperKit/LeapSDK/lib')
-import Leap
-
 #--- My Files ---
 from common_utilities import print_message, print_error, print_status
-from Position import Position
+from Position import Position, compute_features_batch
 
 #--- Numpy ---
 import numpy as np
@@ -32,34 +26,58 @@ class Gesture:
 	name 					= '__UNCLASSIFIED__'	# Name of this gesture
 
 	#--- Data ---
-	frames 		= []			# list of Leap 'Frame' objects constituting this gesture
-	O 			= []			# "Observations": list of vector-representations constituting this gesture
+	O 			= None			# "Observations": (gesture_length, num_features) ring buffer of vector-representations
+	P 			= None			# positional features of each observation's frame (parallel to O); reused for derivatives
+	head 		= 0				# index in the ring that the next observation will be written to
+	num_frames 	= 0				# number of observations currently in the ring
+	frame_count = 0				# number of observations added since the last clear (not capped at gesture_length)
 	hmm_rep 	= []			# can be passed to an hmm
 
 	#--- Parameters ---
 	gesture_length 			= 40		# number of frames stored in the gesture
-	frame_reduction_const 	= 5			# gesture_length/frame_reduction_const = # of frames in final feature rep
+	frame_reduction_const 	= 5			# gesture_length/frame_reduction_const = # of frames in final feature rep (at the nominal frame rate)
 	d1_length 				= 5			# small derivative of motion
 	d2_length 				= 10		# large derivative of motion
+	nominal_frame_interval 	= 0.01												# seconds between frames that the constants above assume (100 fps)
+	hmm_rep_interval 		= frame_reduction_const * nominal_frame_interval	# seconds between the frames of the hmm rep
+	frame_interval 			= nominal_frame_interval							# seconds between this gesture's frames
 
 
 
 	# Function: Constructor
 	# ---------------------
-	# initializes an empty frame
-	def __init__ (self, name='__UNCLASSIFIED__', observations_filepath=None):
+	# initializes an empty frame; gesture_length and frame_interval default
+	# to the class's
+	def __init__ (self, name='__UNCLASSIFIED__', observations_filepath=None, gesture_length=None, frame_interval=None):
 
 		### Step 1: set/initialize data and parameters ###
 		self.name 					= name
-		self.frames 				= []
-		self.O 						= []
+		if frame_interval:
+			self.frame_interval 	= frame_interval
 
+		### Step 2: allocate the rings ###
+		self.resize (gesture_length or self.gesture_length)
 
-		### Step 2: load the observations in, if appropriate ###
+
+		### Step 3: load the observations in, if appropriate ###
 		if observations_filepath:
 			self.load_observations(observations_filepath)
 
 
+	# Function: resize
+	# ----------------
+	# (re)allocates the rings to hold gesture_length frames, emptying the
+	# gesture, and precomputes the positions get_hmm_rep gathers from a full one
+	def resize (self, gesture_length):
+
+		self.gesture_length 		= gesture_length
+		self.O 						= np.zeros ((self.gesture_length, Position.num_features))
+		self.P 						= np.zeros ((self.gesture_length, Position.num_positional_features))
+		self.full_hmm_rep_positions = self.get_hmm_rep_positions (self.gesture_length)
+		self.hmm_rep_indices 		= np.zeros (len(self.full_hmm_rep_positions), dtype=int)
+		self.clear ()
+
+
 
 
 
@@ -73,26 +91,79 @@ class Gesture:
 	# returns wether the gesture is full or not
 	def is_full (self):
 
-		return (len(self.O) >= self.gesture_length)
+		return (self.num_frames >= self.gesture_length)
+
+
+	# Function: get_ring_index
+	# ------------------------
+	# returns the index in the ring of the observation 'age' frames
+	# older than the newest one
+	def get_ring_index (self, age):
+
+		return (self.head - 1 - age) % self.gesture_length
+
+
+	# Function: get_observations
+	# --------------------------
+	# returns the observations in order (oldest first) as a
+	# (num_frames, num_features) array
+	def get_observations (self):
+
+		### --- no wrap-around yet: just a view --- ###
+		if not self.is_full ():
+			return self.O[:self.num_frames]
+
+		### --- otherwise gather starting from the oldest --- ###
+		return self.O.take (np.arange (self.head, self.head + self.gesture_length) % self.gesture_length, axis=0)
+
+
+	# Function: get_newest_observation
+	# --------------------------------
+	# returns (a view of) the most recently added observation
+	def get_newest_observation (self):
+
+		return self.O[self.get_ring_index (0)]
+
+
+	# Function: get_hmm_rep_positions
+	# -------------------------------
+	# returns the positions (0 = oldest) of the observations that make up the
+	# hmm rep of a gesture with num_frames observations: one every
+	# hmm_rep_interval seconds (the nearest frame, given frame_interval),
+	# plus the very last one if it isn't one of those already. At the
+	# nominal frame rate that is every frame_reduction_const'th frame.
+	def get_hmm_rep_positions (self, num_frames):
+
+		step = self.hmm_rep_interval / self.frame_interval
+		positions = np.unique (np.round (np.arange (0, num_frames - 0.5, step)).astype (int))
+		if len(positions) > 0 and positions[-1] == num_frames - 1:
+			return positions
+		return np.append (positions, num_frames - 1)
 
 
 	# Function: get_hmm_rep
 	# -------------------------
-	# returns a feature-vector representation of the gesture.
+	# returns a feature-vector representation of the gesture (of just its
+	# newest num_frames observations, if given).
 	# this will be applied 
-	def get_hmm_rep (self):
-			
-		self.hmm_rep = []
-		### Step 1: add all frames appropriate for frame-reduction const ###
-		for i, O_i in enumerate(self.O):
-			if i % self.frame_reduction_const == 0:
-				self.hmm_rep.append (np.array(O_i))
-			
-		### Step 2: add the very last frame ###
-		self.hmm_rep.append (np.array(self.O[-1]))
-
-		### Step 3: convert to numpy array and return ###
-		self.hmm_rep = np.array (self.hmm_rep)
+	def get_hmm_rep (self, num_frames=None):
+
+		### Step 1: get the positions of the frames to keep ###
+		if num_frames is None or num_frames > self.num_frames:
+			num_frames = self.num_frames
+		if num_frames == self.gesture_length:
+			positions = self.full_hmm_rep_positions
+			indices = self.hmm_rep_indices
+		else:
+			positions = self.get_hmm_rep_positions (num_frames)
+			indices = np.zeros (len(positions), dtype=int)
+
+		### Step 2: map them into the ring (oldest observation is at head - num_frames) ###
+		np.add (positions, self.head - num_frames, out=indices)
+		np.remainder (indices, self.gesture_length, out=indices)
+
+		### Step 3: gather them in a single pass ###
+		self.hmm_rep = self.O.take (indices, axis=0)
 		return self.hmm_rep
 
 
@@ -110,53 +181,52 @@ class Gesture:
 	# pops off the oldest frame contained in this gesture
 	def pop_oldest_frame (self):
 
-		self.O.pop(0)
-		self.frames.pop (0)
-
-	# Function: get_prev_frames
-	# -------------------------
-	# gets the frames to use for first/second derivative features.
-	def get_prev_frames (self):
+		if self.num_frames > 0:
+			self.num_frames -= 1
 
-		### Step 1: get the newest frame ###
-		newest_frame = self.frames[-1]
+	# Function: get_prev_positional_features
+	# --------------------------------------
+	# gets the (cached) positional features of the frames to use for
+	# first/second derivative features of the next frame; None means
+	# there are insufficient frames, and the new frame itself is used.
+	def get_prev_positional_features (self):
 
-		### Step 2: set d1_frame, d2_frame as frame if insuffucient 
-		d1_frame = newest_frame
-		d2_frame = newest_frame
-		if len (self.O) > self.d1_length:
-			d1_frame = self.frames[-self.d1_length]
-		if len(self.O) > self.d2_length:
-			d2_frame = self.frames[-self.d2_length]
+		d1_positional_features = None
+		d2_positional_features = None
+		if self.num_frames > self.d1_length:
+			d1_positional_features = self.P[(self.head - self.d1_length + 1) % self.gesture_length]
+		if self.num_frames > self.d2_length:
+			d2_positional_features = self.P[(self.head - self.d2_length + 1) % self.gesture_length]
 
-		return (d1_frame, d2_frame)
+		return (d1_positional_features, d2_positional_features)
 
 
 	# Function: add_frame 
 	# -------------------
 	# takes in a Leap frame object and adds to the current gesture;
-	# removes excessive frames if necessary
+	# overwrites the oldest frame once the gesture is full. hand is the
+	# hand in the frame this gesture follows (the frame's first hand if None)
 	# Note: should probably have a mechanism that clears the gesture if the hand disappears?
-	def add_frame (self, frame):
+	def add_frame (self, frame, hand=None):
 
-		### Step 1: add to list of 'Frame' objects (self.frames) ###
-		self.frames.append (frame)
+		### Step 1: compute the observation from this frame and the cached positional features of earlier ones ###
+		(d1_positional_features, d2_positional_features) = self.get_prev_positional_features ()
+		position = Position (frame, d1_positional_features, d2_positional_features, hand)
 
-		### Step 2: add to the list of observations (self.O) ###
-		(d1_frame, d2_frame) = self.get_prev_frames ()
-		position = Position (frame, d1_frame, d2_frame)
-		self.O.append (position.features)
 
-
-		### Step 3: if the hand was missing, reset the gesture (only consider sequences where we see the hand) ###
-		if position.features == None:
+		### Step 2: if the hand was missing, reset the gesture (only consider sequences where we see the hand) ###
+		if position.features is None:
 			self.clear ()
 			return
 
 
-		### Step 5: remove frames if necessary ###
-		if len(self.O) > self.gesture_length:
-			self.pop_oldest_frame ()
+		### Step 3: write it into the rings, overwriting the oldest if full ###
+		self.O[self.head] = position.features
+		self.P[self.head] = position.positional_features
+		self.head = (self.head + 1) % self.gesture_length
+		if self.num_frames < self.gesture_length:
+			self.num_frames += 1
+		self.frame_count += 1
 
 
 	# Function: clear
@@ -164,8 +234,9 @@ class Gesture:
 	# clears the gesture. should be called after a classification goes through
 	def clear (self):
 
-		self.frames = []
-		self.O = []
+		self.head = 0
+		self.num_frames = 0
+		self.frame_count = 0
 
 
 
@@ -187,7 +258,7 @@ class Gesture:
 	def pickle_self (self, save_filepath):
 
 		save_file = open(save_filepath, 'w')
-		pickle.dump (self.O, save_file)
+		pickle.dump (list(self.get_observations ()), save_file)
 		save_file.close ()
 
 
@@ -197,10 +268,44 @@ class Gesture:
 	def load_observations (self, observations_filepath):
 
 		open_file = open (observations_filepath, 'r')
-		self.O = pickle.load (open_file)
+		self.set_observations (pickle.load (open_file))
 		open_file.close ()
 
 
+	# Function: set_observations
+	# --------------------------
+	# replaces the contents of this gesture with the passed observations
+	# (oldest first), made frame_interval seconds apart (if given). The
+	# gesture grows to hold all of them; shorter ones leave it not full.
+	def set_observations (self, observations, frame_interval=None):
+
+		observations = np.asarray (observations)
+		if frame_interval and frame_interval != self.frame_interval:
+			self.frame_interval = frame_interval
+			self.resize (max (len(observations), self.gesture_length))
+		elif len(observations) > self.gesture_length:
+			self.resize (len(observations))
+		self.clear ()
+		self.num_frames = len(observations)
+		self.frame_count = self.num_frames
+		self.O[:self.num_frames] = observations
+		self.P[:self.num_frames] = observations[:, :Position.num_positional_features]
+		self.head = self.num_frames % self.gesture_length
+
+
+	# Function: refeaturize
+	# ---------------------
+	# recomputes the observations from their positional features with the
+	# current d1_length/d2_length (e.g. after changing them). Frames from
+	# before the start of the gesture are not available, so its first
+	# d2_length observations use the shorter derivatives Gesture uses at the
+	# start of a recording.
+	def refeaturize (self):
+
+		self.set_observations (compute_features_batch (self.get_observations ()[:, :Position.num_positional_features], self.d1_length, self.d2_length))
+
+
+
 
 
 
@@ -209,4 +314,11 @@ class Gesture:
 
 
 
+# Function: get_frame_reduction_const
+# -----------------------------------
+# the number of frames between those of the hmm rep, for frames taken
+# frame_interval seconds apart: the nearest whole number of frames to
+# hmm_rep_interval (Gesture.frame_reduction_const at the nominal frame rate)
+def get_frame_reduction_const (frame_interval):
 
+	return max (1, int(round (Gesture.hmm_rep_interval / frame_interval)))
@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# *------------------------------------------------------------ *
+# * Class: Gesture_Dataset
+# * ----------------------
+# * all recorded gesture examples in one place: a single file of
+# * float32 observations plus an index of where each example is
+# *
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+import sys
+import pickle
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Gesture import Gesture
+from Position import Position
+
+#--- Numpy ---
+import numpy as np
+
+
+
+# Class: Gesture_Dataset
+# ----------------------
+# On disk, a dataset is a directory containing:
+#	- observations.f32: every example's observations, back to back, as one
+#	  contiguous little-endian float32 (num_rows, num_features) array
+#	- index.txt: a 'num_features' header line, then one tab-separated
+#	  'gesture_type offset length frame_interval' line per example
+#	  (offset/length in rows; frame_interval, the seconds between its
+#	  frames, is missing from older datasets and taken to be nominal)
+# Both files are only ever appended to, so record mode can add examples as
+# they come in. The observations are memory-mapped when read.
+class Gesture_Dataset:
+
+	#--- Filenames ---
+	dataset_dir 			= None
+	observations_filename 	= None
+	index_filename 			= None
+
+	#--- Data ---
+	index 			= []		# list of (gesture_type, offset, length), one per example
+	frame_intervals = []		# seconds between the frames of each example (parallel to index)
+	observations 	= None		# memory-mapped (num_rows, num_features) float32 array; None until needed
+	num_rows 		= 0			# total number of observations in the dataset
+
+	#--- Parameters ---
+	dtype 			= np.dtype ('<f4')
+	num_features 	= Position.num_features
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# points the dataset at a directory and reads its index, if it exists
+	def __init__ (self, dataset_dir):
+
+		### Step 1: set filenames ###
+		self.dataset_dir 			= dataset_dir
+		self.observations_filename 	= os.path.join (dataset_dir, 'observations.f32')
+		self.index_filename 		= os.path.join (dataset_dir, 'index.txt')
+
+		### Step 2: read in the index ###
+		self.index 			= []
+		self.frame_intervals = []
+		self.observations 	= None
+		self.num_rows 		= 0
+		if self.exists ():
+			self.load_index ()
+
+
+
+
+
+
+	########################################################################################################################
+	##############################[ --- Reading --- ]#######################################################################
+	########################################################################################################################
+
+	# Function: exists
+	# ----------------
+	# returns wether there is a dataset on disk at dataset_dir
+	def exists (self):
+
+		return os.path.exists (self.index_filename)
+
+
+	# Function: load_index
+	# --------------------
+	# reads index.txt into self.index
+	def load_index (self):
+
+		index_file = open (self.index_filename, 'r')
+		self.num_features = int(index_file.readline ().split ()[1])
+		self.index = []
+		self.frame_intervals = []
+		for line in index_file:
+			fields = line.rstrip ('\n').split ('\t')
+			(gesture_type, offset, length) = fields[:3]
+			self.index.append ((gesture_type, int(offset), int(length)))
+			self.frame_intervals.append (float(fields[3]) if len(fields) > 3 else Gesture.nominal_frame_interval)
+		index_file.close ()
+
+		self.num_rows = sum ([length for (gesture_type, offset, length) in self.index])
+		self.observations = None
+
+
+	# Function: get_all_observations
+	# ------------------------------
+	# returns the (num_rows, num_features) memory-mapped observations;
+	# nothing is read from disk until the rows are accessed
+	def get_all_observations (self):
+
+		if self.observations is None:
+			if self.num_rows == 0:
+				self.observations = np.zeros ((0, self.num_features), dtype=self.dtype)
+			else:
+				self.observations = np.memmap (self.observations_filename, dtype=self.dtype, mode='r', shape=(self.num_rows, self.num_features))
+
+		return self.observations
+
+
+	# Function: get_gesture_types
+	# ---------------------------
+	# returns the (sorted) list of gesture types in the dataset
+	def get_gesture_types (self):
+
+		return sorted (set ([gesture_type for (gesture_type, offset, length) in self.index]))
+
+
+	# Function: get_observations
+	# --------------------------
+	# returns a (length, num_features) view of the i'th example's observations
+	def get_observations (self, i):
+
+		(gesture_type, offset, length) = self.index[i]
+		return self.get_all_observations ()[offset:offset + length]
+
+
+	# Function: get_gestures_of_type
+	# ------------------------------
+	# returns a list of Gesture objects for all examples of gesture_type
+	def get_gestures_of_type (self, gesture_type):
+
+		gestures = []
+		for i, (example_type, offset, length) in enumerate (self.index):
+			if example_type == gesture_type:
+				gesture = Gesture (name=gesture_type)
+				gesture.set_observations (self.get_observations (i), self.frame_intervals[i])
+				gestures.append (gesture)
+
+		return gestures
+
+
+
+
+
+
+	########################################################################################################################
+	##############################[ --- Writing --- ]#######################################################################
+	########################################################################################################################
+
+	# Function: create
+	# ----------------
+	# creates an empty dataset on disk
+	def create (self):
+
+		if not os.path.exists (self.dataset_dir):
+			os.makedirs (self.dataset_dir)
+
+		open (self.observations_filename, 'wb').close ()
+		index_file = open (self.index_filename, 'w')
+		index_file.write ('num_features\t' + str(self.num_features) + '\n')
+		index_file.close ()
+
+		self.index 			= []
+		self.frame_intervals = []
+		self.observations 	= None
+		self.num_rows 		= 0
+
+
+	# Function: append
+	# ----------------
+	# adds an example's observations (oldest first), made frame_interval
+	# seconds apart, to the dataset. the rows are written before the index
+	# entry, so an interrupted append never leaves the index pointing past
+	# the end of the observations; rows an interrupted append left behind
+	# without an index entry are dropped by the next one, so they never
+	# shift the examples after them.
+	def append (self, gesture_type, observations, frame_interval=Gesture.nominal_frame_interval):
+
+		if not self.exists ():
+			self.create ()
+
+		observations = np.asarray (observations, dtype=self.dtype)
+		if observations.ndim != 2 or observations.shape[1] != self.num_features:
+			print_error ("Gesture Dataset", "Expected observations with " + str(self.num_features) + " features, got shape " + str(observations.shape))
+
+		### Step 1: append the rows after the indexed ones ###
+		observations_file = open (self.observations_filename, 'r+b')
+		observations_file.truncate (self.num_rows * self.num_features * self.dtype.itemsize)
+		observations_file.seek (0, os.SEEK_END)
+		observations.tofile (observations_file)
+		observations_file.close ()
+
+		### Step 2: append the index entry ###
+		entry = (gesture_type, self.num_rows, len(observations))
+		index_file = open (self.index_filename, 'a')
+		index_file.write ('\t'.join ([str(field) for field in entry] + [repr (float(frame_interval))]) + '\n')
+		index_file.close ()
+
+		### Step 3: update in-memory state; the memory map has to be redone ###
+		self.index.append (entry)
+		self.frame_intervals.append (float(frame_interval))
+		self.num_rows += len(observations)
+		self.observations = None
+
+
+	# Function: convert_gesture_tree
+	# ------------------------------
+	# appends every example in an old-style data directory
+	# (data_dir/<gesture_type>/<n>.gesture pickles) to this dataset
+	def convert_gesture_tree (self, data_dir):
+
+		gesture_types = sorted ([d for d in os.listdir (data_dir) if os.path.isdir (os.path.join (data_dir, d))])
+		for gesture_type in gesture_types:
+
+			gesture_dir = os.path.join (data_dir, gesture_type)
+			gesture_filenames = sorted ([g for g in os.listdir (gesture_dir) if g.endswith ('.gesture')], key=lambda g: int(g.split ('.')[0]))
+			print_inner_status ("Gesture Dataset (convert_gesture_tree)", "Converting " + str(len(gesture_filenames)) + " gestures of type " + gesture_type)
+
+			for gesture_filename in gesture_filenames:
+				open_file = open (os.path.join (gesture_dir, gesture_filename), 'r')
+				self.append (gesture_type, np.array (pickle.load (open_file)))
+				open_file.close ()
+
+
+
+
+
+
+if __name__ == "__main__":
+
+	### Usage: ./Gesture_Dataset.py [data_dir] [dataset_dir] ###
+	data_dir 	= sys.argv[1] if len(sys.argv) > 1 else os.path.join (os.getcwd (), 'data/')
+	dataset_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join (os.getcwd (), 'dataset/')
+
+	print_message ("Converting " + data_dir + " -> " + dataset_dir)
+	dataset = Gesture_Dataset (dataset_dir)
+	if dataset.exists ():
+		print_error ("Gesture Dataset", "A dataset already exists at " + dataset_dir)
+
+	dataset.create ()
+	dataset.convert_gesture_tree (data_dir)
+	print_status ("Gesture Dataset", "Converted " + str(len(dataset.index)) + " examples (" + str(dataset.num_rows) + " observations)")
@@ -12,29 +12,82 @@ import os
 import sys
 import pickle
 import random
+import zlib
+import hashlib
+import argparse
 from operator import itemgetter 
 from collections import defaultdict
+from multiprocessing import Pool
 
 #--- My Files ---
 ### NOTE: change the path below to the location of your local installation of ***scipy*** ###
 sys.path.append ('/Users/jayhack/anaconda/lib/python2.7/site-packages/scipy/')
 from common_utilities import print_message, print_error, print_status, print_inner_status
 from Gesture import Gesture
+from Gesture_Dataset import Gesture_Dataset
+from HMM_Bank import HMM_Bank
+from Model_Artifact import Model_Artifact, load_artifact
+from Feature_Cache import Feature_Cache
 
-#--- SKLearn ---
+#--- Numpy ---
 import numpy as np
-from sklearn.hmm import GaussianHMM
-from sklearn.linear_model import LogisticRegression
-from sklearn import cross_validation
+# (sklearn is only imported by the training code, so that synth mode runs on numpy alone)
+
+
+
+########################################################################################################################
+##############################[ --- HMM Training Jobs --- ]#############################################################
+########################################################################################################################
+# (module-level so that they can be handed to worker processes)
+
+# Function: fit_hmm
+# -----------------
+# given (gesture_type, hmm_examples, num_states, random_seed, initial_hmm),
+# fits and returns (gesture_type, hmm); if initial_hmm isn't None, it is
+# refit starting from its current parameters
+def fit_hmm (job):
+
+	from sklearn.hmm import GaussianHMM
+
+	(gesture_type, hmm_examples, num_states, random_seed, initial_hmm) = job
+	if initial_hmm is None:
+		hmm = GaussianHMM (num_states, random_state=random_seed)
+	else:
+		hmm = initial_hmm
+		hmm.init_params = ''
+	hmm.fit (hmm_examples)
+	return (gesture_type, hmm)
+
+
+# Function: get_example_hash
+# --------------------------
+# returns a hash of an hmm rep's contents
+def get_example_hash (hmm_rep):
+
+	return hashlib.sha1 (np.ascontiguousarray (hmm_rep, dtype=float).tostring ()).hexdigest ()[:16]
+
+
+# Function: score_hmm_examples
+# ----------------------------
+# given (hmm, hmm_examples), returns a list of (score, state sequence) for
+# each example; used for diagnostics only
+def score_hmm_examples (job):
+
+	(hmm, hmm_examples) = job
+	return [(hmm.score (example), hmm.predict (example)) for example in hmm_examples]
+
 
 
 class Gesture_Recognizer:
 
 	#--- Filenames ---
 	data_dir 				= os.path.join 	(os.getcwd(), 'data/')
+	dataset_dir 			= os.path.join 	(os.getcwd(), 'dataset/')	# consolidated dataset; used instead of data_dir once it exists
 	classifiers_dir 		= os.path.join 	(os.getcwd (), 'classifiers/')
 	hmms_filename 			= os.path.join	(classifiers_dir, 'hmms.pkl')
 	classifier_filename 	= os.path.join 	(classifiers_dir, 'classifier.pkl')
+	model_filename 			= os.path.join 	(classifiers_dir, 'model.lrm')		# Model_Artifact; loaded instead of the pickles when present
+	feature_cache_filename 	= os.path.join 	(classifiers_dir, 'features.npz')	# Feature_Cache of the examples' hmm scores
 	gesture_dirs 			= {}	# dict: gesture_type -> directory containing recorded examples
 
 
@@ -46,22 +99,34 @@ class Gesture_Recognizer:
 
 	#--- Data ---
 		#--- Gesture objects ---
+	dataset = None			# Gesture_Dataset at dataset_dir
 	gesture_types = []		# list of all types of gestures
 	gestures = {}			# dict: gesture_type -> list of gesture objects
 		#--- Classifiable examples ---
 	all_examples = []		# list of all examples of gestures in appropriate format for LR. (features, label) tuples.
 	training_examples = []	# list of training examples for the classifier. (features, label) tuples.
 	testing_examples = []	# list of all testing examples for the classifier. (features, label) tuples.
+		#--- Data versions (for incremental training) ---
+	example_hashes = {}		# dict: gesture_type -> list of content hashes of self.gestures[gesture_type]
+	data_hashes = {}		# dict: gesture_type -> hash of all its examples
+	feature_cache = None	# Feature_Cache: (example hash, hmm hash) -> score
 
 
 	#--- Classifiers/Probabilistic Modesl ---
-	hmms = {}							# dict mapping gesture_type -> gaussian hmm
-	classifier = LogisticRegression ()	# softmax regression classifier
+	hmms = {}							# dict mapping gesture_type -> gaussian hmm (empty when loaded from a Model_Artifact; see Model_Artifact.get_hmms)
+	classifier = None					# logistic regression: sklearn's LogisticRegression once trained, a Logistic_Classifier once loaded from a Model_Artifact
+	hmm_bank = None						# HMM_Bank of self.hmms, for scoring
+	model_artifact = None				# Model_Artifact the model was loaded from, if any
 
 
 	#--- Parameters ---
 	num_hmm_states 					= 7		# number of states in HMM
+	num_training_workers			= 1		# number of processes to fit hmms with (1 = no worker processes)
+	hmm_random_seed 				= 0		# each gesture type's hmm is seeded from this and its name
+	print_hmm_diagnostics 			= True	# wether to score/decode every training example after fitting
 	training_examples_proportion	= 0.75	# amount of data to train on
+	use_feature_cache 				= True	# wether get_all_examples keeps the examples' hmm scores in feature_cache_filename across runs
+	length_normalized_scores 		= True	# wether hmm scores are divided by the length of the hmm rep (so examples of any length are comparable)
 	prediction_prob_threshold		= 0.8
 
 
@@ -71,8 +136,9 @@ class Gesture_Recognizer:
 	# load data and train model
 	def __init__ (self):
 		
-		### Step 1: initialize self.gestures ###
+		### Step 1: initialize self.gestures and the dataset ###
 		self.gestures = {}
+		self.dataset = Gesture_Dataset (self.dataset_dir)
 
 		### Step 2: get all gesture types ###
 		self.get_gesture_types ()
@@ -88,9 +154,16 @@ class Gesture_Recognizer:
 
 	# Function: get_gesture_types
 	# ---------------------------
-	# fills in self.gesture_types by observing all the directories
-	# in self.data_dir, with the exception of .DS_Store
+	# fills in self.gesture_types from the dataset if there is one; otherwise
+	# by observing all the directories in self.data_dir, with the exception of .DS_Store
 	def get_gesture_types (self):
+		if self.dataset.exists ():
+			self.gesture_types = self.dataset.get_gesture_types ()
+			return
+		if not os.path.isdir (self.data_dir):
+			self.gesture_types = []
+			return
+
 		self.gesture_types = os.listdir (self.data_dir)
 		if '.DS_Store' in self.gesture_types:
 			self.gesture_types.remove ('.DS_Store')
@@ -152,14 +225,20 @@ class Gesture_Recognizer:
 
 	# Function: save_gesture 
 	# ----------------------
-	# pickles a given gesture
+	# appends a given gesture to the dataset if there is one; pickles it otherwise
 	def save_gesture (self, gesture):
 
 		### Step 1: save the gesture ###
-		save_filename = self.get_save_filename (gesture.name)
-		gesture.pickle_self (save_filename)
-		print_status ("Gesture Recognizer", "Saved recorded gesture at " + save_filename)
-		print gesture.O
+		if self.dataset.exists ():
+			self.dataset.append (gesture.name, gesture.get_observations (), gesture.frame_interval)
+			if not gesture.name in self.gesture_types:
+				self.gesture_types.append (gesture.name)
+			print_status ("Gesture Recognizer", "Saved recorded gesture to " + self.dataset_dir + " (" + str(len(self.dataset.index)) + " examples)")
+		else:
+			save_filename = self.get_save_filename (gesture.name)
+			gesture.pickle_self (save_filename)
+			print_status ("Gesture Recognizer", "Saved recorded gesture at " + save_filename)
+		print gesture.get_observations ()
 
 
 	# Function: load_gestures_of_type
@@ -171,18 +250,20 @@ class Gesture_Recognizer:
 		### Step 1: initialize list of gestures of this type ###
 		self.gestures[gesture_type] = []
 
-		### Step 2: get all filenames from the appropriate gesture_dir ###
-		gesture_filenames = [os.path.join (self.gesture_dirs[gesture_type], g) for g in os.listdir (self.gesture_dirs[gesture_type])]
-
-		### Step 3: for each filename, load in a gesture from it and add to list ###
-		for gesture_filename in gesture_filenames:
+		### Step 2: get all gestures, from the dataset if there is one ###
+		if self.dataset.exists ():
+			new_gestures = self.dataset.get_gestures_of_type (gesture_type)
+		else:
+			gesture_filenames = [os.path.join (self.gesture_dirs[gesture_type], g) for g in os.listdir (self.gesture_dirs[gesture_type])]
+			new_gestures = [Gesture (name=gesture_type, observations_filepath=gesture_filename) for gesture_filename in gesture_filenames]
 
-			### --- create the gesture --- ###
-			new_gesture = Gesture (name=gesture_type, observations_filepath=gesture_filename)
+		### Step 3: add each to the list ###
+		for new_gesture in new_gestures:
 
-			### --- make sure it is full/clean --- ###
-			if not new_gesture.is_full ():
-				print_error ("Loading Gestures", "Encountered a gesture that is not yet full")
+			### --- make sure it is clean (examples may be of any length) --- ###
+			if new_gesture.num_frames == 0:
+				print_inner_status ("Loading Gestures", "Skipping an empty " + gesture_type + " example")
+				continue
 
 			### --- add to the list of gestures --- ###
 			self.gestures[gesture_type].append (new_gesture)
@@ -194,8 +275,9 @@ class Gesture_Recognizer:
 	# fills self.gestures in entirety
 	def load_gestures (self):
 
-		### Step 1: initialize self.gestures ###
+		### Step 1: initialize self.gestures; re-read the dataset's index ###
 		self.gestures = {}
+		self.dataset = Gesture_Dataset (self.dataset_dir)
 
 		### Step 2: get all gesture types ###
 		self.get_gesture_types ()
@@ -230,30 +312,94 @@ class Gesture_Recognizer:
 	##############################[ --- Getting HMMs --- ]##################################################################
 	########################################################################################################################
 
-	# Function: get_hmms
-	# ------------------
-	# for each gesture_type, this will train an hmm
-	def get_hmms (self):
+	# Function: get_hmm_seed
+	# -----------------------
+	# returns the random seed for a gesture type's hmm; depends only on
+	# hmm_random_seed and the type's name, so results don't depend on
+	# the number of workers or the order the hmms are fit in
+	def get_hmm_seed (self, gesture_type):
+
+		return (self.hmm_random_seed + zlib.crc32 (gesture_type)) & 0x7fffffff
 
-		for gesture_type in self.gesture_types:
 
-			print_status ("Get_Hmms", "Fitting for gesture_type: " + gesture_type)
-			### Step 1: fill hmm_examples appropriately ###
-			hmm_examples = []
-			for gesture in self.gestures[gesture_type]:
-				hmm_rep = gesture.get_hmm_rep ()
-				hmm_examples.append (hmm_rep)
+	# Function: get_data_hashes
+	# -------------------------
+	# fills self.example_hashes and self.data_hashes from self.gestures
+	def get_data_hashes (self):
 
-			### Step 2: fit parameters for the hmm ###
-			hmm = GaussianHMM (self.num_hmm_states)
-			hmm.fit (hmm_examples)
+		self.example_hashes = {}
+		self.data_hashes = {}
+		for gesture_type, gestures_of_type in self.gestures.items ():
+			self.example_hashes[gesture_type] = [get_example_hash (gesture.get_hmm_rep ()) for gesture in gestures_of_type]
+			self.data_hashes[gesture_type] = hashlib.sha1 (''.join (sorted (self.example_hashes[gesture_type]))).hexdigest ()[:16]
 
-			### Step 3: store the hmm in self.hmms ###
+
+	# Function: get_hmms
+	# ------------------
+	# for each gesture_type, this will train an hmm; with num_workers > 1,
+	# the hmms are fit concurrently in a pool of worker processes.
+	# given the Model_Artifact of a previous training run, it trains
+	# incrementally instead: the hmms of gesture types whose examples haven't
+	# changed are kept as they are, and those of types whose examples have
+	# are refit starting from their previous parameters.
+	def get_hmms (self, num_workers=None, print_diagnostics=None, previous_artifact=None):
+
+		if num_workers is None:
+			num_workers = self.num_training_workers
+		if print_diagnostics is None:
+			print_diagnostics = self.print_hmm_diagnostics
+
+		### Step 1: fill hmm_examples appropriately for each gesture type ###
+		hmm_examples = {}
+		for gesture_type in self.gesture_types:
+			hmm_examples[gesture_type] = [gesture.get_hmm_rep () for gesture in self.gestures[gesture_type]]
+		self.get_data_hashes ()
+
+		### Step 2: decide which hmms to fit, and from where ###
+		self.hmms = {}
+		fit_types = list(self.gesture_types)
+		initial_hmms = dict ([(gesture_type, None) for gesture_type in self.gesture_types])
+		if previous_artifact is not None:
+			previous_hmms = previous_artifact.get_hmms ()
+			previous_data_hashes = previous_artifact.attributes.get ('data_hashes', {})
+			fit_types = []
+			for gesture_type in self.gesture_types:
+				previous_hmm = previous_hmms.get (gesture_type)
+				if previous_hmm is None or previous_hmm.n_components != self.num_hmm_states:
+					fit_types.append (gesture_type)
+				elif previous_data_hashes.get (gesture_type) == self.data_hashes[gesture_type]:
+					self.hmms[gesture_type] = previous_hmm
+				else:
+					fit_types.append (gesture_type)
+					initial_hmms[gesture_type] = previous_hmm
+			print_status ("Get_Hmms", "Incremental: keeping " + str(len(self.hmms)) + " hmms, warm-starting " + str(len([t for t in fit_types if initial_hmms[t] is not None])) + ", fitting " + str(len([t for t in fit_types if initial_hmms[t] is None])) + " from scratch")
+
+		### Step 3: get a pool of workers, if appropriate ###
+		pool = None
+		job_map = map
+		if num_workers > 1 and len(fit_types) > 1:
+			pool = Pool (num_workers)
+			job_map = pool.map
+
+		### Step 4: fit parameters for each hmm and store them in self.hmms ###
+		print_status ("Get_Hmms", "Fitting " + str(len(fit_types)) + " gesture types with " + str(num_workers) + " worker(s)")
+		jobs = [(gesture_type, hmm_examples[gesture_type], self.num_hmm_states, self.get_hmm_seed (gesture_type), initial_hmms[gesture_type]) for gesture_type in fit_types]
+		for gesture_type, hmm in job_map (fit_hmm, jobs):
 			self.hmms[gesture_type] = hmm
+		self.hmm_bank 		= None
+		self.model_artifact = None
 
-			print_inner_status (gesture_type, "predicted the following sequences: (score: sequence)")
-			for example in hmm_examples:
-				print "		", hmm.score (example), ": ", hmm.predict (example)
+		### Step 5: print diagnostics, if appropriate ###
+		if print_diagnostics:
+			jobs = [(self.hmms[gesture_type], hmm_examples[gesture_type]) for gesture_type in fit_types]
+			for gesture_type, results in zip (fit_types, job_map (score_hmm_examples, jobs)):
+				print_inner_status (gesture_type, "predicted the following sequences: (score: sequence)")
+				for (score, sequence) in results:
+					print "		", score, ": ", sequence
+
+		if pool:
+			pool.close ()
+			pool.join ()
 
 
 
@@ -273,34 +419,125 @@ class Gesture_Recognizer:
 	# representation that can be passed to a LR classifier for training/classification
 	def get_classifiable_rep (self, gesture):
 
-		classifiable_rep = []
+		return list(self.get_classifiable_reps ([gesture])[0])
+
 
-		hmm_rep = gesture.get_hmm_rep ()
-		for gesture_type, hmm in self.hmms.items ():
+	# Function: get_classifiable_reps
+	# -------------------------------
+	# batch version of get_classifiable_rep: given a list of N Gestures,
+	# returns the (N, num_hmms) matrix of their hmm scores (columns in
+	# self.hmms.items () order)
+	def get_classifiable_reps (self, gestures):
 
-			hmm_score 		= hmm.score 	(hmm_rep)
-			hmm_sequence 	= hmm.predict 	(hmm_rep)
+		return self.score_hmm_reps ([gesture.get_hmm_rep () for gesture in gestures])
 
-			### --- Note: for now, just go with scores? --- ###
-			classifiable_rep.append (hmm_score)
 
-		return classifiable_rep
+	# Function: score_hmm_reps
+	# ------------------------
+	# given a list of N hmm reps (e.g. from N gestures, or N sliding windows
+	# over one recording), returns the (N, num_hmms) matrix of their scores,
+	# normalized by length (see normalize_scores). (against the hmms of
+	# hmm_bank instead of self.hmms, if given)
+	def score_hmm_reps (self, hmm_reps, hmm_bank=None):
 
+		return self.normalize_scores (self.get_hmm_scores (hmm_reps, hmm_bank), [len(hmm_rep) for hmm_rep in hmm_reps])
 
-	# Function: get_all_examples
+
+	# Function: normalize_scores
 	# --------------------------
-	# converts self.gestures -> self.all_examples
-	def get_all_examples (self):
+	# given (N, num_hmms) hmm scores and the lengths of the N hmm reps they
+	# are of, returns them divided by those lengths (per-observation
+	# log-likelihoods) if length_normalized_scores; as they are otherwise
+	def normalize_scores (self, scores, rep_lengths):
+
+		if not self.length_normalized_scores:
+			return scores
+		return scores / np.asarray (rep_lengths, dtype=float)[:, np.newaxis]
+
+
+	# Function: get_hmm_scores
+	# ------------------------
+	# the raw (unnormalized) log-likelihoods behind score_hmm_reps. reps of
+	# equal length are stacked and scored against all hmms together.
+	def get_hmm_scores (self, hmm_reps, hmm_bank=None):
+
+		if hmm_bank is None:
+			hmm_bank = self.get_hmm_bank ()
+		scores = np.empty ((len(hmm_reps), hmm_bank.get_num_models ()))
+
+		### Step 1: group the reps by length ###
+		indices_by_length = defaultdict (list)
+		for i, hmm_rep in enumerate (hmm_reps):
+			indices_by_length[len(hmm_rep)].append (i)
+
+		### Step 2: score each group against every hmm ###
+		for length, indices in indices_by_length.items ():
+			scores[indices] = hmm_bank.batch_score (np.array ([hmm_reps[i] for i in indices], dtype=float))
+
+		return scores
+
+
+	# Function: get_cached_classifiable_reps
+	# -------------------------------------
+	# get_classifiable_reps for gestures with the given content hashes,
+	# through the feature cache: examples it has no scores for are scored
+	# against every hmm, those it has some for only against the hmms it
+	# lacks, and everything new is added to it. The cache holds raw scores,
+	# so it stays valid whichever way they are normalized.
+	def get_cached_classifiable_reps (self, gestures, example_hashes):
+
+		hmm_bank = self.get_hmm_bank ()
+		model_hashes = hmm_bank.get_model_hashes ()
+		if self.feature_cache is None:
+			self.feature_cache = Feature_Cache (self.feature_cache_filename)
+
+		### Step 1: look everything up ###
+		scores = self.feature_cache.get_scores (example_hashes, model_hashes)
+		is_missing = np.isnan (scores)
+		new_indices = np.flatnonzero (np.all (is_missing, axis=1))
+		partial_indices = np.flatnonzero (np.any (is_missing, axis=1) & ~np.all (is_missing, axis=1))
+
+		### Step 2: new examples: score against every hmm ###
+		if len(new_indices) > 0:
+			scores[new_indices] = self.get_hmm_scores ([gestures[i].get_hmm_rep () for i in new_indices])
+
+		### Step 3: the rest: score against the hmms that are missing for any of them ###
+		missing_models = []
+		if len(partial_indices) > 0:
+			missing_models = np.flatnonzero (np.any (is_missing[partial_indices], axis=0))
+			missing_scores = self.get_hmm_scores ([gestures[i].get_hmm_rep () for i in partial_indices], hmm_bank.get_subset (missing_models))
+			scores[np.ix_ (partial_indices, missing_models)] = missing_scores
+
+		### Step 4: remember them ###
+		if len(new_indices) > 0 or len(partial_indices) > 0:
+			self.feature_cache.add_scores (example_hashes, model_hashes, scores)
+			self.feature_cache.save ()
+
+		print_status ("Get_All_Examples", "Feature cache: " + str(len(example_hashes) - len(new_indices) - len(partial_indices)) + " examples cached, " + str(len(new_indices)) + " scored against all " + str(len(model_hashes)) + " hmms, " + str(len(partial_indices)) + " against " + str(len(missing_models)) + " changed hmms")
+		return self.normalize_scores (scores, [len(gesture.get_hmm_rep ()) for gesture in gestures])
 
-		### Step 1: intialize self.all_examples ###
-		self.all_examples = []
 
-		### Step 2: for each gesture type, convert to appropriate format and add to list ###
-		for gesture_type, gestures in self.gestures.items ():
-			for gesture in gestures:
+	# Function: get_all_examples
+	# --------------------------
+	# converts self.gestures -> self.all_examples; with use_feature_cache,
+	# only (example, hmm) pairs that were never scored before are scored
+	def get_all_examples (self):
 
-				classifiable_rep = self.get_classifiable_rep (gesture)
-				self.all_examples.append ((classifiable_rep, gesture_type))
+		### Step 1: flatten self.gestures into parallel lists ###
+		gesture_types 	= []
+		gestures 		= []
+		for gesture_type, gestures_of_type in self.gestures.items ():
+			gesture_types.extend ([gesture_type] * len(gestures_of_type))
+			gestures.extend (gestures_of_type)
+
+		### Step 2: score them all at once and pair each rep with its type ###
+		if self.use_feature_cache:
+			self.get_data_hashes ()
+			example_hashes = sum ([self.example_hashes[gesture_type] for gesture_type in self.gestures.keys ()], [])
+			classifiable_reps = self.get_cached_classifiable_reps (gestures, example_hashes)
+		else:
+			classifiable_reps = self.get_classifiable_reps (gestures)
+		self.all_examples = [(list(classifiable_rep), gesture_type) for classifiable_rep, gesture_type in zip (classifiable_reps, gesture_types)]
 
 		random.shuffle(self.all_examples)
 
@@ -365,6 +602,9 @@ class Gesture_Recognizer:
 	# Trains the classifier and saves it
 	def train_classifier (self):
 
+		from sklearn.linear_model import LogisticRegression
+
+		self.classifier = LogisticRegression ()
 		X = [ex[0] for ex in self.training_examples]
 		y = [ex[1] for ex in self.training_examples]
 		self.classifier.fit (X, y)
@@ -376,18 +616,17 @@ class Gesture_Recognizer:
 	def evaluate_classifier (self):
 
 		print_message ("Evaluating classifier on test data")
+
+		### Step 1: get probabilities for all testing examples at once ###
+		X = np.array ([ex[0] for ex in self.testing_examples])
+		all_prediction_probs = self.classifier.predict_proba (X)
+		classes = list(self.classifier.classes_)
 		total_score = 0.0
 
-		for ex in self.testing_examples:
+		for ex, prediction_probs in zip (self.testing_examples, all_prediction_probs):
 
-			features = ex[0]
 			true_label = ex[1]
-			prediction 			= self.classifier.predict (features)[0]
-			prediction_probs 	= self.classifier.predict_proba (features)[0]
-
-			classes = list(self.classifier.classes_)
-			index = classes.index (prediction)
-			prediction_prob = prediction_probs [index]
+			prediction_prob = prediction_probs.max ()
 			total_score += prediction_prob
 			if prediction_prob < 0.9:
 				print "Exception: true_label = ", true_label
@@ -399,22 +638,63 @@ class Gesture_Recognizer:
 		print "average score: ", avg_score
 
 
+	# Function: get_previous_model
+	# ----------------------------
+	# returns the Model_Artifact of the last training run to train
+	# incrementally from, or None if there is none
+	def get_previous_model (self):
+
+		if not os.path.exists (self.model_filename):
+			return None
+		return load_artifact (self.model_filename)
+
+
 	# Function: load_model
 	# --------------------
-	# loads the model from a pickled file
+	# loads the model from the model artifact if there is one (memory-mapped,
+	# and not at all if this process already loaded the same file), from the
+	# pickled files otherwise. Models from before length-normalized scores
+	# were trained on raw ones, and are scored that way.
 	def load_model (self):
 
-		self.classifier 	= pickle.load (open(self.classifier_filename, 'r'))
-		self.hmms 			= pickle.load (open(self.hmms_filename, 'r'))
+		### Step 1: pickled model only ###
+		if not os.path.exists (self.model_filename):
+			with open (self.classifier_filename, 'r') as classifier_file:
+				self.classifier = pickle.load (classifier_file)
+			with open (self.hmms_filename, 'r') as hmms_file:
+				self.hmms = pickle.load (hmms_file)
+			self.model_artifact = None
+			self.hmm_bank 		= None
+			self.length_normalized_scores = False
+			return
+
+		### Step 2: model artifact; nothing to do if it is the one already loaded ###
+		model_artifact = load_artifact (self.model_filename)
+		if model_artifact is self.model_artifact:
+			return
+		self.model_artifact = model_artifact
+		self.classifier 	= model_artifact.get_classifier ()
+		self.hmms 			= {}
+		self.hmm_bank 		= model_artifact.get_hmm_bank ()
+		self.length_normalized_scores = bool(model_artifact.attributes.get ('length_normalized_scores', False))
+		print_status ("Gesture Recognizer", "Loaded model artifact " + self.model_filename)
 
 
 	# Function: save_model
 	# --------------------
-	# loads the model from a pickled file
+	# saves the model as a model artifact, and pickled for older code; the
+	# artifact also records the data it was trained on, for incremental training
 	def save_model (self):
 
-		pickle.dump (self.classifier, open(self.classifier_filename, 'w'))
-		pickle.dump (self.hmms, open(self.hmms_filename, 'w'))
+		hmm_bank = self.get_hmm_bank ()
+		hmms = [(gesture_type, self.hmms[gesture_type]) for gesture_type in hmm_bank.gesture_types]
+		attributes = {'data_hashes': self.data_hashes, 'length_normalized_scores': self.length_normalized_scores}
+		Model_Artifact ().from_model (hmms, hmm_bank, self.classifier, attributes).save (self.model_filename)
+
+		with open (self.classifier_filename, 'w') as classifier_file:
+			pickle.dump (self.classifier, classifier_file)
+		with open (self.hmms_filename, 'w') as hmms_file:
+			pickle.dump (self.hmms, hmms_file)
 
 
 
@@ -426,30 +706,83 @@ class Gesture_Recognizer:
 	##############################[ --- Using Classifier --- ]##############################################################
 	########################################################################################################################
 
+	# Function: get_hmm_bank
+	# -----------------------
+	# returns an HMM_Bank of self.hmms (in self.hmms.items () order),
+	# creating it if the hmms have changed
+	def get_hmm_bank (self):
+
+		if self.hmm_bank is None:
+			self.hmm_bank = HMM_Bank (self.hmms.items ())
+		return self.hmm_bank
+
+
 	# Function: classify_gesture
 	# --------------------------
 	# given a Gesture object, this will return the sorted scores from our classifier
 	def classify_gesture (self, gesture):
 
-		### Step 1: get feature_representation ###
-		#--- gesture being passed in is consistently different ---#
-		classifiable_rep = self.get_classifiable_rep (gesture)
+		return self.classify_gestures ([gesture])[0]
 
 
-		### Step 2: have the classifier make predictions ###
-		prediction = self.classifier.predict (classifiable_rep)[0]
-		prediction_probs = self.classifier.predict_proba (classifiable_rep)[0]
+	# Function: classify_gestures
+	# ---------------------------
+	# batch version of classify_gesture: given a list of Gestures, returns a
+	# list with (prediction, probability) or None for each
+	def classify_gestures (self, gestures):
 
-		### Step 3: sort the probability scores ###
-		classes = list(self.classifier.classes_)
-		index = classes.index (prediction)
-		prediction_prob = prediction_probs [index]
-		# print_message ("Best Match: " + str(prediction) + " | Probability: " + str(prediction_prob))
-		# for i, c_i in enumerate(classes):
-			# print ' -', c_i, ': ', prediction_probs[i]
+		return self.classify_reps (self.get_classifiable_reps (gestures))
 
-		if prediction_prob > self.prediction_prob_threshold:
-			return (prediction, prediction_prob)
+
+	# Function: classify_rep
+	# ----------------------
+	# given a classifiable rep (list of hmm scores), returns (prediction, probability)
+	# if the classifier is confident enough; None otherwise
+	def classify_rep (self, classifiable_rep):
+
+		return self.classify_reps ([classifiable_rep])[0]
+
+
+	# Function: classify_reps
+	# -----------------------
+	# batch version of classify_rep: given an (N, num_hmms) matrix of
+	# classifiable reps, returns a list with (prediction, probability) or None
+	# for each. the prediction is the most probable class, so one call to
+	# predict_proba does for all N.
+	def classify_reps (self, classifiable_reps):
+
+		return self.classify_prediction_probs (self.get_prediction_probs (classifiable_reps))
+
+
+	# Function: get_prediction_probs
+	# ------------------------------
+	# given an (N, num_hmms) matrix of classifiable reps, returns the (N, num_classes)
+	# matrix of class probabilities (columns in self.classifier.classes_ order)
+	def get_prediction_probs (self, classifiable_reps):
+
+		return self.classifier.predict_proba (classifiable_reps)
+
+
+	# Function: classify_prediction_probs
+	# -----------------------------------
+	# given an (N, num_classes) matrix of class probabilities, returns a list
+	# with (prediction, probability) or None for each
+	def classify_prediction_probs (self, all_prediction_probs):
+
+		### Step 1: the prediction is the most probable class ###
+		best_indices = np.argmax (all_prediction_probs, axis=1)
+		classes = self.classifier.classes_
+
+		### Step 2: keep the confident ones ###
+		classification_results = []
+		for prediction_probs, index in zip (all_prediction_probs, best_indices):
+			prediction_prob = prediction_probs[index]
+			if prediction_prob > self.prediction_prob_threshold:
+				classification_results.append ((classes[index], prediction_prob))
+			else:
+				classification_results.append (None)
+
+		return classification_results
 
 
 
@@ -461,18 +794,31 @@ class Gesture_Recognizer:
 
 if __name__ == "__main__":
 
+	parser = argparse.ArgumentParser (description="Train and evaluate the gesture recognizer")
+	parser.add_argument ('--workers', type=int, default=Gesture_Recognizer.num_training_workers, help="number of processes to fit hmms with")
+	parser.add_argument ('--seed', type=int, default=Gesture_Recognizer.hmm_random_seed, help="base random seed for the hmms")
+	parser.add_argument ('--no-diagnostics', action='store_true', help="don't score/decode training examples after fitting")
+	parser.add_argument ('--full', action='store_true', help="refit every hmm from scratch instead of training incrementally from the saved model")
+	args = parser.parse_args ()
+
 	print_message ("##### Gesture Recognizer - Train and Evaluate #####")
 
 	gr = Gesture_Recognizer ()
+	gr.num_training_workers 	= args.workers
+	gr.hmm_random_seed 			= args.seed
+	gr.print_hmm_diagnostics 	= not args.no_diagnostics
 
 	### Step 1: load in all the gestures ###
 	print_message ("Loading gestures")
 	gr.load_gestures ()
 	gr.print_gestures_stats ()
 
-	### Step 2: train the HMMs ###
+	### Step 2: train the HMMs (incrementally from the last model, if there is one) ###
 	print_message ("Getting hmms")
-	gr.get_hmms ()
+	previous_model = None
+	if not args.full:
+		previous_model = gr.get_previous_model ()
+	gr.get_hmms (previous_artifact=previous_model)
 
 	### Step 3: get examples ###
 	print_message ("Getting examples for training/testing")
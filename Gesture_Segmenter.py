@@ -0,0 +1,346 @@
+#!/usr/bin/python
+# *------------------------------------------------------------ *
+# * Class: Gesture_Segmenter
+# * ------------------------
+# * finds where gestures start and end in a continuous stream of
+# * observations, from changepoints in the hand's motion energy:
+# * in bulk over long recordings, or frame by frame while live
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+import sys
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Frame_Source import get_hand_records, TIMESTAMP
+from Frame_Log import Frame_Log, records_to_observations, get_frame_interval
+from Gesture import Gesture
+from Motion_Gate import Motion_Gate, get_motion_energy
+from Position import Position
+
+#--- Numpy ---
+import numpy as np
+
+
+
+#--- Segmentation ---
+# A segment is a stretch of frames whose motion energy (see Motion_Gate)
+# stays at or above close_threshold, with lulls of fewer than hold_frames
+# frames bridged, that reaches open_threshold somewhere; it starts at the
+# beginning of the stretch in which it first does and ends at the last
+# frame at or above close_threshold. Segments shorter than min_frames are
+# ignored. Frames without a hand have no motion energy.
+
+
+
+# Function: get_energies
+# ----------------------
+# given (N, num_features) observations (NaN rows for frames without a
+# hand), returns their (N,) motion energies
+def get_energies (observations, angular_weight=Motion_Gate.angular_weight):
+
+	energies = get_motion_energy (observations, angular_weight)
+	return np.where (np.isnan (energies), 0.0, energies)
+
+
+# Function: find_segments
+# -----------------------
+# given the (N,) motion energies of consecutive frames, returns the
+# (num_segments, 2) array of each segment's first and last frame (see
+# above), all at once; the same segments Gesture_Segmenter finds one
+# frame at a time (and then flushes at the end)
+def find_segments (energies, open_threshold=Motion_Gate.open_threshold, close_threshold=Motion_Gate.close_threshold, hold_frames=Motion_Gate.hold_frames, min_frames=1):
+
+	### Step 1: find the stretches at or above close_threshold ###
+	is_active = np.asarray (energies) >= close_threshold
+	edges = np.diff (np.concatenate (([0], is_active.astype (int), [0])))
+	run_starts = np.flatnonzero (edges == 1)
+	run_ends = np.flatnonzero (edges == -1) - 1
+	if len(run_starts) == 0:
+		return np.zeros ((0, 2), dtype=int)
+
+	### Step 2: bridge lulls shorter than hold_frames: group the stretches ###
+	gaps = run_starts[1:] - run_ends[:-1] - 1
+	groups = np.concatenate (([0], np.cumsum (gaps >= hold_frames)))
+
+	### Step 3: each group with a stretch reaching open_threshold is a segment, from that stretch to the group's end ###
+	reaches_open = np.maximum.reduceat (energies, run_starts) >= open_threshold
+	(segment_groups, first_runs) = np.unique (groups[reaches_open], return_index=True)
+	first_runs = np.flatnonzero (reaches_open)[first_runs]
+	last_runs = np.searchsorted (groups, segment_groups, 'right') - 1
+	segments = np.column_stack ((run_starts[first_runs], run_ends[last_runs]))
+
+	### Step 4: drop the short ones ###
+	return segments[segments[:, 1] - segments[:, 0] + 1 >= min_frames]
+
+
+# Function: cut_segment
+# ---------------------
+# given observations and a segment's first and last frame in them, returns
+# a Gesture of gesture_type holding the segment - extended back to at least
+# min_length frames, cut to at most max_length, and only the part after the
+# hand was last missing - or None if there is nothing left of it. The
+# frames are frame_interval seconds apart (if given).
+def cut_segment (gesture_type, observations, start, end, min_length=1, max_length=None, frame_interval=None):
+
+	### Step 1: find the rows ###
+	start = max (min (start, end - min_length + 1), 0)
+	if max_length is not None:
+		start = max (start, end - max_length + 1)
+	rows = observations[start:end + 1]
+	missing = np.flatnonzero (np.isnan (rows[:, 0]))
+	if len(missing) > 0:
+		rows = rows[missing[-1] + 1:]
+	if len(rows) == 0:
+		return None
+
+	### Step 2: make the gesture ###
+	gesture = Gesture (name=gesture_type)
+	gesture.set_observations (rows, frame_interval)
+	return gesture
+
+
+
+
+
+
+# Class: Gesture_Segmenter
+# ------------------------
+# The online version of find_segments: update () is called once per frame
+# with the gesture the frame was added to, and returns a segment's Gesture
+# (see cut_segment) once it is over - hold_frames frames after its last
+# active frame. Keeps the last max_length + hold_frames observations to cut
+# the segments out of.
+class Gesture_Segmenter:
+
+	#--- State ---
+	is_open 			= False		# wether a segment is under way
+	run_start 			= None		# first frame of the current stretch at or above close_threshold, before a segment opens
+	segment_start 		= None		# first frame of the segment under way
+	last_active 		= None		# last frame at or above close_threshold
+	num_quiet_frames 	= 0			# consecutive frames below close_threshold
+
+	#--- History ---
+	observations 		= None		# (history_length, num_features) ring; frame i is at row i % history_length, NaN without a hand
+	num_frames 			= 0			# frames seen so far
+	frame_interval 		= None		# seconds between the frames (those of the gesture passed to update)
+
+	#--- Counters ---
+	num_segments 		= 0
+
+	#--- Parameters ---
+	open_threshold 		= Motion_Gate.open_threshold
+	close_threshold 	= Motion_Gate.close_threshold
+	hold_frames 		= Motion_Gate.hold_frames
+	angular_weight 		= Motion_Gate.angular_weight
+	min_frames 			= 5							# shortest segment (frames at or above close_threshold)
+	min_length 			= 2 * Gesture.frame_reduction_const	# segments are extended back to this many frames
+	max_length 			= 4 * Gesture.gesture_length		# and cut to at most this many
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# sets the thresholds (see find_segments) and allocates the history
+	def __init__ (self, open_threshold=Motion_Gate.open_threshold, close_threshold=Motion_Gate.close_threshold, hold_frames=Motion_Gate.hold_frames, min_frames=5, min_length=2 * Gesture.frame_reduction_const, max_length=4 * Gesture.gesture_length, angular_weight=Motion_Gate.angular_weight):
+
+		if close_threshold > open_threshold:
+			print_error ("Gesture Segmenter", "close_threshold (" + str(close_threshold) + ") must not exceed open_threshold (" + str(open_threshold) + ")")
+		if min_length > max_length:
+			print_error ("Gesture Segmenter", "min_length (" + str(min_length) + ") must not exceed max_length (" + str(max_length) + ")")
+
+		self.open_threshold 	= open_threshold
+		self.close_threshold 	= close_threshold
+		self.hold_frames 		= hold_frames
+		self.min_frames 		= min_frames
+		self.min_length 		= min_length
+		self.max_length 		= max_length
+		self.angular_weight 	= angular_weight
+		self.observations 		= np.zeros ((max_length + hold_frames, Position.num_features))
+		self.reset ()
+
+
+	# Function: reset
+	# ---------------
+	# forgets the stream seen so far
+	def reset (self):
+
+		self.is_open 			= False
+		self.run_start 			= None
+		self.segment_start 		= None
+		self.last_active 		= None
+		self.num_quiet_frames 	= 0
+		self.num_frames 		= 0
+		self.num_segments 		= 0
+
+
+	# Function: update
+	# ----------------
+	# call once per frame with the gesture the frame was added to; returns
+	# the Gesture of the segment that just ended, or None
+	def update (self, gesture):
+
+		### Step 1: remember the observation ###
+		self.frame_interval = gesture.frame_interval
+		row = self.num_frames % len(self.observations)
+		if gesture.frame_count == 0:
+			self.observations[row] = np.nan
+		else:
+			self.observations[row] = gesture.get_newest_observation ()
+
+		### Step 2: advance the state machine ###
+		segment = self.update_energy (get_energies (self.observations[row], self.angular_weight))
+		if segment is None:
+			return None
+		return self.cut (segment)
+
+
+	# Function: update_energy
+	# -----------------------
+	# advances the state machine by a frame of the given motion energy;
+	# returns (first frame, last frame) of the segment that just ended, or None
+	def update_energy (self, energy):
+
+		frame = self.num_frames
+		self.num_frames += 1
+
+		### Step 1: an active frame: extend the stretch, and open a segment if it reaches open_threshold ###
+		if energy >= self.close_threshold:
+			if self.run_start is None:
+				self.run_start = frame
+			self.last_active = frame
+			self.num_quiet_frames = 0
+			if energy >= self.open_threshold and not self.is_open:
+				self.is_open = True
+				self.segment_start = self.run_start
+			return None
+
+		### Step 2: a quiet one: the stretch is over, and so is the segment after hold_frames of them ###
+		self.run_start = None
+		if self.is_open:
+			self.num_quiet_frames += 1
+			if self.num_quiet_frames >= self.hold_frames:
+				return self.close ()
+		return None
+
+
+	# Function: close
+	# ---------------
+	# ends the segment under way; returns it as in update_energy (None if
+	# there isn't one, or it is shorter than min_frames)
+	def close (self):
+
+		if not self.is_open:
+			return None
+
+		self.is_open = False
+		self.num_quiet_frames = 0
+		if self.last_active - self.segment_start + 1 < self.min_frames:
+			return None
+		self.num_segments += 1
+		return (self.segment_start, self.last_active)
+
+
+	# Function: flush
+	# ---------------
+	# ends the segment under way, if any (e.g. at the end of a recording);
+	# returns its Gesture, or None
+	def flush (self):
+
+		segment = self.close ()
+		if segment is None:
+			return None
+		return self.cut (segment)
+
+
+	# Function: cut
+	# -------------
+	# returns the Gesture of a segment still in the history (see cut_segment)
+	def cut (self, segment):
+
+		(start, end) = segment
+		oldest = max (self.num_frames - len(self.observations), 0)
+		start = max (min (start, end - self.min_length + 1), oldest)
+		rows = np.arange (start, end + 1) % len(self.observations)
+		return cut_segment (None, self.observations.take (rows, axis=0), 0, end - start, self.min_length, self.max_length, self.frame_interval)
+
+
+
+
+
+
+########################################################################################################################
+########################################[ --- Training Set Extraction --- ]##############################################
+########################################################################################################################
+
+# Function: segment_log
+# ---------------------
+# finds the segments in a whole Frame_Log and returns them as Gestures: all
+# labelled gesture_type if one is given, otherwise each gesture recorded in
+# the log becomes the segment that overlaps it most (so the recorded
+# boundaries needn't be exact), and unlabelled segments are dropped.
+# segmenter gives the thresholds and lengths.
+def segment_log (frame_log, gesture_type=None, segmenter=None):
+
+	if segmenter is None:
+		segmenter = Gesture_Segmenter ()
+
+	### Step 1: featurize the whole log (its first hand, as recorded) and find its segments ###
+	records = get_hand_records (frame_log.get_records ())
+	timestamps = records[:, TIMESTAMP]
+	observations = records_to_observations (records, frame_log.get_restarts (timestamps))
+	energies = get_energies (observations, segmenter.angular_weight)
+	segments = find_segments (energies, segmenter.open_threshold, segmenter.close_threshold, segmenter.hold_frames, segmenter.min_frames)
+	print_inner_status ("Gesture Segmenter (segment_log)", "Found " + str(len(segments)) + " segments in " + str(len(records)) + " frames")
+
+	### Step 2: label them ###
+	if gesture_type is not None:
+		labels = [(gesture_type, segment) for segment in segments]
+	else:
+		labels = []
+		for (example_type, start_timestamp, end_timestamp) in frame_log.gestures:
+			start = np.searchsorted (timestamps, start_timestamp, 'left')
+			end = np.searchsorted (timestamps, end_timestamp, 'right') - 1
+			overlaps = np.minimum (segments[:, 1], end) - np.maximum (segments[:, 0], start) + 1 if len(segments) > 0 else np.zeros (0)
+			if len(overlaps) == 0 or overlaps.max () <= 0:
+				print_inner_status ("Gesture Segmenter (segment_log)", "No motion found in the " + example_type + " gesture at " + str(start_timestamp) + "; skipping it")
+				continue
+			labels.append ((example_type, segments[np.argmax (overlaps)]))
+
+	### Step 3: cut them out ###
+	gestures = []
+	for (example_type, (start, end)) in labels:
+		gesture = cut_segment (example_type, observations, start, end, segmenter.min_length, segmenter.max_length, get_frame_interval (timestamps[start:end + 1]))
+		if gesture is not None:
+			gestures.append (gesture)
+
+	return gestures
+
+
+
+
+
+
+if __name__ == "__main__":
+
+	### Usage: ./Gesture_Segmenter.py [log_dir] [dataset_dir] [gesture_type] ###
+	### cuts the gestures in a frame log out at their segment boundaries into a (new) Gesture_Dataset; ###
+	### with a gesture_type, every segment in the log is taken as one of that type ###
+	from Gesture_Dataset import Gesture_Dataset
+	log_dir 		= sys.argv[1] if len(sys.argv) > 1 else os.path.join (os.getcwd (), 'frame_log/')
+	dataset_dir 	= sys.argv[2] if len(sys.argv) > 2 else os.path.join (os.getcwd (), 'dataset/')
+	gesture_type 	= sys.argv[3] if len(sys.argv) > 3 else None
+
+	frame_log = Frame_Log (log_dir)
+	if not frame_log.exists ():
+		print_error ("Gesture Segmenter", "No frame log at " + log_dir)
+	dataset = Gesture_Dataset (dataset_dir)
+	if dataset.exists ():
+		print_error ("Gesture Segmenter", "A dataset already exists at " + dataset_dir)
+
+	print_message ("Segmenting " + log_dir + " -> " + dataset_dir)
+	gestures = segment_log (frame_log, gesture_type)
+	dataset.create ()
+	for gesture in gestures:
+		dataset.append (gesture.name, gesture.get_observations (), gesture.frame_interval)
+	print_status ("Gesture Segmenter", "Extracted " + str(len(gestures)) + " gestures from " + str(frame_log.num_records) + " records")
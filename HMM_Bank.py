@@ -0,0 +1,210 @@
+# *------------------------------------------------------------ *
+# * Class: HMM_Bank
+# * ---------------
+# * the parameters of every gesture hmm stacked into contiguous
+# * arrays, so that all models are scored with one set of array
+# * operations instead of one pass per model
+# *------------------------------------------------------------ *
+#--- Standard ---
+import hashlib
+
+#--- Numpy ---
+import numpy as np
+
+#--- My Files ---
+from hmm_utilities import get_hmm_params, logsumexp
+
+
+
+# Class: HMM_Bank
+# ---------------
+# M models with (up to) S states over D features:
+#	- log_startprob 	(M, S)
+#	- log_transmat 		(M, S, S)
+#	- means 			(M, S, D)
+#	- inverse_cholesky 	(M, S, D, D)	inverse cholesky factors of the state covariances
+#	- log_det 			(M, S)			log-determinants of the state covariances
+# Models with fewer than S states are padded with unreachable states
+# (start and incoming transition log-probabilities of -inf), which
+# leaves their scores unchanged.
+class HMM_Bank:
+
+	#--- Models ---
+	gesture_types 		= []		# gesture types, in the order of the returned scores
+
+	#--- Stacked Parameters ---
+	log_startprob 		= None
+	log_transmat 		= None
+	means 				= None
+	inverse_cholesky 	= None
+	log_det 			= None
+	array_names 		= ['log_startprob', 'log_transmat', 'means', 'inverse_cholesky', 'log_det']
+
+	#--- Parameters ---
+	max_batch_observations = 2048	# observations whose emissions are computed at once when scoring batches
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# takes a list of (gesture_type, hmm) pairs, in the order the
+	# scores should be returned; with none, the bank is empty until
+	# load_arrays is called
+	def __init__ (self, hmms=None):
+
+		if hmms is None:
+			return
+
+		### Step 1: get each model's arrays ###
+		self.gesture_types = [gesture_type for gesture_type, hmm in hmms]
+		all_hmm_params = [get_hmm_params (hmm) for gesture_type, hmm in hmms]
+
+		num_models 		= len(all_hmm_params)
+		num_states 		= max ([len(params['log_startprob']) for params in all_hmm_params] + [1])
+		num_features 	= all_hmm_params[0]['means'].shape[1] if num_models > 0 else 0
+
+		### Step 2: allocate the stacked arrays; padding states are unreachable ###
+		self.log_startprob 		= np.empty ((num_models, num_states))
+		self.log_transmat 		= np.empty ((num_models, num_states, num_states))
+		self.means 				= np.zeros ((num_models, num_states, num_features))
+		self.inverse_cholesky 	= np.tile (np.eye (num_features), (num_models, num_states, 1, 1))
+		self.log_det 			= np.zeros ((num_models, num_states))
+		self.log_startprob.fill (-np.inf)
+		self.log_transmat.fill (-np.inf)
+
+		### Step 3: fill them in ###
+		for m, params in enumerate (all_hmm_params):
+			S = len(params['log_startprob'])
+			self.log_startprob[m, :S] 		= params['log_startprob']
+			self.log_transmat[m, :S, :S] 	= params['log_transmat']
+			self.means[m, :S] 				= params['means']
+			self.inverse_cholesky[m, :S] 	= params['inverse_cholesky']
+			self.log_det[m, :S] 			= params['log_det']
+
+
+	# Function: get_arrays
+	# --------------------
+	# returns a dict mapping each of array_names to its stacked array
+	def get_arrays (self):
+
+		return dict ([(name, getattr (self, name)) for name in self.array_names])
+
+
+	# Function: load_arrays
+	# ---------------------
+	# sets the models from gesture types and a dict of stacked arrays (as
+	# returned by get_arrays); the arrays are used as-is, not copied, so they
+	# can live in shared or memory-mapped memory
+	def load_arrays (self, gesture_types, arrays):
+
+		self.gesture_types = list(gesture_types)
+		for name in self.array_names:
+			setattr (self, name, arrays[name])
+
+
+	# Function: get_subset
+	# --------------------
+	# returns a bank of just the models at the given indices (in that order)
+	def get_subset (self, indices):
+
+		hmm_bank = HMM_Bank ()
+		hmm_bank.load_arrays ([self.gesture_types[m] for m in indices], dict ([(name, array[list(indices)]) for name, array in self.get_arrays ().items ()]))
+		return hmm_bank
+
+
+	# Function: get_num_models
+	# ------------------------
+	# number of models in the bank
+	def get_num_models (self):
+
+		return len(self.gesture_types)
+
+
+	# Function: get_model_hashes
+	# --------------------------
+	# returns a list with a hash of each model's parameters (padding states
+	# excluded): equal hashes mean equal scores for any observation sequence
+	def get_model_hashes (self):
+
+		model_hashes = []
+		for m in range(self.get_num_models ()):
+			S = int(np.sum (np.any (np.isfinite (self.log_transmat[m]), axis=1)))
+			model_hash = hashlib.sha1 ()
+			for array in [self.log_startprob[m, :S], self.log_transmat[m, :S, :S], self.means[m, :S], self.inverse_cholesky[m, :S], self.log_det[m, :S]]:
+				model_hash.update (np.ascontiguousarray (array, dtype=float).tostring ())
+			model_hashes.append (model_hash.hexdigest ()[:16])
+		return model_hashes
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Forward Algorithm --- ]###################################################
+	########################################################################################################################
+
+	# Function: log_emission_densities
+	# --------------------------------
+	# given an (N, D) array of observations, returns the (N, M, S) array of
+	# log N(x_n; mean_ms, covar_ms) for every model and state
+	def log_emission_densities (self, X):
+
+		X = np.atleast_2d (X)
+		num_features = X.shape[1]
+
+		### Step 1: whiten the residuals of every observation w/r/t every state of every model ###
+		residuals 	= X[:, np.newaxis, np.newaxis, :] - self.means[np.newaxis]					# (N, M, S, D)
+		whitened 	= np.einsum ('msij,nmsj->nmsi', self.inverse_cholesky, residuals)			# (N, M, S, D)
+
+		### Step 2: gaussian log-density ###
+		return -0.5 * (num_features * np.log (2 * np.pi) + self.log_det + np.sum (whitened ** 2, axis=3))
+
+
+	# Function: forward_step
+	# ----------------------
+	# one step of the forward recursion for all models: given (K, M, S) log
+	# forward variables and the log emission densities of the next
+	# observation ((M, S) or (K, M, S)), returns the (K, M, S) updated variables
+	def forward_step (self, log_alpha, log_b):
+
+		return logsumexp (log_alpha[:, :, :, np.newaxis] + self.log_transmat[np.newaxis], axis=2) + log_b
+
+
+	# Function: score
+	# ---------------
+	# returns the (M,) log-likelihoods of a (T, D) observation sequence under
+	# each model; equivalent to [hmm.score (X) for each hmm]
+	def score (self, X):
+
+		return self.batch_score (np.asarray (X, dtype=float)[np.newaxis])[0]
+
+
+	# Function: batch_score
+	# ---------------------
+	# returns the (N, M) log-likelihoods of N equal-length observation
+	# sequences, given as an (N, T, D) array, under each model
+	def batch_score (self, X):
+
+		(num_sequences, num_steps, num_features) = X.shape
+		scores = np.empty ((num_sequences, self.get_num_models ()))
+
+		### Step 1: bound the size of the (N, T, M, S, D) intermediate ###
+		batch_size = max (1, self.max_batch_observations // max (num_steps, 1))
+		for start in range(0, num_sequences, batch_size):
+
+			X_batch = X[start:start + batch_size]
+			num_batch = len(X_batch)
+
+			### Step 2: emissions of every observation in the batch, under every model ###
+			log_b = self.log_emission_densities (X_batch.reshape (num_batch * num_steps, num_features))
+			log_b = log_b.reshape ((num_batch, num_steps) + log_b.shape[1:])
+
+			### Step 3: forward recursion over all sequences and models at once ###
+			log_alpha = self.log_startprob + log_b[:, 0]
+			for t in range(1, num_steps):
+				log_alpha = self.forward_step (log_alpha, log_b[:, t])
+
+			scores[start:start + num_batch] = logsumexp (log_alpha, axis=2)
+
+		return scores
@@ -0,0 +1,168 @@
+# *------------------------------------------------------------ *
+# * Class: Hand_Tracker
+# * -------------------
+# * follows every hand in view by its Leap hand id, each with its
+# * own gesture window, taken from a fixed pool as hands enter
+# * and returned to it as they leave
+# *------------------------------------------------------------ *
+#--- Standard ---
+import copy
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Forward_Scorer import Forward_Scorer
+from Gesture import Gesture, get_frame_reduction_const
+
+
+
+# Class: Hand_Window
+# ------------------
+# everything synth mode keeps per hand: its observed gesture, the forward
+# scores of its window and, if used, its own motion gate, scheduler and
+# segmenter
+class Hand_Window:
+
+	#--- Hand ---
+	hand_id 		= None		# Leap hand id of the hand this window follows; None while free
+	hand 			= None		# that hand in the latest frame
+
+	#--- Per-Hand State ---
+	gesture 		= None		# Gesture
+	forward_scorer 	= None		# Forward_Scorer, or None if the window is scored elsewhere
+	motion_gate 	= None		# Motion_Gate, or None
+	scheduler 		= None		# Classification_Scheduler, or None
+	segmenter 		= None		# Gesture_Segmenter, or None
+
+	#--- Parameters ---
+	min_window_length = Gesture.gesture_length	# frames before the shortest window is full
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# allocates the window's gesture and forward scorer (none if hmm_bank is
+	# None, for windows whose hmm reps are scored elsewhere, e.g. by
+	# Synth_Pipeline's classifier stage). With window_lengths (in frames), the
+	# windows of each length are scored (see Forward_Scorer); frame_interval is
+	# the seconds between frames, which the hmm rep is sampled to every
+	# hmm_rep_interval seconds by the nearest whole number of frames.
+	def __init__ (self, hmm_bank, stride=1, motion_gate=None, scheduler=None, segmenter=None, window_lengths=None, frame_interval=Gesture.nominal_frame_interval, length_normalized=False):
+
+		frame_reduction_const 	= get_frame_reduction_const (frame_interval)
+		self.gesture 			= Gesture (gesture_length=max (window_lengths) if window_lengths else None, frame_interval=Gesture.hmm_rep_interval / frame_reduction_const)
+		if hmm_bank is not None:
+			self.forward_scorer = Forward_Scorer (hmm_bank, gesture_length=self.gesture.gesture_length, frame_reduction_const=frame_reduction_const, stride=stride, window_lengths=window_lengths, length_normalized=length_normalized)
+		self.min_window_length 	= min (window_lengths) if window_lengths else self.gesture.gesture_length
+		self.motion_gate 	= motion_gate
+		self.scheduler 		= scheduler
+		self.segmenter 		= segmenter
+
+
+	# Function: reset
+	# ---------------
+	# frees the window for the next hand
+	def reset (self):
+
+		self.hand_id 	= None
+		self.hand 		= None
+		self.gesture.clear ()
+		if self.forward_scorer:
+			self.forward_scorer.reset ()
+		if self.motion_gate:
+			self.motion_gate.close ()
+		if self.scheduler:
+			self.scheduler.reset ()
+		if self.segmenter:
+			self.segmenter.reset ()
+
+
+
+
+# Class: Hand_Tracker
+# -------------------
+# max_hands windows are allocated up front; a hand gets a free one when it
+# enters and gives it back when it leaves, so nothing is allocated per
+# frame and the per-frame work is linear in the number of hands in view.
+# Hands that enter while every window is in use are ignored until one
+# frees up.
+class Hand_Tracker:
+
+	#--- Windows ---
+	windows 		= []		# all max_hands Hand_Windows
+	active_windows 	= {}		# hand id -> Hand_Window
+	free_windows 	= []		# windows not following a hand
+
+	#--- Counters ---
+	num_entered 	= 0			# hands given a window
+	num_ignored 	= 0			# frames in which a hand had to be ignored for lack of a window
+
+	#--- Parameters ---
+	max_hands 		= 2
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# allocates max_hands windows scoring against hmm_bank (None for windows
+	# scored elsewhere); each gets its own
+	# copy of motion_gate, scheduler and segmenter, if given (see Hand_Window
+	# for the rest)
+	def __init__ (self, hmm_bank, max_hands=2, stride=1, motion_gate=None, scheduler=None, segmenter=None, window_lengths=None, frame_interval=Gesture.nominal_frame_interval, length_normalized=False):
+
+		if max_hands < 1:
+			print_error ("Hand Tracker", "max_hands must be at least 1")
+
+		self.max_hands 		= max_hands
+		self.windows 		= [Hand_Window (hmm_bank, stride, copy.deepcopy (motion_gate), copy.deepcopy (scheduler), copy.deepcopy (segmenter), window_lengths, frame_interval, length_normalized) for i in range(max_hands)]
+		self.active_windows = {}
+		self.free_windows 	= list(reversed (self.windows))
+		self.num_entered 	= 0
+		self.num_ignored 	= 0
+
+
+	# Function: update
+	# ----------------
+	# adds a frame: frees the windows of hands that left, gives hands that
+	# entered a window, and adds each hand's observation to its window.
+	# returns the windows of the hands in view, in window order.
+	def update (self, frame):
+
+		### Step 1: free the windows of hands that left ###
+		hand_ids = set ([hand.id for hand in frame.hands])
+		for hand_id in [hand_id for hand_id in self.active_windows if not hand_id in hand_ids]:
+			window = self.active_windows.pop (hand_id)
+			window.reset ()
+			self.free_windows.append (window)
+
+		### Step 2: add each hand to its window, giving new hands one ###
+		for hand in frame.hands:
+			window = self.active_windows.get (hand.id)
+			if window is None:
+				if len(self.free_windows) == 0:
+					self.num_ignored += 1
+					continue
+				window = self.free_windows.pop ()
+				window.hand_id = hand.id
+				self.active_windows[hand.id] = window
+				self.num_entered += 1
+			window.hand = hand
+			window.gesture.add_frame (frame, hand)
+
+		return [window for window in self.windows if window.hand_id is not None]
+
+
+	# Function: get_num_active
+	# ------------------------
+	# number of hands being followed
+	def get_num_active (self):
+
+		return len(self.active_windows)
+
+
+	# Function: get_gated_ratio
+	# -------------------------
+	# fraction of (hand, frame) pairs the windows' motion gates were closed for
+	def get_gated_ratio (self):
+
+		gates = [window.motion_gate for window in self.windows if window.motion_gate]
+		return sum ([gate.num_skipped for gate in gates]) / float(max (sum ([gate.num_frames for gate in gates]), 1))
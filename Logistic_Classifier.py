@@ -0,0 +1,111 @@
+# *------------------------------------------------------------ *
+# * Class: Logistic_Classifier
+# * --------------------------
+# * inference-only logistic regression in numpy: gives the same
+# * probabilities as a fitted sklearn LogisticRegression from its
+# * exported parameters, without importing sklearn
+# *------------------------------------------------------------ *
+#--- Numpy ---
+import numpy as np
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+
+
+
+#--- Probability Models ---
+OVR 		= 'ovr'				# one sigmoid per class, normalized across classes (sklearn's default before 0.22)
+MULTINOMIAL = 'multinomial'		# softmax over the classes
+multi_classes = [OVR, MULTINOMIAL]
+
+
+
+# Function: get_multi_class
+# -------------------------
+# given a fitted sklearn LogisticRegression, returns which probability
+# model its predict_proba uses (OVR or MULTINOMIAL)
+def get_multi_class (classifier):
+
+	multi_class = getattr (classifier, 'multi_class', OVR)
+	if multi_class == 'auto':
+		if getattr (classifier, 'solver', None) == 'liblinear' or len(classifier.classes_) <= 2:
+			return OVR
+		return MULTINOMIAL
+	if multi_class == MULTINOMIAL:
+		return MULTINOMIAL
+	return OVR
+
+
+
+
+# Class: Logistic_Classifier
+# --------------------------
+# Has the attributes and methods of LogisticRegression that the gesture
+# recognizer uses (classes_, coef_, intercept_, decision_function,
+# predict_proba, predict), so either can be its classifier.
+class Logistic_Classifier:
+
+	#--- Parameters ---
+	coef_ 			= None		# (num_classes, num_features), or (1, num_features) with two classes
+	intercept_ 		= None		# (num_classes,), or (1,) with two classes
+	classes_ 		= None		# (num_classes,)
+	multi_class 	= OVR
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# takes the parameters of a fitted LogisticRegression
+	def __init__ (self, coef, intercept, classes, multi_class=OVR):
+
+		if multi_class not in multi_classes:
+			print_error ("Logistic Classifier", "multi_class must be one of " + str(multi_classes) + ", not " + str(multi_class))
+
+		self.coef_ 			= np.asarray (coef, dtype=float)
+		self.intercept_ 	= np.asarray (intercept, dtype=float)
+		self.classes_ 		= np.asarray (classes)
+		self.multi_class 	= multi_class
+
+
+	# Function: decision_function
+	# ---------------------------
+	# given an (N, num_features) matrix, returns the (N, num_classes) scores,
+	# or (N,) scores of the second class with two classes
+	def decision_function (self, X):
+
+		scores = np.dot (np.atleast_2d (np.asarray (X, dtype=float)), self.coef_.T) + self.intercept_
+		if scores.shape[1] == 1:
+			return scores.ravel ()
+		return scores
+
+
+	# Function: predict_proba
+	# -----------------------
+	# given an (N, num_features) matrix, returns the (N, num_classes) matrix
+	# of class probabilities (columns in classes_ order)
+	def predict_proba (self, X):
+
+		scores = self.decision_function (X)
+
+		### Step 1: multinomial: softmax (with two classes, over [-score, score]) ###
+		if self.multi_class == MULTINOMIAL:
+			if scores.ndim == 1:
+				scores = np.column_stack ([-scores, scores])
+			scores = scores - np.max (scores, axis=1)[:, np.newaxis]
+			probs = np.exp (scores)
+			return probs / np.sum (probs, axis=1)[:, np.newaxis]
+
+		### Step 2: one-vs-rest: a sigmoid per class, normalized ###
+		with np.errstate (over='ignore'):
+			probs = 1.0 / (1.0 + np.exp (-scores))
+		if probs.ndim == 1:
+			return np.column_stack ([1.0 - probs, probs])
+		return probs / np.sum (probs, axis=1)[:, np.newaxis]
+
+
+	# Function: predict
+	# -----------------
+	# given an (N, num_features) matrix, returns the (N,) most likely classes
+	def predict (self, X):
+
+		return self.classes_[np.argmax (self.predict_proba (X), axis=1)]
@@ -8,6 +8,8 @@
 # *------------------------------------------------------------ *
 #--- Standard ---
 import string
+import struct
+import time
 
 #--- UDP ---
 from socket import *
@@ -18,6 +20,97 @@ import json
 #--- My Files ---
 from common_utilities import print_message, print_error, print_status, print_inner_status
 
+#--- Binary Transport Layout ---
+# one little-endian datagram per frame (per hand, when tracking several):
+#	magic ('LRHS'), version, flags, sequence number (uint32), timestamp (double, seconds since the epoch),
+#	hand id (int32, -1 for none; version 2 on), palm position (3 float32), palm orientation (3 float32),
+#	number of fingers (uint8), gesture name length (uint8)
+# followed by the gesture name itself
+binary_magic 			= 'LRHS'
+binary_version 			= 2
+binary_header_formats 	= {1: '<4sBBId3f3fBB', 2: '<4sBBIdi3f3fBB'}		# by version; we send the newest
+binary_header_format 	= binary_header_formats[binary_version]
+binary_header_size 		= struct.calcsize (binary_header_format)
+FLAG_HAND 				= 0x01		# hand state fields are valid
+FLAG_GESTURE 			= 0x02		# a gesture name follows the header
+
+#--- OSC Transport ---
+osc_epoch_offset 		= 2208988800	# seconds from 1900 (OSC/NTP time) to 1970 (unix time)
+
+
+
+# Function: unpack_binary_frame
+# -----------------------------
+# decodes a datagram sent with the binary transport (any version) into a
+# dict; for receivers and testing
+def unpack_binary_frame (datagram):
+
+	(magic, version) = struct.unpack ('<4sB', datagram[:5])
+	if magic != binary_magic or not version in binary_header_formats:
+		return None
+	header_format = binary_header_formats[version]
+	header_size = struct.calcsize (header_format)
+	fields = list(struct.unpack (header_format, datagram[:header_size]))
+	if version == 1:
+		fields.insert (5, -1)
+
+	(flags, sequence_number, timestamp, hand_id) = fields[2:6]
+	frame = {'sequence_number': sequence_number, 'timestamp': timestamp, 'hand_id': hand_id if hand_id >= 0 else None, 'hand': None, 'gesture': None}
+	if flags & FLAG_HAND:
+		frame['hand'] = {'palm_position': tuple(fields[6:9]), 'palm_orientation': tuple(fields[9:12]), 'num_fingers': fields[12]}
+	if flags & FLAG_GESTURE:
+		frame['gesture'] = datagram[header_size:header_size + fields[13]]
+
+	return frame
+
+
+# Function: pack_osc_string
+# -------------------------
+# null-terminates and pads a string to a multiple of 4 bytes, per OSC 1.0
+def pack_osc_string (value):
+
+	value = str(value) + '\0'
+	return value + '\0' * (-len(value) % 4)
+
+
+# Function: pack_osc_message
+# --------------------------
+# given an address and a list of int/float/str arguments, returns an OSC message
+def pack_osc_message (address, arguments):
+
+	type_tags = ','
+	packed_arguments = ''
+	for argument in arguments:
+		if isinstance (argument, int):
+			type_tags += 'i'
+			packed_arguments += struct.pack ('>i', argument)
+		elif isinstance (argument, float):
+			type_tags += 'f'
+			packed_arguments += struct.pack ('>f', argument)
+		else:
+			type_tags += 's'
+			packed_arguments += pack_osc_string (argument)
+
+	return pack_osc_string (address) + pack_osc_string (type_tags) + packed_arguments
+
+
+# Function: pack_osc_bundle
+# -------------------------
+# given a unix timestamp and a list of OSC messages, returns an OSC bundle
+def pack_osc_bundle (timestamp, messages):
+
+	osc_time = timestamp + osc_epoch_offset
+	seconds = int(osc_time)
+	fraction = int((osc_time - seconds) * (1 << 32)) & 0xffffffff
+
+	bundle = pack_osc_string ('#bundle') + struct.pack ('>II', seconds, fraction)
+	for message in messages:
+		bundle += struct.pack ('>i', len(message)) + message
+	return bundle
+
+
+
+
 class Max_Interface:
 
 	#--- Interface/Protocol Parameters ---
@@ -26,8 +119,16 @@ class Max_Interface:
 	butf = 1024
 	addr = (host, port)
 
+	#--- Transports ---
+	TEXT 		= 'text'		# one space-separated text message per field (what LeapReceiver.maxpat expects)
+	BINARY 		= 'binary'		# one packed datagram per frame; see binary_header_format
+	OSC 		= 'osc'			# one OSC bundle per frame: /leap/frame, /leap/hand, /leap/gesture
+	transports 	= [TEXT, BINARY, OSC]
+	transport 	= TEXT
+
 	#--- Objects for Communication ---
 	UDPSock = None
+	sequence_number = 0			# sequence number of the next packed datagram
 
 
 	########################################################################################################################
@@ -37,11 +138,20 @@ class Max_Interface:
 
 	# Function: Constructor
 	# ---------------------
-	# binds to the correct port, initializes 'available_gestures'
-	def __init__ (self):
+	# binds to the correct port (one per sensor when running several), initializes 'available_gestures'
+	def __init__ (self, transport=TEXT, port=7401):
+
+		if not transport in self.transports:
+			print_error ("Max Interface", "Unknown transport: " + str(transport))
 
 		### Step 1: create socket ###
 		self.UDPSock = socket (AF_INET, SOCK_DGRAM)
+		self.port = port
+		self.addr = (self.host, self.port)
+
+		### Step 2: set up the transport ###
+		self.transport = transport
+		self.sequence_number = 0
 
 	# Function: Destructor 
 	# --------------------
@@ -65,15 +175,36 @@ class Max_Interface:
 	# Format: "Gesture [Gesture Type]"
 	def send_gesture (self, gesture_type):
 
+		if self.transport != self.TEXT:
+			self.send_frame (gesture_type=gesture_type)
+			return
+
 		gesture_message = "Gesture " + str(gesture_type)
 		self.send_message (gesture_message)
 
 
+	# Function: send_hand_id
+	# ----------------------
+	# text transport: tells max which hand the messages that follow are about
+	# Format: "Hand_Id [id]"
+	def send_hand_id (self, hand_id):
+
+		self.send_message ("Hand_Id " + str(hand_id))
+
+
 	# Function: send_hand_state
 	# -------------------------
 	# sends a message to max denoting the current state of the hand
 	# Format: "Hand_State [(palm coordinates) x, y, z] [(palm orientation) yaw, pitch, roll] [number of fingers]"
-	def send_hand_state (self, hand):
+	# (preceded by "Hand_Id [id]" if hand_id is given)
+	def send_hand_state (self, hand, hand_id=None):
+
+		if self.transport != self.TEXT:
+			self.send_frame (hand=hand, hand_id=hand_id)
+			return
+
+		if hand_id is not None:
+			self.send_hand_id (hand_id)
 
 		#--- Initialize Dict ---
 		hand_state_dict = {}
@@ -96,6 +227,91 @@ class Max_Interface:
 
 
 
+	# Function: send_frame
+	# --------------------
+	# sends everything observed in a frame: the hand state (if hand is not None)
+	# and a gesture (if gesture_type is not None). With the packed transports
+	# this is a single datagram carrying a sequence number, timestamp and hand
+	# id (hand_id if given, the hand's own id otherwise); with the text
+	# transport it is the same messages as send_gesture/send_hand_state,
+	# preceded by "Hand_Id [id]" if hand_id is given.
+	def send_frame (self, hand=None, gesture_type=None, hand_id=None):
+
+		if hand is None and gesture_type is None:
+			return
+
+		### --- text: one message per field --- ###
+		if self.transport == self.TEXT:
+			if hand_id is not None:
+				self.send_hand_id (hand_id)
+			if gesture_type is not None:
+				self.send_gesture (gesture_type)
+			if hand is not None:
+				self.send_hand_state (hand)
+			return
+
+		### --- packed: one datagram --- ###
+		if hand_id is None:
+			hand_id = hand.id if hand is not None else -1
+		timestamp = time.time ()
+		if self.transport == self.BINARY:
+			datagram = self.pack_binary_frame (timestamp, hand, gesture_type, hand_id)
+		else:
+			datagram = self.pack_osc_frame (timestamp, hand, gesture_type, hand_id)
+		self.sequence_number = (self.sequence_number + 1) & 0xffffffff
+		self.send_message (datagram)
+
+
+	# Function: get_hand_fields
+	# -------------------------
+	# returns (palm_position, palm_orientation, num_fingers) of a hand, as sent to max
+	def get_hand_fields (self, hand):
+
+		palm_position = (float(hand.palm_position[0]), float(hand.palm_position[1]), float(hand.palm_position[2]))
+		palm_orientation = (float(hand.palm_normal[0]), float(hand.palm_normal[1]), float(hand.palm_normal[2]))
+		num_fingers = len(hand.fingers)
+		return (palm_position, palm_orientation, num_fingers)
+
+
+	# Function: pack_binary_frame
+	# ---------------------------
+	# encodes a frame for the binary transport
+	def pack_binary_frame (self, timestamp, hand, gesture_type, hand_id=-1):
+
+		flags = 0
+		palm_position, palm_orientation, num_fingers = (0.0, 0.0, 0.0), (0.0, 0.0, 0.0), 0
+		if hand is not None:
+			flags |= FLAG_HAND
+			(palm_position, palm_orientation, num_fingers) = self.get_hand_fields (hand)
+
+		gesture_name = ''
+		if gesture_type is not None:
+			flags |= FLAG_GESTURE
+			gesture_name = str(gesture_type)[:255]
+
+		header = struct.pack (binary_header_format, binary_magic, binary_version, flags, self.sequence_number, timestamp, int(hand_id),
+								palm_position[0], palm_position[1], palm_position[2],
+								palm_orientation[0], palm_orientation[1], palm_orientation[2],
+								min (num_fingers, 255), len(gesture_name))
+		return header + gesture_name
+
+
+	# Function: pack_osc_frame
+	# ------------------------
+	# encodes a frame for the OSC transport; the hand id is the last
+	# argument of /leap/hand and /leap/gesture
+	def pack_osc_frame (self, timestamp, hand, gesture_type, hand_id=-1):
+
+		messages = [pack_osc_message ('/leap/frame', [self.sequence_number])]
+		if hand is not None:
+			(palm_position, palm_orientation, num_fingers) = self.get_hand_fields (hand)
+			messages.append (pack_osc_message ('/leap/hand', list(palm_position) + list(palm_orientation) + [num_fingers, int(hand_id)]))
+		if gesture_type is not None:
+			messages.append (pack_osc_message ('/leap/gesture', [str(gesture_type), int(hand_id)]))
+
+		return pack_osc_bundle (timestamp, messages)
+
+
 	# Function: send_message
 	# ----------------------
 	# given a python dict, this will send a max-readable format of it.
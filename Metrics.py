@@ -0,0 +1,292 @@
+# *------------------------------------------------------------ *
+# * Class: Metrics
+# * --------------
+# * cheap per-stage timing and counters for the per-frame loop,
+# * published periodically as a stats dump and over a local
+# * UDP stats endpoint
+# *------------------------------------------------------------ *
+#--- Standard ---
+import time
+import math
+import json
+import timeit
+import bisect
+import threading
+
+#--- UDP ---
+from socket import *
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+
+
+
+#--- Clock ---
+# monotonic where available (python 3.3+); the best timer the platform has otherwise
+clock = getattr (time, 'monotonic', timeit.default_timer)
+
+
+
+# Class: Histogram
+# ----------------
+# fixed-size histogram of durations (seconds) over log-spaced buckets;
+# recording a value is a bisect and an increment, with nothing allocated
+class Histogram:
+
+	#--- Buckets ---
+	edges 	= []		# upper edges of the buckets, in seconds
+	counts 	= []		# counts[i] = values in (edges[i-1], edges[i]]; counts[-1] = values above edges[-1]
+
+	#--- Totals ---
+	count 	= 0
+	total 	= 0.0
+	maximum = 0.0
+
+	#--- Parameters ---
+	min_value 			= 1e-6		# 1us
+	max_value 			= 10.0		# 10s
+	buckets_per_decade 	= 20		# ~12% resolution
+
+
+	# Function: Constructor
+	# ---------------------
+	# sets up the (empty) buckets
+	def __init__ (self):
+
+		num_edges = int(round (self.buckets_per_decade * (math.log10 (self.max_value) - math.log10 (self.min_value)))) + 1
+		self.edges = [self.min_value * 10 ** (float(i) / self.buckets_per_decade) for i in range(num_edges)]
+		self.counts = [0] * (num_edges + 1)
+		self.reset ()
+
+
+	# Function: reset
+	# ---------------
+	# zeroes the counts in place
+	def reset (self):
+
+		for i in range(len(self.counts)):
+			self.counts[i] = 0
+		self.count 		= 0
+		self.total 		= 0.0
+		self.maximum 	= 0.0
+
+
+	# Function: record
+	# ----------------
+	# adds a duration to the histogram
+	def record (self, value):
+
+		self.counts[bisect.bisect_left (self.edges, value)] += 1
+		self.count += 1
+		self.total += value
+		if value > self.maximum:
+			self.maximum = value
+
+
+	# Function: get_percentile
+	# ------------------------
+	# returns (the upper edge of the bucket containing) the p'th percentile
+	def get_percentile (self, p):
+
+		if self.count == 0:
+			return 0.0
+
+		target = p / 100.0 * self.count
+		cumulative = 0
+		for i, count in enumerate (self.counts):
+			cumulative += count
+			if cumulative >= target:
+				return min (self.edges[i], self.maximum) if i < len(self.edges) else self.maximum
+
+		return self.maximum
+
+
+
+
+# Class: Metrics
+# --------------
+# per-stage histograms plus counters. The per-frame loop calls record/increment
+# and then tick (); every 'interval' seconds tick publishes a snapshot of the
+# window (stage percentiles, counter rates, gauges), optionally prints it, and
+# resets the histograms for the next window. record, increment and publish
+# may be called from different threads.
+class Metrics:
+
+	#--- Data ---
+	histograms 		= {}		# dict: stage -> Histogram
+	counters 		= {}		# dict: counter -> count over the current window
+	totals 			= {}		# dict: counter -> count since start
+	gauges 			= {}		# dict: gauge -> function returning its current value
+	snapshot 		= {}		# last published window
+	lock 			= None		# guards the histograms, counters and snapshot (stages may record from other threads, e.g. Synth_Pipeline's classifier)
+
+	#--- Parameters ---
+	interval 		= 5.0		# seconds per window
+	print_stats 	= True		# wether to print each window's stats
+	percentiles 	= [50, 95, 99]
+
+
+	# Function: Constructor
+	# ---------------------
+	# stages and counters must be declared up front so that the loop never allocates
+	def __init__ (self, stages, counters, interval=5.0, print_stats=True):
+
+		self.histograms = dict ([(stage, Histogram ()) for stage in stages])
+		self.counters 	= dict ([(counter, 0) for counter in counters])
+		self.totals 	= dict ([(counter, 0) for counter in counters])
+		self.gauges 	= {}
+		self.snapshot 	= {}
+		self.lock 		= threading.Lock ()
+
+		self.interval 			= interval
+		self.print_stats 		= print_stats
+		self.window_start 		= clock ()
+		self.next_publish_time 	= self.window_start + interval
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Recording --- ]###########################################################
+	########################################################################################################################
+
+	# Function: record
+	# ----------------
+	# records the duration of one run of a stage (e.g. clock () - start)
+	def record (self, stage, duration):
+
+		with self.lock:
+			self.histograms[stage].record (duration)
+
+
+	# Function: increment
+	# -------------------
+	# adds n to a counter
+	def increment (self, counter, n=1):
+
+		with self.lock:
+			self.counters[counter] += n
+
+
+	# Function: add_gauge
+	# -------------------
+	# registers a function whose value is reported with every snapshot
+	# (e.g. the number of frames dropped by a queue)
+	def add_gauge (self, name, function):
+
+		self.gauges[name] = function
+
+
+	# Function: tick
+	# --------------
+	# call once per frame; publishes the window if it is over
+	def tick (self):
+
+		now = clock ()
+		if now >= self.next_publish_time:
+			self.publish (now)
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Publishing --- ]##########################################################
+	########################################################################################################################
+
+	# Function: publish
+	# -----------------
+	# summarizes the current window into self.snapshot and starts a new one
+	def publish (self, now=None):
+
+		if now is None:
+			now = clock ()
+		elapsed = max (now - self.window_start, 1e-9)
+
+		snapshot = {'window_seconds': elapsed, 'time': time.time (), 'stages': {}, 'rates': {}, 'totals': {}, 'gauges': {}}
+		with self.lock:
+
+			### Step 1: summarize the stages (in microseconds) ###
+			for stage, histogram in self.histograms.items ():
+				stage_stats = {'count': histogram.count, 'mean_us': 1e6 * histogram.total / max (histogram.count, 1), 'max_us': 1e6 * histogram.maximum}
+				for p in self.percentiles:
+					stage_stats['p' + str(p) + '_us'] = 1e6 * histogram.get_percentile (p)
+				snapshot['stages'][stage] = stage_stats
+				histogram.reset ()
+
+			### Step 2: counters become rates ###
+			for counter, count in self.counters.items ():
+				self.totals[counter] += count
+				snapshot['rates'][counter + '_per_second'] = count / elapsed
+				snapshot['totals'][counter] = self.totals[counter]
+				self.counters[counter] = 0
+
+		### Step 3: gauges ###
+		for name, function in self.gauges.items ():
+			snapshot['gauges'][name] = function ()
+
+		with self.lock:
+			self.snapshot = snapshot
+		self.window_start 		= now
+		self.next_publish_time 	= now + self.interval
+
+		if self.print_stats:
+			self.print_snapshot (snapshot)
+
+
+	# Function: get_snapshot
+	# ----------------------
+	# returns the last published window (thread-safe)
+	def get_snapshot (self):
+
+		with self.lock:
+			return self.snapshot
+
+
+	# Function: print_snapshot
+	# ------------------------
+	# prints a window's stats
+	def print_snapshot (self, snapshot):
+
+		rates = ", ".join (["%s: %.1f" % (name, rate) for name, rate in sorted (snapshot['rates'].items ())])
+		gauges = ", ".join (["%s: %s" % (name, value) for name, value in sorted (snapshot['gauges'].items ())])
+		print_status ("Metrics", rates + ("; " + gauges if gauges else ""))
+		for stage, stage_stats in sorted (snapshot['stages'].items ()):
+			print_inner_status (stage, " ".join (["p%d %.0fus" % (p, stage_stats['p' + str(p) + '_us']) for p in self.percentiles]) + " max %.0fus" % stage_stats['max_us'])
+
+
+
+
+# Class: Stats_Server
+# -------------------
+# answers every datagram sent to localhost:port with the latest Metrics
+# snapshot as JSON, from a background thread. e.g.:
+#	echo | nc -u -w1 localhost 7402
+class Stats_Server:
+
+	host 	= 'localhost'
+	port 	= 7402
+	bufsize = 1024
+
+	def __init__ (self, metrics, port=7402):
+
+		self.metrics 	= metrics
+		self.port 		= port
+		self.UDPSock 	= socket (AF_INET, SOCK_DGRAM)
+		self.UDPSock.bind ((self.host, self.port))
+
+		self.thread = threading.Thread (target=self.serve)
+		self.thread.daemon = True
+		self.thread.start ()
+
+	# Function: serve
+	# ---------------
+	# thread body: reply to each request with the snapshot
+	def serve (self):
+
+		while True:
+			(request, address) = self.UDPSock.recvfrom (self.bufsize)
+			self.UDPSock.sendto (json.dumps (self.metrics.get_snapshot (), sort_keys=True), address)
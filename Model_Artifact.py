@@ -0,0 +1,301 @@
+# *------------------------------------------------------------ *
+# * Class: Model_Artifact
+# * ---------------------
+# * a trained model (hmms + logistic regression) as a single
+# * versioned, checksummed file of raw arrays that is memory-mapped
+# * when loaded, instead of pickled sklearn objects
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+import json
+import zlib
+import struct
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from HMM_Bank import HMM_Bank
+from Logistic_Classifier import Logistic_Classifier, get_multi_class, OVR
+
+#--- Numpy ---
+import numpy as np
+
+
+
+#--- File Layout ---
+# magic (8 bytes), format version (uint32), header length (uint32), then a
+# JSON header and, starting at the next multiple of 'alignment', the
+# payload: every array back to back (each aligned), little-endian and
+# C-ordered. The header holds the gesture types, the classifier's classes,
+# an entry (dtype, shape, offset into the payload) per array and the CRC32
+# of the payload.
+artifact_magic 		= 'LRMODEL\0'
+artifact_version 	= 1
+preamble_format 	= '<8sII'
+preamble_size 		= struct.calcsize (preamble_format)
+alignment 			= 64
+
+#--- In-Process Cache ---
+# path -> ((mtime, size), Model_Artifact), so re-entering synth mode doesn't touch the disk
+artifact_cache = {}
+
+
+
+# Function: get_aligned
+# ---------------------
+# rounds offset up to a multiple of alignment
+def get_aligned (offset):
+
+	return (offset + alignment - 1) // alignment * alignment
+
+
+# Function: get_native_covars
+# ---------------------------
+# given (S, D, D) full covariance matrices, returns them in the shape a
+# GaussianHMM of covariance_type takes
+def get_native_covars (covars, covariance_type):
+
+	covars = np.array (covars, dtype=float)
+	if covariance_type == 'diag':
+		return np.diagonal (covars, axis1=1, axis2=2).copy ()
+	if covariance_type == 'spherical':
+		return np.diagonal (covars, axis1=1, axis2=2).mean (axis=1)
+	if covariance_type == 'tied':
+		return covars[0]
+	return covars
+
+
+# Function: get_file_key
+# ----------------------
+# identifies a version of a file on disk; save replaces the file with
+# os.rename, which always gives it a new inode, so a rewrite is told apart
+# even when its mtime (which may only have 1s resolution) and size match
+def get_file_key (filename):
+
+	stat = os.stat (filename)
+	return (stat.st_ino, stat.st_mtime, stat.st_size)
+
+
+
+
+# Class: Model_Artifact
+# ---------------------
+# Arrays:
+#	- hmm_<name> for each of HMM_Bank.array_names: the stacked hmm
+#	  parameters, ready to score with (no factorization on load)
+#	- hmm_startprob, hmm_transmat, hmm_means, hmm_covars, hmm_num_states:
+#	  the raw hmm parameters, to rebuild the GaussianHMMs (e.g. for retraining)
+#	- lr_coef, lr_intercept: the logistic regression (whose probability
+#	  model is attributes['lr_multi_class'])
+class Model_Artifact:
+
+	#--- Contents ---
+	gesture_types 	= []		# hmm order (= columns of the classifiable reps)
+	classes 		= []		# classifier.classes_
+	arrays 			= {}		# name -> array (memory-mapped when loaded)
+	attributes 		= {}		# anything else worth recording about the model (JSON-able)
+
+	#--- File ---
+	filename 		= None
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# an artifact of the given contents; see save/load
+	def __init__ (self, gesture_types=[], classes=[], arrays={}, attributes={}):
+
+		self.gesture_types 	= list(gesture_types)
+		self.classes 		= list(classes)
+		self.arrays 		= dict (arrays)
+		self.attributes 	= dict (attributes)
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Building --- ]############################################################
+	########################################################################################################################
+
+	# Function: from_model
+	# --------------------
+	# builds the artifact of an hmm bank and a fitted LogisticRegression (or
+	# Logistic_Classifier); hmms is the list of (gesture_type, hmm) the bank
+	# was built from
+	def from_model (self, hmms, hmm_bank, classifier, attributes={}):
+
+		self.gesture_types 	= list(hmm_bank.gesture_types)
+		self.classes 		= [str(c) for c in classifier.classes_]
+		self.attributes 	= dict (attributes)
+		self.arrays 		= {}
+
+		### Step 1: the stacked parameters ###
+		for name, array in hmm_bank.get_arrays ().items ():
+			self.arrays['hmm_' + name] = array
+
+		### Step 2: the raw hmm parameters, padded to the bank's number of states ###
+		(num_models, num_states, num_features) = hmm_bank.means.shape
+		if len(hmms) > 0:
+			self.attributes['hmm_covariance_type'] = getattr (hmms[0][1], 'covariance_type', 'full')
+		self.arrays['hmm_num_states'] 	= np.zeros (num_models, dtype=np.int32)
+		self.arrays['hmm_startprob'] 	= np.zeros ((num_models, num_states))
+		self.arrays['hmm_transmat'] 	= np.zeros ((num_models, num_states, num_states))
+		self.arrays['hmm_means'] 		= np.zeros ((num_models, num_states, num_features))
+		self.arrays['hmm_covars'] 		= np.zeros ((num_models, num_states, num_features, num_features))
+		for m, (gesture_type, hmm) in enumerate (hmms):
+			S = hmm.n_components
+			self.arrays['hmm_num_states'][m] 		= S
+			self.arrays['hmm_startprob'][m, :S] 	= hmm.startprob_
+			self.arrays['hmm_transmat'][m, :S, :S] 	= hmm.transmat_
+			self.arrays['hmm_means'][m, :S] 		= hmm.means_
+			self.arrays['hmm_covars'][m, :S] 		= hmm.covars_
+
+		### Step 3: the classifier ###
+		self.arrays['lr_coef'] 		= np.asarray (classifier.coef_, dtype=float)
+		self.arrays['lr_intercept'] = np.asarray (classifier.intercept_, dtype=float)
+		self.attributes['lr_multi_class'] = get_multi_class (classifier)
+
+		return self
+
+
+	# Function: get_hmm_bank
+	# ----------------------
+	# returns an HMM_Bank scoring straight off the artifact's arrays
+	def get_hmm_bank (self):
+
+		hmm_bank = HMM_Bank ()
+		hmm_bank.load_arrays (self.gesture_types, dict ([(name, self.arrays['hmm_' + name]) for name in HMM_Bank.array_names]))
+		return hmm_bank
+
+
+	# Function: get_hmms
+	# ------------------
+	# returns a dict gesture_type -> GaussianHMM rebuilt from the raw
+	# parameters, with the covariance type they were trained with
+	def get_hmms (self):
+
+		from sklearn.hmm import GaussianHMM
+
+		covariance_type = str(self.attributes.get ('hmm_covariance_type', 'full'))
+		hmms = {}
+		for m, gesture_type in enumerate (self.gesture_types):
+			S = int(self.arrays['hmm_num_states'][m])
+			hmm = GaussianHMM (S, covariance_type=covariance_type)
+			hmm.startprob_ 	= np.array (self.arrays['hmm_startprob'][m, :S])
+			hmm.transmat_ 	= np.array (self.arrays['hmm_transmat'][m, :S, :S])
+			hmm.means_ 		= np.array (self.arrays['hmm_means'][m, :S])
+			hmm.covars_ 	= get_native_covars (self.arrays['hmm_covars'][m, :S], covariance_type)
+			hmms[gesture_type] = hmm
+
+		return hmms
+
+
+	# Function: get_classifier
+	# ------------------------
+	# returns a Logistic_Classifier with the saved parameters
+	def get_classifier (self):
+
+		return Logistic_Classifier (self.arrays['lr_coef'], self.arrays['lr_intercept'], self.classes, str(self.attributes.get ('lr_multi_class', OVR)))
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Saving/Loading --- ]######################################################
+	########################################################################################################################
+
+	# Function: save
+	# --------------
+	# writes the artifact to filename (via a temporary file, so readers never
+	# see half of one)
+	def save (self, filename):
+
+		### Step 1: lay out the payload ###
+		names = sorted (self.arrays.keys ())
+		arrays = [np.ascontiguousarray (self.arrays[name], dtype=np.asarray (self.arrays[name]).dtype.newbyteorder ('<')) for name in names]
+		entries = {}
+		offset = 0
+		for name, array in zip (names, arrays):
+			offset = get_aligned (offset)
+			entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+			offset += array.nbytes
+		payload = bytearray (offset)
+		for name, array in zip (names, arrays):
+			start = entries[name]['offset']
+			payload[start:start + array.nbytes] = array.tostring ()
+
+		### Step 2: the header ###
+		header = json.dumps ({
+								'gesture_types': 	self.gesture_types,
+								'classes': 			self.classes,
+								'attributes': 		self.attributes,
+								'arrays': 			entries,
+								'checksum': 		zlib.crc32 (bytes (payload)) & 0xffffffff
+							}, sort_keys=True)
+		payload_start = get_aligned (preamble_size + len(header))
+
+		### Step 3: write it out ###
+		temporary_filename = filename + '.tmp'
+		artifact_file = open (temporary_filename, 'wb')
+		artifact_file.write (struct.pack (preamble_format, artifact_magic, artifact_version, len(header)))
+		artifact_file.write (header)
+		artifact_file.write ('\0' * (payload_start - preamble_size - len(header)))
+		artifact_file.write (payload)
+		artifact_file.close ()
+		os.rename (temporary_filename, filename)
+		self.filename = filename
+
+
+	# Function: load
+	# --------------
+	# memory-maps the artifact in filename, verifying its checksum
+	def load (self, filename):
+
+		### Step 1: check the preamble ###
+		artifact_file = open (filename, 'rb')
+		(magic, version, header_length) = struct.unpack (preamble_format, artifact_file.read (preamble_size))
+		if magic != artifact_magic:
+			print_error ("Model Artifact", filename + " is not a model artifact")
+		if version != artifact_version:
+			print_error ("Model Artifact", filename + " has format version " + str(version) + "; this code reads version " + str(artifact_version))
+		header = json.loads (artifact_file.read (header_length))
+		artifact_file.close ()
+
+		### Step 2: map the payload and verify it ###
+		payload_start = get_aligned (preamble_size + header_length)
+		payload = np.memmap (filename, dtype=np.uint8, mode='r', offset=payload_start)
+		if zlib.crc32 (payload) & 0xffffffff != header['checksum']:
+			print_error ("Model Artifact", filename + " is corrupt (checksum mismatch)")
+
+		### Step 3: view each array in place ###
+		self.arrays = {}
+		for name, entry in header['arrays'].items ():
+			dtype = np.dtype (str(entry['dtype']))
+			num_bytes = int(np.prod (entry['shape'])) * dtype.itemsize
+			self.arrays[str(name)] = payload[entry['offset']:entry['offset'] + num_bytes].view (dtype).reshape (entry['shape'])
+
+		self.gesture_types 	= [str(gesture_type) for gesture_type in header['gesture_types']]
+		self.classes 		= [str(c) for c in header['classes']]
+		self.attributes 	= header['attributes']
+		self.filename 		= filename
+		return self
+
+
+
+
+# Function: load_artifact
+# -----------------------
+# returns the Model_Artifact in filename, from the in-process cache if the
+# file hasn't changed since it was last loaded
+def load_artifact (filename):
+
+	file_key = get_file_key (filename)
+	if filename in artifact_cache and artifact_cache[filename][0] == file_key:
+		return artifact_cache[filename][1]
+
+	artifact = Model_Artifact ().load (filename)
+	artifact_cache[filename] = (file_key, artifact)
+	return artifact
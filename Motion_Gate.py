@@ -0,0 +1,132 @@
+# *------------------------------------------------------------ *
+# * Class: Motion_Gate
+# * ------------------
+# * decides, from the velocity features Position already computes,
+# * wether the hand is moving enough for a gesture to be under way,
+# * so that classification can be skipped while it is idle
+# *------------------------------------------------------------ *
+#--- Numpy ---
+import numpy as np
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+
+
+
+#--- Feature Columns (see Position) ---
+palm_velocity_columns 		= slice (6, 9)		# d1 velocity of the palm (x, y, z), in mm
+angular_velocity_columns 	= slice (9, 12)		# d1 velocity of (yaw, pitch, roll), in radians
+
+
+
+# Function: get_motion_energy
+# ---------------------------
+# given one observation (num_features,) or an (N, num_features) array of
+# them, returns its motion energy: the norm of the palm's d1 velocity plus
+# angular_weight times the norm of the d1 angular velocity
+def get_motion_energy (observations, angular_weight):
+
+	observations = np.asarray (observations)
+	palm_energy = np.sqrt (np.sum (observations[..., palm_velocity_columns] ** 2, axis=-1))
+	angular_energy = np.sqrt (np.sum (observations[..., angular_velocity_columns] ** 2, axis=-1))
+	return palm_energy + angular_weight * angular_energy
+
+
+
+
+# Class: Motion_Gate
+# ------------------
+# The gate opens as soon as a frame's motion energy reaches open_threshold,
+# and closes once it has stayed below close_threshold for hold_frames
+# frames in a row. close_threshold < open_threshold keeps it from flapping
+# around a single threshold, and hold_frames lets the classifier still see
+# the windows that end just after a gesture does.
+class Motion_Gate:
+
+	#--- State ---
+	is_open 			= False
+	num_quiet_frames 	= 0			# consecutive frames below close_threshold
+
+	#--- Counters ---
+	num_frames 			= 0			# frames the gate was asked about
+	num_skipped 		= 0			# frames it was closed for
+
+	#--- Parameters ---
+	open_threshold 		= 8.0		# motion energy at which the gate opens
+	close_threshold 	= 4.0		# motion energy below which it starts to close
+	hold_frames 		= 10		# quiet frames before it closes
+	angular_weight 		= 50.0		# mm of palm motion per radian of rotation
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# sets the thresholds (see above)
+	def __init__ (self, open_threshold=8.0, close_threshold=4.0, hold_frames=10, angular_weight=50.0):
+
+		if close_threshold > open_threshold:
+			print_error ("Motion Gate", "close_threshold (" + str(close_threshold) + ") must not exceed open_threshold (" + str(open_threshold) + ")")
+
+		self.open_threshold 	= open_threshold
+		self.close_threshold 	= close_threshold
+		self.hold_frames 		= hold_frames
+		self.angular_weight 	= angular_weight
+		self.reset ()
+
+
+	# Function: reset
+	# ---------------
+	# closes the gate and zeroes the counters
+	def reset (self):
+
+		self.close ()
+		self.num_frames 		= 0
+		self.num_skipped 		= 0
+
+
+	# Function: close
+	# ---------------
+	# closes the gate (e.g. when the hand leaves), keeping the counters
+	def close (self):
+
+		self.is_open 			= False
+		self.num_quiet_frames 	= 0
+
+
+	# Function: update
+	# ----------------
+	# call once per frame with the gesture the frame was added to; returns
+	# wether the gesture should be classified on this frame
+	def update (self, gesture):
+
+		### Step 1: no hand, no motion ###
+		if gesture.frame_count == 0:
+			energy = 0.0
+		else:
+			energy = get_motion_energy (gesture.get_newest_observation (), self.angular_weight)
+
+		### Step 2: open/close with hysteresis ###
+		if energy >= self.open_threshold:
+			self.is_open = True
+			self.num_quiet_frames = 0
+		elif self.is_open:
+			if energy < self.close_threshold:
+				self.num_quiet_frames += 1
+				if self.num_quiet_frames >= self.hold_frames:
+					self.is_open = False
+			else:
+				self.num_quiet_frames = 0
+
+		### Step 3: count ###
+		self.num_frames += 1
+		if not self.is_open:
+			self.num_skipped += 1
+		return self.is_open
+
+
+	# Function: get_skipped_ratio
+	# ---------------------------
+	# fraction of frames the gate has been closed for
+	def get_skipped_ratio (self):
+
+		return self.num_skipped / float(max (self.num_frames, 1))
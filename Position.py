@@ -9,11 +9,6 @@ import os
 import sys
 import pickle
 
-#--- Leap ---
-### NOTE: change the path below to the location of your local installation ###
-sys.path.append ('/Users/jayhack/CS/NI/LeapDeveloperKit/LeapSDK/lib')
-import Leap
-
 #--- My Files ---
 from common_utilities import print_message, print_status
 
@@ -24,15 +19,23 @@ import numpy as np
 class Position:
 
 	#--- Data/Representations ---
-	features 	= None	#numpy array describing the hand's position in this frame
+	features 				= None	#numpy array describing the hand's position in this frame
+	positional_features 	= None	#numpy array of just the positional part of features
+
+	#--- Parameters ---
+	num_positional_features = 6		# palm (x, y, z) and (yaw, pitch, roll)
+	num_features 			= 24	# positional + d1/d2 velocity + pseudo-acceleration
 
 
 	# Function: Constructor
 	# ---------------------
-	# fills in self.features appropriately
-	def __init__ (self, this_frame, d1_frame, d2_frame):
+	# fills in self.features appropriately. d1/d2_positional_features are the
+	# (already computed) positional features of the frames to take derivatives
+	# w/r/t; if None, this frame's own are used. hand is the hand of
+	# this_frame to describe; the frame's first hand if None.
+	def __init__ (self, this_frame, d1_positional_features=None, d2_positional_features=None, hand=None):
 
-		self.compute_features (this_frame, d1_frame, d2_frame)
+		self.compute_features (this_frame, d1_positional_features, d2_positional_features, hand)
 
 
 	########################################################################################################################
@@ -42,22 +45,23 @@ class Position:
 	# Function: compute_positional_features
 	# -------------------------------------
 	# computes and returns a list of features representing the 
-	# position of the passed frame.
+	# position of the passed frame (of 'hand' in it, if given).
 	# Consists of:
 	# - Palm location coordinates (x, y, z)
 	# - Palm orientation coordinates (yaw, pitch, roll)
-	def compute_positional_features (self, frame):
+	def compute_positional_features (self, frame, hand=None):
 
 		positional_features = []
 
 		### --- without hands, return all 5000s --- ###
-		if len(frame.hands) == 0:
+		if hand is None and len(frame.hands) == 0:
 			positional_features = [float(5000)] * 6
 
 		### --- otherwise ... ---###
 		else:
 
-			hand = frame.hands[0]
+			if hand is None:
+				hand = frame.hands[0]
 			positional_features = []
 
 			#--- Position ---
@@ -88,45 +92,77 @@ class Position:
 	# - Acceleration over time interval d1 and d2 	(yaw, pitch, roll)
 	def compute_velocity_features (self, pos_0, pos_1, pos_2):
 
-		velocity_features = []
-
-		#--- d1 velocity ---
-		for (c0, c1) in zip (pos_0, pos_1):
-			velocity_features.append (float(c0 - c1))
-
-		#--- d2 velocity ---
-		for (c0, c2) in zip (pos_0, pos_2):
-			velocity_features.append (float(c0 - c2))
+		#--- d1 velocity, d2 velocity ---
+		d1_velocity = pos_0 - pos_1
+		d2_velocity = pos_0 - pos_2
 
 		#--- pseudo-acceleration ---
-		for (c0, c1, c2) in zip (pos_0, pos_1, pos_2):
-			prev_vel = (c1 - c2)
-			cur_vel = (c0 - c1)
-			velocity_features.append (float(cur_vel - prev_vel))
+		prev_vel = pos_1 - pos_2
+		acceleration = d1_velocity - prev_vel
 
-		return velocity_features
+		return np.concatenate ((d1_velocity, d2_velocity, acceleration))
 
 
 
 	# Funtion: compute_features
 	# -------------------------
-	# computes features for the current frame
-	def compute_features (self, this_frame, d1_frame, d2_frame):
+	# computes features for the current frame (for 'hand', if given)
+	def compute_features (self, this_frame, d1_positional_features, d2_positional_features, hand=None):
 		
 		### Step 1: empty features if no hands are found ###
-		if len(this_frame.hands) == 0:
+		if hand is None and len(this_frame.hands) == 0:
 			self.features = None
 			return
 
-		### Step 2: get positional features for all of them ###
-		this_positional_features 	= self.compute_positional_features (this_frame)
-		d1_positional_features 		= self.compute_positional_features (d1_frame) 
-		d2_positional_features 		= self.compute_positional_features (d2_frame) 		
+		### Step 2: get positional features for this frame; the others were computed when they arrived ###
+		self.positional_features = np.array (self.compute_positional_features (this_frame, hand))
+		if d1_positional_features is None:
+			d1_positional_features = self.positional_features
+		if d2_positional_features is None:
+			d2_positional_features = self.positional_features
 
 		### Step 3: get velocity-related features ###
-		velocity_features = self.compute_velocity_features (this_positional_features, d1_positional_features, d2_positional_features)
+		velocity_features = self.compute_velocity_features (self.positional_features, d1_positional_features, d2_positional_features)
 
 		### Step 4: combine them and set appropriately ###
-		self.features = np.array(this_positional_features + velocity_features)
+		self.features = np.concatenate ((self.positional_features, velocity_features))
+
+
+
+
+
+
+########################################################################################################################
+########################################[ --- Batch Feature Computation --- ]###########################################
+########################################################################################################################
+
+# Function: get_lag_indices
+# -------------------------
+# for a sequence of num_frames frames, returns the index of the frame each
+# one takes its d_length derivative w/r/t. As in Gesture.add_frame, this
+# is the frame (d_length - 1) back once more than d_length frames precede
+# it, and the frame itself (zero velocity) before that.
+def get_lag_indices (num_frames, d_length):
+
+	indices = np.arange (num_frames)
+	return np.where (indices > d_length, indices - (d_length - 1), indices)
+
+
+# Function: compute_features_batch
+# --------------------------------
+# given an (N, 6) array of positional features (palm x, y, z, yaw, pitch,
+# roll) for N consecutive frames in which the hand was visible, returns the
+# (N, 24) array of features that Position computes one frame at a time
+def compute_features_batch (positional_features, d1_length, d2_length):
+
+	pos_0 = np.asarray (positional_features, dtype=float)
+	pos_1 = pos_0[get_lag_indices (len(pos_0), d1_length)]
+	pos_2 = pos_0[get_lag_indices (len(pos_0), d2_length)]
+
+	d1_velocity = pos_0 - pos_1
+	d2_velocity = pos_0 - pos_2
+	acceleration = d1_velocity - (pos_1 - pos_2)
+
+	return np.hstack ((pos_0, d1_velocity, d2_velocity, acceleration))
 
 
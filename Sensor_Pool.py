@@ -0,0 +1,324 @@
+#!/usr/bin/python
+# *------------------------------------------------------------ *
+# * Class: Sensor_Pool
+# * ------------------
+# * runs synth mode for several sensors at once: one capture
+# * process per sensor, all feeding one pool of classifier
+# * worker processes that share a single copy of the models
+# *------------------------------------------------------------ *
+#--- Standard ---
+import os
+import sys
+import argparse
+import multiprocessing
+from multiprocessing import Process, Queue, RawArray
+from Queue import Empty
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Frame_Source import get_frame_source
+from Frame_Log import get_frame_interval
+from Gesture import Gesture
+from Gesture_Recognizer import Gesture_Recognizer
+from Hand_Tracker import Hand_Tracker
+from HMM_Bank import HMM_Bank
+from Max_Interface import Max_Interface
+from Motion_Gate import Motion_Gate
+from Position import Position
+
+#--- Numpy ---
+import numpy as np
+
+
+
+# Function: get_shared_array
+# --------------------------
+# returns a numpy array backed by (process-shared) RawArray memory,
+# filled with a copy of 'array' if one is given
+def get_shared_array (shape, array=None, typecode='d'):
+
+	raw_array = RawArray (typecode, int(np.prod (shape)))
+	shared_array = np.frombuffer (raw_array, dtype=np.dtype (typecode)).reshape (shape)
+	if array is not None:
+		shared_array[...] = array
+	return shared_array
+
+
+# Function: get_shared_hmm_bank
+# -----------------------------
+# returns a copy of hmm_bank whose arrays are in shared memory, so that
+# forked workers all read the same copy
+def get_shared_hmm_bank (hmm_bank):
+
+	shared_arrays = dict ([(name, get_shared_array (array.shape, array)) for name, array in hmm_bank.get_arrays ().items ()])
+	shared_hmm_bank = HMM_Bank ()
+	shared_hmm_bank.load_arrays (hmm_bank.gesture_types, shared_arrays)
+	return shared_hmm_bank
+
+
+
+
+# Class: Sensor_Pool
+# ------------------
+# Processes:
+#	- one capture process per sensor: owns the sensor's frame source, a
+#	  Hand_Tracker with a gesture window for each of up to max_hands hands,
+#	  and a Max_Interface on the sensor's port. It first measures the
+#	  seconds between the sensor's frames, which its hmm reps are sampled by
+#	  (as in Hand_Window). It then sends the state of each hand in view
+#	  every frame and, once a hand's window is full, writes each frame's hmm
+#	  rep into that window's ring of shared window slots and queues a job
+#	  (sensor, window, sequence number, generation) for the workers.
+#	- num_workers classifier processes: take jobs off the shared job queue,
+#	  skip any for which the window has since queued a newer one, copy the
+#	  window out of its slot (checking the slot was not rewritten
+#	  meanwhile), classify it against the shared hmm bank and put detections
+#	  on the sensor's result queue.
+# The capture process sends detections to max and clears the hand's window;
+# results from before the clear, or from before the window went to another
+# hand (an older generation), are ignored.
+class Sensor_Pool:
+
+	#--- Sensors ---
+	sensors 			= []		# list of (frame source description, max port)
+	transport 			= Max_Interface.TEXT
+	speed 				= 1.0		# replay speed for recorded/synthetic sources
+	motion_gate 		= None		# Motion_Gate (each hand's window gets its own copy), or None to classify every window
+	max_hands 			= 1			# hands followed at once per sensor, each with its own window
+
+	#--- Shared Memory ---
+	window_slots 		= None		# (num_sensors, max_hands, num_slots, gesture_length, num_features) hmm reps, each rep_lengths[sensor] long
+	rep_lengths 		= None		# (num_sensors,) length of each sensor's hmm reps, at its frame rate
+	slot_sequence 		= None		# (num_sensors, max_hands, num_slots) sequence number of the window in each slot; -1 while being written
+	latest_sequence 	= None		# (num_sensors, max_hands) sequence number of each hand window's newest hmm rep
+	worker_counts 		= None		# (num_workers, 2) windows classified, windows skipped
+
+	#--- Queues ---
+	job_queue 			= None		# (sensor, window, sequence number, generation) from capture processes to workers
+	result_queues 		= []		# per sensor: (window, generation, prediction, probability) from workers
+
+	#--- Parameters ---
+	num_workers 		= 2
+	num_slots 			= 4			# windows per hand that can be in flight at once
+	num_fps_frames 		= 30		# frames each sensor's frame interval is measured over
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# loads the model and puts it and the window slots in shared memory;
+	# sensors is a list of (frame source description, max port) pairs
+	def __init__ (self, sensors, num_workers=2, transport=Max_Interface.TEXT, speed=1.0, motion_gate=None, max_hands=1):
+
+		self.sensors 		= sensors
+		self.num_workers 	= num_workers
+		self.transport 		= transport
+		self.speed 			= speed
+		self.motion_gate 	= motion_gate
+		self.max_hands 		= max_hands
+
+		### Step 1: load the model; the workers score against a shared copy of the hmm bank ###
+		self.gesture_recognizer = Gesture_Recognizer ()
+		self.gesture_recognizer.load_model ()
+		self.gesture_recognizer.hmm_bank = get_shared_hmm_bank (self.gesture_recognizer.get_hmm_bank ())
+
+		### Step 2: shared window slots, long enough for the hmm rep of a sensor taking one every frame ###
+		num_sensors = len(self.sensors)
+		self.window_slots 		= get_shared_array ((num_sensors, self.max_hands, self.num_slots, Gesture.gesture_length, Position.num_features))
+		self.rep_lengths 		= get_shared_array ((num_sensors,), typecode='l')
+		self.slot_sequence 		= get_shared_array ((num_sensors, self.max_hands, self.num_slots), typecode='l')
+		self.latest_sequence 	= get_shared_array ((num_sensors, self.max_hands), typecode='l')
+		self.worker_counts 		= get_shared_array ((self.num_workers, 2), typecode='l')
+		self.slot_sequence.fill (-1)
+		self.latest_sequence.fill (-1)
+		self.worker_counts.fill (0)
+
+		### Step 3: queues ###
+		self.job_queue 		= Queue ()
+		self.result_queues 	= [Queue () for sensor in self.sensors]
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Running --- ]#############################################################
+	########################################################################################################################
+
+	# Function: run
+	# -------------
+	# starts the workers and capture processes; returns once every sensor's
+	# frame source is exhausted (or max_frames frames were captured from each)
+	def run (self, max_frames=None):
+
+		### Step 1: start the workers, then the capture processes ###
+		workers = [Process (target=self.worker_main, args=(w,)) for w in range(self.num_workers)]
+		captures = [Process (target=self.capture_main, args=(s, max_frames)) for s in range(len(self.sensors))]
+		for process in workers + captures:
+			process.daemon = True
+			process.start ()
+
+		### Step 2: wait for the sensors, then shut down the workers ###
+		try:
+			for process in captures:
+				process.join ()
+		finally:
+			for process in workers:
+				self.job_queue.put (None)
+			for process in workers:
+				process.join ()
+
+		print_status ("Sensor Pool", "Windows classified: " + str(self.worker_counts[:, 0].sum ()) + " | skipped as stale: " + str(self.worker_counts[:, 1].sum ()))
+
+
+	# Function: capture_main
+	# ----------------------
+	# body of sensor s's capture process
+	def capture_main (self, s, max_frames):
+
+		(description, port) = self.sensors[s]
+		frame_source 		= get_frame_source (description, self.speed)
+		max_interface 		= Max_Interface (self.transport, port)
+		result_queue 		= self.result_queues[s]
+		generations 		= [0] * self.max_hands		# per window: incremented when its gesture is cleared or it goes to another hand
+		window_hand_ids 	= [None] * self.max_hands	# per window: hand it followed as of the last frame
+		sequences 			= [0] * self.max_hands		# per window: sequence number of its next hmm rep
+		send_hand_ids 		= self.max_hands > 1
+		num_frames 			= 0
+
+		frame_source.start ()
+		max_interface.send_gesture ('Start')
+
+		### --- measure the seconds between the sensor's frames, and sample its hmm reps by them --- ###
+		timestamps = []
+		for i in range(self.num_fps_frames):
+			frame = frame_source.get_frame ()
+			if frame is None:
+				break
+			timestamps.append (frame.timestamp * 1e-6)
+		frame_interval 		= get_frame_interval (timestamps) or Gesture.nominal_frame_interval
+		hand_tracker 		= Hand_Tracker (None, self.max_hands, motion_gate=self.motion_gate, frame_interval=frame_interval)
+		windows 			= hand_tracker.windows
+		self.rep_lengths[s] = len(windows[0].gesture.full_hmm_rep_positions)
+		print_status ("Sensor Pool", "Sensor " + str(s) + ": " + description + " -> port " + str(port) + " | frame interval: " + str(frame_interval))
+
+		while (max_frames is None or num_frames < max_frames):
+
+			### Step 1: take any detections for the current windows ###
+			send_gestures = {}
+			while True:
+				try:
+					(h, result_generation, prediction, prediction_prob) = result_queue.get_nowait ()
+				except Empty:
+					break
+				if result_generation == generations[h]:
+					print_message ("Sensor " + str(s) + " | Prediction: " + str(prediction) + " | Probability: " + str(prediction_prob) + (" | Hand: " + str(windows[h].hand_id) if send_hand_ids else ""))
+					send_gestures[h] = prediction
+					windows[h].gesture.clear ()
+					generations[h] += 1
+
+			### Step 2: add the current frame to each hand's window; windows that changed hands start a new generation ###
+			frame = frame_source.get_frame ()
+			if frame is None:
+				break
+			num_frames += 1
+			hand_tracker.update (frame)
+			for h, window in enumerate (windows):
+				if window.hand_id != window_hand_ids[h]:
+					window_hand_ids[h] = window.hand_id
+					generations[h] += 1
+
+			### Step 3: hand the full windows to the workers, unless the hand is idle ###
+			for h, window in enumerate (windows):
+				if window.hand_id is None:
+					continue
+				is_gated = window.motion_gate is not None and not window.motion_gate.update (window.gesture)
+				if window.gesture.is_full () and not is_gated:
+					slot = sequences[h] % self.num_slots
+					self.slot_sequence[s, h, slot] = -1
+					self.window_slots[s, h, slot, :self.rep_lengths[s]] = window.gesture.get_hmm_rep ()
+					self.slot_sequence[s, h, slot] = sequences[h]
+					self.latest_sequence[s, h] = sequences[h]
+					self.job_queue.put ((s, h, sequences[h], generations[h]))
+					sequences[h] += 1
+
+			### Step 4: send each hand's state (and any gesture) to max ###
+			for h, window in enumerate (windows):
+				if window.hand_id is not None:
+					max_interface.send_frame (window.hand, send_gestures.get (h), window.hand_id if send_hand_ids else None)
+
+		frame_source.stop ()
+		if self.motion_gate:
+			print_status ("Sensor Pool", "Sensor " + str(s) + ": gate closed for " + str(int(100 * hand_tracker.get_gated_ratio ())) + "% of frames")
+
+
+	# Function: worker_main
+	# ---------------------
+	# body of classifier worker w; returns when it gets a None job
+	def worker_main (self, w):
+
+		while True:
+
+			### Step 1: get a job; skip it if the hand's window has a newer one queued ###
+			job = self.job_queue.get ()
+			if job is None:
+				return
+			(s, h, sequence, generation) = job
+			if sequence < self.latest_sequence[s, h]:
+				self.worker_counts[w, 1] += 1
+				continue
+
+			### Step 2: copy the window out of its slot, making sure it wasn't overwritten meanwhile ###
+			slot = sequence % self.num_slots
+			hmm_rep = self.window_slots[s, h, slot, :self.rep_lengths[s]].copy ()
+			if self.slot_sequence[s, h, slot] != sequence:
+				self.worker_counts[w, 1] += 1
+				continue
+
+			### Step 3: classify it ###
+			classifiable_reps = self.gesture_recognizer.score_hmm_reps ([hmm_rep])
+			classification_results = self.gesture_recognizer.classify_reps (classifiable_reps)[0]
+			self.worker_counts[w, 0] += 1
+
+			if classification_results:
+				(prediction, prediction_prob) = classification_results
+				self.result_queues[s].put ((h, generation, prediction, float(prediction_prob)))
+
+
+
+
+
+
+# Function: parse_sensor
+# ----------------------
+# 'source:port' -> (source, port); see Frame_Source.get_frame_source for sources
+def parse_sensor (sensor):
+
+	(description, port) = sensor.rsplit (':', 1)
+	return (description, int(port))
+
+
+
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser (description="Synth mode for several sensors, sharing one pool of classifier processes")
+	parser.add_argument ('--sensor', action='append', default=[], help="SOURCE:PORT, e.g. leap:7401 or frames.npy:7402; repeat once per sensor")
+	parser.add_argument ('--workers', type=int, default=max (1, multiprocessing.cpu_count () - 1), help="number of classifier processes")
+	parser.add_argument ('--transport', choices=Max_Interface.transports, default=Max_Interface.TEXT)
+	parser.add_argument ('--speed', type=float, default=1.0, help="replay speed for recorded/synthetic frames (0 = as fast as possible)")
+	parser.add_argument ('--hands', type=int, default=1, help="number of hands to follow at once per sensor, each with its own gesture window (see run.py --hands)")
+	parser.add_argument ('--gate', action='store_true', help="only classify while the hand is moving (see Motion_Gate.py)")
+	parser.add_argument ('--gate-open', type=float, default=Motion_Gate.open_threshold, help="motion energy at which the gate opens")
+	parser.add_argument ('--gate-close', type=float, default=Motion_Gate.close_threshold, help="motion energy below which the gate starts to close")
+	parser.add_argument ('--gate-hold', type=int, default=Motion_Gate.hold_frames, help="quiet frames before the gate closes")
+	args = parser.parse_args ()
+
+	if len(args.sensor) == 0:
+		print_error ("Sensor Pool", "Give at least one --sensor SOURCE:PORT")
+
+	print_message ("##### Sensor Pool: " + str(len(args.sensor)) + " sensors, " + str(args.workers) + " workers #####")
+	motion_gate = Motion_Gate (args.gate_open, args.gate_close, args.gate_hold) if args.gate else None
+	sensor_pool = Sensor_Pool ([parse_sensor (sensor) for sensor in args.sensor], args.workers, args.transport, args.speed or None, motion_gate, args.hands)
+	sensor_pool.run ()
@@ -17,6 +17,7 @@ from Leap import CircleGesture, KeyTapGesture, ScreenTapGesture, SwipeGesture
 
 #--- My Files ---
 from common_utilities import print_welcome, print_message, print_error, print_status, print_inner_status
+from Frame_Queue import Frame_Queue
 
 
 
@@ -24,12 +25,21 @@ class Synth_Listener(Leap.Listener):
 
     #--- Recent Frames ---
     most_recent_frame = None
-    new_frame_available = False
+    frame_queue = None          # Frame_Queue that on_frame feeds and Leap_Synth consumes
 
 
     # Function: Constructor
     # ---------------------
-    # creates max_interface and leap_gesture
+    # creates the frame queue; see Frame_Queue for the overflow policies
+    def __init__ (self, max_queue_size=16, overflow_policy=Frame_Queue.DROP_OLDEST):
+
+        Leap.Listener.__init__ (self)
+        self.frame_queue = Frame_Queue (max_queue_size, overflow_policy)
+
+
+    # Function: on_init
+    # -----------------
+    # callback function for when the listener is added to a controller
     def on_init(self, controller):
 
         ### Step 2: notify of initialization ###
@@ -71,6 +81,7 @@ class Synth_Listener(Leap.Listener):
     def on_exit(self, controller):
  
         print_status ("Synth Listener", "Exiting")
+        self.frame_queue.close ()
 
 
 
@@ -177,9 +188,9 @@ class Synth_Listener(Leap.Listener):
         ### Step 1: get the frame ###
         frame = controller.frame()
 
-        ### Step 2: update our public member data ###
+        ### Step 2: update our public member data and hand the frame off ###
         self.most_recent_frame = frame
-        self.new_frame_available = True
+        self.frame_queue.put (frame)
 
         ### Step 3: print out info about the frame ###
         # self.print_frame (frame)
@@ -0,0 +1,308 @@
+# *------------------------------------------------------------ *
+# * Class: Synth_Pipeline
+# * ---------------------
+# * synth mode split into stages on their own threads, so that
+# * hand state keeps flowing to max at the sensor's rate no
+# * matter how long gesture classification takes
+# *------------------------------------------------------------ *
+#--- Standard ---
+import sys
+import threading
+
+#--- My Files ---
+from common_utilities import print_message, print_error, print_status, print_inner_status
+from Frame_Queue import Frame_Queue
+from Gesture import Gesture
+from Hand_Tracker import Hand_Tracker
+from Metrics import clock
+
+#--- Numpy ---
+import numpy as np
+
+
+
+# Class: Synth_Pipeline
+# ---------------------
+# Stages:
+#	- capture (the thread that calls run): takes frames off the frame
+#	  source, adds each hand in view to its window (see Hand_Tracker) and
+#	  sends the hands' state to max. Each window that is due for
+#	  classification (every frame once full, or as its scheduler or
+#	  segmenter says; never while its motion gate is closed) has the hmm
+#	  reps of its due window lengths handed to the classifier through
+#	  window_queue.
+#	- classifier (worker thread): scores and classifies windows, keeping
+#	  the most confident window length, and sends detected gestures to max.
+#	  window_queue holds a window per hand and drops the oldest, and a
+#	  window is skipped if its hand has had a newer one queued since, so
+#	  when classification falls behind the stale windows are skipped and
+#	  the newest ones are classified next.
+# When the classifier detects a gesture it asks the capture stage to clear
+# that hand's gesture; windows captured before the clear (or before the
+# window went to another hand) are discarded. If the classifier stage
+# raises, capture stops and run re-raises the exception.
+class Synth_Pipeline:
+
+	#--- Member Objects ---
+	frame_source 		= None
+	gesture_recognizer 	= None
+	max_interface 		= None
+	metrics 			= None		# Metrics with Leap_Synth's stages/counters, or None
+	hand_tracker 		= None		# Hand_Tracker whose windows (with their own gate/scheduler/segmenter) follow the hands in view
+	window_queue 		= None		# Frame_Queue of (window index, hand id, generation, sequence, frame_index, hmm_reps) from capture to classifier
+	send_lock 			= None		# both stages send to max
+
+	#--- State (per window of hand_tracker) ---
+	generations 		= []		# incremented each time the window's gesture is cleared or goes to another hand
+	clear_generations 	= []		# generation the classifier has asked to be cleared
+	window_hand_ids 	= []		# hand id each window followed as of the last frame
+	latest_sequences 	= []		# sequence number of each window's newest queued hmm reps
+
+	#--- State ---
+	num_captured 		= 0			# frames captured so far
+	num_queued 			= 0			# windows queued so far (their sequence numbers)
+	classified_frame_index = 0		# num_captured when the last classified window was captured
+	num_skipped_stale 	= 0			# windows discarded because a newer one was queued or the gesture was cleared since
+	classifier_error 	= None		# sys.exc_info () of the exception that stopped the classifier stage, if any
+
+	#--- Parameters ---
+	window_queue_size 	= 1			# windows per hand
+	window_lengths 		= None		# (num_lengths,) lengths (in frames) of the windows classified
+	send_hand_ids 		= False		# wether hand state/gestures are sent with their hand's id (when following several hands)
+
+
+
+	# Function: Constructor
+	# ---------------------
+	# gesture_recognizer must already have its model loaded; frame_interval is
+	# the seconds between the source's frames, which the hmm rep is sampled to
+	# every hmm_rep_interval seconds by. max_hands, motion_gate, scheduler,
+	# segmenter and window_lengths are as in Leap_Synth.synth_main (see
+	# Hand_Tracker)
+	def __init__ (self, frame_source, gesture_recognizer, max_interface, metrics=None, motion_gate=None, frame_interval=Gesture.nominal_frame_interval, max_hands=1, scheduler=None, segmenter=None, window_lengths=None):
+
+		self.frame_source 		= frame_source
+		self.gesture_recognizer = gesture_recognizer
+		self.max_interface 		= max_interface
+		self.metrics 			= metrics
+		self.hand_tracker 		= Hand_Tracker (None, max_hands, motion_gate=motion_gate, scheduler=scheduler, segmenter=segmenter, window_lengths=window_lengths, frame_interval=frame_interval)
+		self.window_queue 		= Frame_Queue (self.window_queue_size * max_hands, Frame_Queue.DROP_OLDEST)
+		self.send_lock 			= threading.Lock ()
+		self.window_lengths 	= np.array (window_lengths or [Gesture.gesture_length], dtype=int)
+		self.send_hand_ids 		= max_hands > 1
+
+		self.generations 			= [0] * max_hands
+		self.clear_generations 		= [-1] * max_hands
+		self.window_hand_ids 		= [None] * max_hands
+		self.latest_sequences 		= [-1] * max_hands
+		self.num_captured 			= 0
+		self.num_queued 			= 0
+		self.classified_frame_index = 0
+		self.num_skipped_stale 		= 0
+		self.classifier_error 		= None
+
+		### Step 1: build the hmm bank before the worker needs it ###
+		self.gesture_recognizer.get_hmm_bank ()
+
+		### Step 2: report the backlog of each stage ###
+		if self.metrics:
+			self.metrics.add_gauge ('capture_backlog', lambda: self.frame_source.frame_queue.size ())
+			self.metrics.add_gauge ('classifier_backlog', lambda: self.window_queue.size ())
+			self.metrics.add_gauge ('skipped_windows', lambda: self.window_queue.num_dropped + self.num_skipped_stale)
+			if motion_gate:
+				self.metrics.add_gauge ('gated_ratio', self.hand_tracker.get_gated_ratio)
+			if scheduler:
+				self.metrics.add_gauge ('stride', lambda: min ([window.scheduler.stride for window in self.hand_tracker.windows]))
+			if max_hands > 1:
+				self.metrics.add_gauge ('hands', self.hand_tracker.get_num_active)
+			self.metrics.add_gauge ('classifier_lag_frames', lambda: self.num_captured - self.classified_frame_index if self.classified_frame_index else 0)
+
+
+
+
+
+
+	########################################################################################################################
+	########################################[ --- Running --- ]#############################################################
+	########################################################################################################################
+
+	# Function: run
+	# -------------
+	# runs the capture stage on this thread (with the classifier on a worker)
+	# until the frame source is exhausted, max_frames frames were captured or
+	# the classifier stage raised (the exception is then raised here)
+	def run (self, max_frames=None):
+
+		classifier_thread = threading.Thread (target=self.classifier_main)
+		classifier_thread.daemon = True
+		classifier_thread.start ()
+
+		try:
+			self.capture_main (max_frames)
+		finally:
+			self.window_queue.close ()
+			classifier_thread.join ()
+
+		if self.classifier_error:
+			(error_type, error, error_traceback) = self.classifier_error
+			raise error_type, error, error_traceback
+
+
+	# Function: send
+	# --------------
+	# sends a hand state and/or gesture to max
+	def send (self, hand, gesture_type, hand_id=None):
+
+		with self.send_lock:
+			self.max_interface.send_frame (hand, gesture_type, hand_id if self.send_hand_ids else None)
+
+
+	# Function: get_due_hmm_reps
+	# --------------------------
+	# call once per frame for each window following a hand; returns the hmm
+	# reps of its windows due for classification on this frame (see
+	# Leap_Synth.synth_main), or None if there are none
+	def get_due_hmm_reps (self, window):
+
+		### --- with a segmenter, only the segment that just ended --- ###
+		if window.segmenter:
+			segment = window.segmenter.update (window.gesture)
+			if segment is None:
+				return None
+			return [segment.get_hmm_rep ()]
+
+		### --- otherwise every window length that is due, while the gate is open --- ###
+		if window.motion_gate is not None and not window.motion_gate.update (window.gesture):
+			if self.metrics:
+				self.metrics.increment ('gated_frames')
+			return None
+		if window.scheduler:
+			is_due = window.scheduler.should_classify (window.gesture)
+		else:
+			is_due = window.gesture.num_frames >= self.window_lengths
+		if not is_due.any ():
+			return None
+		return [window.gesture.get_hmm_rep (length) for length in self.window_lengths[is_due]]
+
+
+	# Function: capture_main
+	# ----------------------
+	# body of the capture stage
+	def capture_main (self, max_frames):
+
+		metrics = self.metrics
+		windows = self.hand_tracker.windows
+		num_frames = 0
+		while (max_frames is None or num_frames < max_frames):
+
+			### Step 1: stop if the classifier stage is gone; clear the gestures it detected one in ###
+			if self.classifier_error:
+				break
+			for w, window in enumerate (windows):
+				if self.clear_generations[w] == self.generations[w]:
+					window.gesture.clear ()
+					self.generations[w] += 1
+
+			### Step 2: add the current frame to each hand's window; windows that changed hands start a new generation ###
+			frame = self.frame_source.get_frame ()
+			if frame is None:
+				break
+			num_frames += 1
+			self.num_captured += 1
+			t0 = clock ()
+			self.hand_tracker.update (frame)
+			for w, window in enumerate (windows):
+				if window.hand_id != self.window_hand_ids[w]:
+					self.window_hand_ids[w] = window.hand_id
+					self.generations[w] += 1
+
+			### Step 3: hand the windows that are due to the classifier ###
+			for w, window in enumerate (windows):
+				if window.hand_id is None:
+					continue
+				hmm_reps = self.get_due_hmm_reps (window)
+				if hmm_reps is not None:
+					self.latest_sequences[w] = self.num_queued
+					self.window_queue.put ((w, window.hand_id, self.generations[w], self.num_queued, self.num_captured, hmm_reps))
+					self.num_queued += 1
+
+			### Step 4: send each hand's state ###
+			t1 = clock ()
+			num_sent = 0
+			for window in windows:
+				if window.hand_id is not None:
+					self.send (window.hand, None, window.hand_id)
+					num_sent += 1
+			t2 = clock ()
+
+			### Step 5: record this frame's timings ###
+			if metrics:
+				metrics.record ('features', t1 - t0)
+				metrics.record ('send', t2 - t1)
+				metrics.record ('frame', t2 - t0)
+				queued_time = getattr (frame, 'queued_time', None)
+				if queued_time is not None:
+					metrics.record ('latency', t2 - queued_time)
+				metrics.increment ('frames')
+				metrics.increment ('sends', num_sent)
+				metrics.tick ()
+
+
+	# Function: classifier_main
+	# -------------------------
+	# body of the classifier stage; returns once window_queue is closed, or
+	# keeps the exception that stopped it for run to raise
+	def classifier_main (self):
+
+		try:
+			self.classify_windows ()
+		except Exception:
+			self.classifier_error = sys.exc_info ()
+
+
+	# Function: classify_windows
+	# --------------------------
+	# classifies the windows on window_queue until it is closed
+	def classify_windows (self):
+
+		metrics = self.metrics
+		while True:
+
+			### Step 1: get the next window; skip it if its hand has a newer one queued or was cleared since ###
+			window = self.window_queue.get ()
+			if window is None:
+				return
+			(w, hand_id, generation, sequence, frame_index, hmm_reps) = window
+			if sequence < self.latest_sequences[w] or generation != self.generations[w] or generation == self.clear_generations[w]:
+				self.num_skipped_stale += 1
+				continue
+
+			### Step 2: score and classify it, keeping the most confident window length ###
+			t0 = clock ()
+			classifiable_reps = self.gesture_recognizer.score_hmm_reps (hmm_reps)
+			t1 = clock ()
+			all_prediction_probs = self.gesture_recognizer.get_prediction_probs (classifiable_reps)
+			prediction_probs = all_prediction_probs[all_prediction_probs.max (axis=1).argmax ()]
+			classification_results = self.gesture_recognizer.classify_prediction_probs (prediction_probs[np.newaxis])[0]
+			self.classified_frame_index = frame_index
+			t2 = clock ()
+
+			### Step 3: let the window's scheduler adapt ###
+			hand_window = self.hand_tracker.windows[w]
+			if hand_window.scheduler:
+				hand_window.scheduler.report (prediction_probs.max (), t2 - t0)
+
+			### Step 4: send it and have the capture stage start a new gesture (segments are already over) ###
+			if classification_results:
+				(prediction, prediction_prob) = classification_results
+				print_message ("Prediction: " + str(prediction) + " | Probability: " + str(prediction_prob) + (" | Hand: " + str(hand_id) if self.send_hand_ids else ""))
+				if not hand_window.segmenter:
+					self.clear_generations[w] = generation
+				self.send (None, prediction, hand_id)
+
+			if metrics:
+				metrics.record ('hmm', t1 - t0)
+				metrics.record ('classifier', t2 - t1)
+				metrics.increment ('classifications')
+				if classification_results:
+					metrics.increment ('detections')
@@ -0,0 +1,48 @@
+# ---------------------------------------------------------- #
+# File: hmm_utilities.py
+# ---------------------------
+# numerical routines shared by the hmm scorers: a stable
+# logsumexp, and the arrays HMM_Bank needs from each trained
+# gaussian hmm (the forward algorithm itself is in HMM_Bank)
+# ---------------------------------------------------------- #
+
+#--- Numpy ---
+import numpy as np
+
+
+# Function: logsumexp
+# -------------------
+# numerically stable log(sum(exp(a))) along 'axis'; rows that are
+# entirely -inf stay -inf rather than becoming nan
+def logsumexp (a, axis=-1):
+
+	a_max = np.max (a, axis=axis)
+	a_max = np.where (np.isfinite (a_max), a_max, 0.0)
+	with np.errstate (divide='ignore'):
+		return np.log (np.sum (np.exp (a - np.expand_dims (a_max, axis)), axis=axis)) + a_max
+
+
+# Function: get_hmm_params
+# ------------------------
+# given a trained GaussianHMM, returns a dict of the arrays needed to
+# score sequences against it: log start probabilities (S,), log
+# transition matrix (S, S), means (S, D), and for the emission
+# densities the inverse cholesky factors (S, D, D) and log-determinants
+# (S,) of the (full) state covariances
+def get_hmm_params (hmm):
+
+	means 	= np.asarray (hmm.means_, dtype=float)
+	covars 	= np.asarray (hmm.covars_, dtype=float)		# one full matrix per state, regardless of covariance_type
+
+	cholesky 			= np.linalg.cholesky (covars)
+	inverse_cholesky 	= np.linalg.inv (cholesky)
+	log_det 			= 2.0 * np.sum (np.log (np.diagonal (cholesky, axis1=1, axis2=2)), axis=1)
+
+	with np.errstate (divide='ignore'):
+		return {
+					'log_startprob': 	np.log (np.asarray (hmm.startprob_, dtype=float)),
+					'log_transmat': 	np.log (np.asarray (hmm.transmat_, dtype=float)),
+					'means': 			means,
+					'inverse_cholesky': inverse_cholesky,
+					'log_det': 			log_det
+				}
@@ -14,18 +14,26 @@ import sys
 import select 
 import time
 import timeit
-
-#--- Leap ---
-### NOTE: change the path below to the location of your local installation ###
-sys.path.append ('/Users/jayhack/CS/NI/LeapDeveloperKit/LeapSDK/lib')
-import Leap
+import argparse
+from collections import deque
 
 #--- My Files ---
 from common_utilities import print_welcome, print_message, print_error, print_status, print_inner_status
-from Synth_Listener import Synth_Listener
+from Frame_Source import Leap_Frame_Source, get_frame_source
+from Frame_Log import Frame_Log_Writer
+from Continuous_Recorder import Continuous_Recorder
 from Max_Interface import Max_Interface
-from Gesture import Gesture
+from Metrics import Metrics, Stats_Server, clock
+from Synth_Pipeline import Synth_Pipeline
+from Motion_Gate import Motion_Gate
+from Classification_Scheduler import Classification_Scheduler
+from Gesture_Segmenter import Gesture_Segmenter
+from Gesture import Gesture, get_frame_reduction_const
 from Gesture_Recognizer import Gesture_Recognizer
+from Hand_Tracker import Hand_Tracker
+
+#--- Numpy ---
+import numpy as np
 
 
 
@@ -35,29 +43,58 @@ from Gesture_Recognizer import Gesture_Recognizer
 class Leap_Synth:
 
     #--- Member Objects ---
-    listener            = None
-    controller          = None
+    frame_source        = None      # Frame_Source (a live Leap by default)
     max_interface       = None
     gesture_recognizer  = None
+    metrics             = None      # per-stage timings/counters of synth_main
+    stats_server        = None      # answers UDP requests with the metrics; None if not enabled
+    frame_log           = None      # record mode: Frame_Log_Writer the raw frames are captured to; None to not keep them
+    detections          = None      # synth mode: list that (frame id, hand id, gesture) is appended to for every detection (e.g. by Benchmark); None to not keep them
+
+    #--- Parameters ---
+    pipelined           = False     # synth mode: classify on a worker thread (see Synth_Pipeline)
+    incremental_training = True     # train mode: only refit what changed since the saved model (see Gesture_Recognizer.get_hmms)
+    motion_gate         = None      # synth mode: Motion_Gate that skips classification while the hand is idle; None to classify every frame
+    scheduler           = None      # synth mode: Classification_Scheduler picking which windows to classify; None for all of them
+    segmenter           = None      # synth mode: Gesture_Segmenter; if given, each gesture is classified once, when its segment ends, instead of every window
+    max_hands           = 1         # synth mode: number of hands followed at once (see Hand_Tracker)
+    ring_size           = 6000      # continuous record mode: frames kept to cut marked gestures out of (see Continuous_Recorder)
+    window_lengths      = None      # synth mode: lengths (in frames) of the windows scored at every frame, the most confident of which counts; None for just Gesture.gesture_length
+    frame_interval      = Gesture.nominal_frame_interval    # seconds between frames, as measured by determine_fps
+
+    #--- Metrics ---
+    synth_stages        = ['features', 'hmm', 'classifier', 'send', 'frame', 'latency']
+    synth_counters      = ['frames', 'classifications', 'detections', 'sends', 'gated_frames']
 
 
     # Function: Constructor 
     # ---------------------
-    # initializes member objects
-    def __init__ (self):
+    # initializes member objects; transport is one of Max_Interface.transports,
+    # frame_source defaults to a Leap_Frame_Source. synth mode publishes its
+    # metrics every stats_interval seconds (printing them if print_stats), and
+    # serves them on localhost:stats_port if one is given
+    def __init__ (self, transport=Max_Interface.TEXT, frame_source=None, stats_interval=5.0, print_stats=True, stats_port=None):
 
         print_welcome ()
 
-        ### Step 1: create the listener, controller and connect the two ###
-        self.listener = Synth_Listener ()
-        self.controller = Leap.Controller ()
-        self.controller.add_listener (self.listener)
+        ### Step 1: create the frame source and start it ###
+        if frame_source is None:
+            frame_source = Leap_Frame_Source ()
+        self.frame_source = frame_source
+        self.frame_source.start ()
 
         ### Step 2: create controller and gesture recognizer ###
-        self.max_interface = Max_Interface ()
+        self.max_interface = Max_Interface (transport)
         self.gesture_recognizer = Gesture_Recognizer ()
 
-        ### Step 3: determine what the fps is ###
+        ### Step 3: set up metrics ###
+        self.metrics = Metrics (self.synth_stages, self.synth_counters, stats_interval, print_stats)
+        self.metrics.add_gauge ('dropped_frames', lambda: self.frame_source.frame_queue.num_dropped)
+        self.metrics.add_gauge ('queued_frames', lambda: self.frame_source.frame_queue.size ())
+        if stats_port:
+            self.stats_server = Stats_Server (self.metrics, stats_port)
+
+        ### Step 4: determine what the fps is ###
         self.determine_fps ()
 
 
@@ -69,39 +106,45 @@ class Leap_Synth:
         ### Step 1: turn off the max patch ###
         self.max_interface.send_gesture ('Stop')
 
-        ### Step 2: remove leap listener ###        
-        self.controller.remove_listener(self.listener)
+        ### Step 2: stop the frame source ###        
+        self.frame_source.stop ()
+
+        ### Step 3: write out the rest of the frame log ###
+        if self.frame_log:
+            self.frame_log.close ()
 
 
 
     # Function: get_frame
     # -------------------
-    # blocks until it gets a new frame from the listener
+    # blocks (sleeping) until it gets a new frame from the frame source;
+    # returns None once the source is exhausted (e.g. at the end of a replay)
     def get_frame (self):
 
-        while (self.listener.new_frame_available == False):
-            pass
-
-        frame = self.listener.most_recent_frame
-        self.listener.new_frame_available = False
-
-        return frame
+        return self.frame_source.get_frame ()
 
 
 
     # Function: determine_fps
     # -----------------------
-    # gets 30 frames in order to determine the fps
+    # gets 30 frames in order to determine the fps, and the seconds between
+    # frames from their timestamps
     def determine_fps (self):
 
-        start = timeit.timeit()
-        for i in range(30):
-            print i
+        num_frames = 30
+        start = timeit.default_timer ()
+        timestamps = []
+        for i in range(num_frames):
             frame = self.get_frame ()
-        stop = timeit.timeit()
+            if frame is not None:
+                timestamps.append (frame.timestamp)
+        stop = timeit.default_timer ()
 
-        self.fps = stop - start
-        print "fps: ", self.fps
+        self.fps = num_frames / max (stop - start, 1e-9)
+        self.frame_interval = Gesture.nominal_frame_interval
+        if len(timestamps) > 1 and timestamps[-1] > timestamps[0]:
+            self.frame_interval = (timestamps[-1] - timestamps[0]) * 1e-6 / (len(timestamps) - 1)
+        print "fps: ", self.fps, "| frame interval: ", self.frame_interval
 
 
 
@@ -117,26 +160,34 @@ class Leap_Synth:
 
     # Function: interface_main
     # ------------------------
-    # main function for all interface
-    def interface_main (self):
+    # main function for all interface; asks for the mode unless one is passed
+    def interface_main (self, mode=None):
 
-        viable_options =['r', 't', 's']
+        viable_options =['r', 'c', 't', 's']
 
         ### Step 1: get their requested mode ###
-        print_message ("What mode would you like to enter?")
-        print " - R: record mode"
-        print " - T: train mode"
-        print " - S: synth mode"
-        response = raw_input ("---> ")
+        if mode:
+            response = mode
+        else:
+            print_message ("What mode would you like to enter?")
+            print " - R: record mode"
+            print " - C: continuous record mode"
+            print " - T: train mode"
+            print " - S: synth mode"
+            response = raw_input ("---> ")
         response = response.lower ()
 
         if response == 'r':
             while (True):
                 self.record_main ()
+        elif response == 'c':
+            self.continuous_record_main ()
         elif response == 't':
             self.train_main ()
         elif response == 's':
-            while (True):
+            if self.pipelined:
+                self.synth_main_pipelined ()
+            else:
                 self.synth_main ()
         else:
             print_message("Error: did not recognize that option")
@@ -188,7 +239,8 @@ class Leap_Synth:
         print_message ("Now we will begin recording " + str(max_examples) + " examples of this gesture, " + str(gesture_name) + ". Press Enter when ready.")
         sys.stdin.readline ()
 
-        record_gesture = Gesture (gesture_name)
+        record_gesture = Gesture (gesture_name, frame_interval=self.frame_interval)
+        recent_timestamps = deque (maxlen=record_gesture.gesture_length)
 
 
 
@@ -199,7 +251,12 @@ class Leap_Synth:
         while (num_examples_recorded < max_examples):
 
             frame = self.get_frame ()
+            if frame is None:
+                return
             record_gesture.add_frame (frame)
+            if self.frame_log:
+                self.frame_log.add_frame (frame)
+                recent_timestamps.append (frame.timestamp * 1e-6)
 
             if record_gesture.is_full ():
 
@@ -218,6 +275,8 @@ class Leap_Synth:
                     num_frames_recorded = 0
                     num_examples_recorded += 1
                     self.gesture_recognizer.save_gesture(record_gesture)
+                    if self.frame_log:
+                        self.frame_log.add_gesture (gesture_name, recent_timestamps[0], recent_timestamps[-1])
 
                 ### --- Check if we should start the recording --- ### 
                 while sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
@@ -228,6 +287,51 @@ class Leap_Synth:
 
 
 
+    # Function: continuous_record_main
+    # ---------------------------------
+    # records continuously; the operator presses Enter right after making a
+    # gesture (or types how many seconds ago it ended), and the example is
+    # cut out of the frames already recorded and saved in the background
+    def continuous_record_main (self):
+
+        ### Step 1: have them name the gesture ###
+        print_message ("What is this gesture called?")
+        gesture_name = raw_input ("---> ")
+        print_message ("Make " + gesture_name + " gestures whenever you like. After each, press Enter (or type how many seconds ago it ended, then Enter). Type a new name to switch gestures, 'q' to quit.")
+
+        ### Step 2: start recording ###
+        recorder = Continuous_Recorder (self.gesture_recognizer.save_gesture, self.ring_size, frame_log=self.frame_log)
+        recorder.start ()
+
+        while (True):
+
+            frame = self.get_frame ()
+            if frame is None:
+                break
+            recorder.add_frame (frame)
+            if self.frame_log:
+                self.frame_log.add_frame (frame)
+
+            ### --- handle the operator's marks --- ###
+            if not sys.stdin in select.select ([sys.stdin], [], [], 0)[0]:
+                continue
+            line = sys.stdin.readline ().strip ()
+            if line.lower () == 'q':
+                break
+            try:
+                seconds_ago = float(line) if line else 0.0
+            except ValueError:
+                gesture_name = line
+                print_message ("Now recording " + gesture_name + " gestures")
+                continue
+            recorder.mark (gesture_name, seconds_ago)
+            print_status ("Continuous Record", "Marked " + gesture_name + " (" + str(recorder.num_marked) + " marked, " + str(recorder.num_saved) + " saved, " + str(recorder.num_lost) + " lost)")
+
+        ### Step 3: wait for the last examples to be saved ###
+        recorder.close ()
+        print_status ("Continuous Record", "Saved " + str(recorder.num_saved) + " of " + str(recorder.num_marked) + " marked gestures")
+
+
     # Function: train_main
     # --------------------
     # train the classifier 
@@ -238,9 +342,12 @@ class Leap_Synth:
         self.gesture_recognizer.load_gestures ()
         self.gesture_recognizer.print_gestures_stats ()
 
-        ### Step 2: train the HMMs ###
+        ### Step 2: train the HMMs (incrementally from the last model, if there is one) ###
         print_message ("Getting hmms")
-        self.gesture_recognizer.get_hmms ()
+        previous_model = None
+        if self.incremental_training:
+            previous_model = self.gesture_recognizer.get_previous_model ()
+        self.gesture_recognizer.get_hmms (previous_artifact=previous_model)
 
         ### Step 3: get examples ###
         print_message ("Getting examples for training/testing")
@@ -330,24 +437,25 @@ class Leap_Synth:
     # Function: get_position_and_orientation
     # --------------------------------------
     # given a frame, this returns the (palm_position, palm_orientation) if we observe
-    # a fist (0 fingers visible); (None, None) otherwise
-    def get_position_and_orientation (self, frame):
+    # a fist (0 fingers visible); (None, None) otherwise. hand is the hand in the
+    # frame to look at; the first one if None
+    def get_position_and_orientation (self, frame, hand=None):
 
         ### Step 1: peace out if there are no hands ###
-        hands = frame.hands
-        if len(hands) == 0:
-            return (None, None)
+        if hand is None:
+            if len(frame.hands) == 0:
+                return (None, None)
+            hand = frame.hands[0]
 
         ### Step 2: peace out if there are any fingers (not a fist) ###
-        fingers = hands[0].fingers
+        fingers = hand.fingers
         if len (fingers) > 0:
             return (None, None)
 
         ### Step 3: get position and orientation ###
-        hand = hands[0]
-        palm_position   = hands[0].palm_position
+        palm_position   = hand.palm_position
         position        = (palm_position[0], palm_position[1], palm_position[2])
-        palm_normal     = hands[0].palm_normal
+        palm_normal     = hand.palm_normal
         orientation     = (palm_normal[0], palm_normal[1], palm_normal[2])
 
         return (position, orientation)
@@ -357,54 +465,143 @@ class Leap_Synth:
 
     # Function: synth_main
     # --------------------
-    # maintains a 70-frame gesture and tries to classify it
-    def synth_main (self):
+    # maintains a 70-frame gesture per hand in view (up to max_hands) and tries
+    # to classify them; returns once the frame source is exhausted or max_frames
+    # frames have been processed
+    def synth_main (self, max_frames=None):
         
         ### Step 1: start the max patch ###
         self.max_interface.send_gesture ('Start')
 
-        ### Step 2: initialize local data ###
+        ### Step 2: initialize local data; each hand gets a window (with its own gate/scheduler) from hand_tracker ###
         print_message ("Entering Main Loop: Continuous Gesture Recognition")
         self.gesture_recognizer.load_model ()
-        observed_gesture = Gesture ()
+        scheduler = self.scheduler
+        hand_tracker = Hand_Tracker (self.gesture_recognizer.get_hmm_bank (), self.max_hands, scheduler.base_stride if scheduler else 1, self.motion_gate, scheduler, self.segmenter, self.window_lengths, self.frame_interval, self.gesture_recognizer.length_normalized_scores)
+        if self.motion_gate:
+            self.metrics.add_gauge ('gated_ratio', hand_tracker.get_gated_ratio)
+        if scheduler:
+            self.metrics.add_gauge ('stride', lambda: min ([window.scheduler.stride for window in hand_tracker.windows]))
+        if self.max_hands > 1:
+            self.metrics.add_gauge ('hands', hand_tracker.get_num_active)
 
         ### Step 3: enter main loop ###
-        while (True):
+        metrics = self.metrics
+        send_hand_ids = self.max_hands > 1
+        num_frames = 0
+        while (max_frames is None or num_frames < max_frames):
 
-            ### Step 1: add the current frame to observed_gesture ###
+            ### Step 1: add the current frame to each hand's window ###
             frame = self.get_frame ()
-            observed_gesture.add_frame (frame)
+            if frame is None:
+                break
+            num_frames += 1
+            t0 = clock ()
+            windows = hand_tracker.update (frame)
 
             ### Step 2: get position and orientation (returns (None, None) if not a fist) ###
-            (palm_position, palm_orientation) = self.get_position_and_orientation (frame)
-
-            ### Step 3: Get the gesture, if appropriate ###
-            send_gesture = None
-
-            if observed_gesture.is_full ():
-
-                classification_results = self.gesture_recognizer.classify_gesture (observed_gesture)
-                if classification_results:
-                    prediction = classification_results [0]
-                    prediction_prob = classification_results [1]
-                    print_message("Prediction: " + str(prediction) + " | Probability: " + str(prediction_prob))
-                    send_gesture = prediction
-                    observed_gesture.clear ()
-
-
-
-            ### Step 4: send a gesture to max if one was observed ###
-            if send_gesture:
-                self.max_interface.send_gesture (send_gesture)
-
-            ### Step 5: Send hand state to max if one was observed ###
-            if len(frame.hands) > 0:
-                self.max_interface.send_hand_state (frame.hands[0])
-
+            for window in windows:
+                (palm_position, palm_orientation) = self.get_position_and_orientation (frame, window.hand)
+
+            ### Step 3: update each hand's scores and collect the windows due for classification (scores are
+            ### updated every frame the gate is open; when it reopens, the forward scorer replays the window it missed).
+            ### with a segmenter, a hand is only due when a segment ends, and the segment is what gets scored.
+            ### each due hand gets a row of scores per window length scored ###
+            t1 = clock ()
+            due_windows = []
+            due_scores = []
+            segment_windows = []
+            segments = []
+            for window in windows:
+                if window.segmenter:
+                    segment = window.segmenter.update (window.gesture)
+                    if segment is not None:
+                        segment_windows.append (window)
+                        segments.append (segment)
+                    continue
+                is_gated = window.motion_gate is not None and not window.motion_gate.update (window.gesture)
+                if is_gated:
+                    metrics.increment ('gated_frames')
+                    continue
+                is_due = window.scheduler.should_classify (window.gesture) if window.scheduler else window.gesture.num_frames >= window.min_window_length
+                hmm_scores = window.forward_scorer.update (window.gesture)
+                if np.any (is_due) and hmm_scores is not None:
+                    hmm_scores = np.atleast_2d (hmm_scores)
+                    hmm_scores = hmm_scores[is_due & ~np.isnan (hmm_scores[:, 0])]
+                    if len(hmm_scores) > 0:
+                        due_windows.append (window)
+                        due_scores.append (hmm_scores)
+            if len(segments) > 0:
+                due_windows.extend (segment_windows)
+                due_scores.extend (self.gesture_recognizer.get_classifiable_reps (segments)[:, np.newaxis])
+            t2 = clock ()
+
+            ### Step 4: classify all due windows at once, keeping each hand's most confident window length ###
+            send_gestures = {}
+            if len(due_windows) > 0:
+                metrics.increment ('classifications', len(due_windows))
+                row_probs = self.gesture_recognizer.get_prediction_probs (np.vstack (due_scores))
+                all_prediction_probs = []
+                row = 0
+                for hmm_scores in due_scores:
+                    window_probs = row_probs[row:row + len(hmm_scores)]
+                    all_prediction_probs.append (window_probs[window_probs.max (axis=1).argmax ()])
+                    row += len(hmm_scores)
+                all_prediction_probs = np.array (all_prediction_probs)
+                all_classification_results = self.gesture_recognizer.classify_prediction_probs (all_prediction_probs)
+                cost = (clock () - t1) / len(due_windows)
+                for window, prediction_probs, classification_results in zip (due_windows, all_prediction_probs, all_classification_results):
+                    if window.scheduler:
+                        window.scheduler.report (prediction_probs.max (), cost)
+                    if classification_results:
+                        metrics.increment ('detections')
+                        prediction = classification_results [0]
+                        prediction_prob = classification_results [1]
+                        print_message("Prediction: " + str(prediction) + " | Probability: " + str(prediction_prob) + (" | Hand: " + str(window.hand_id) if send_hand_ids else ""))
+                        send_gestures[window.hand_id] = prediction
+                        if self.detections is not None:
+                            self.detections.append ((frame.id, window.hand_id, prediction))
+                        if not window.segmenter:
+                            window.gesture.clear ()
+            t3 = clock ()
+
+            ### Step 5: send each hand's state (and gesture) to max ###
+            for window in windows:
+                self.max_interface.send_frame (window.hand, send_gestures.get (window.hand_id), window.hand_id if send_hand_ids else None)
+                metrics.increment ('sends')
+            t4 = clock ()
+
+            ### Step 6: record this frame's timings ###
+            metrics.record ('features', t1 - t0)
+            metrics.record ('hmm', t2 - t1)
+            metrics.record ('classifier', t3 - t2)
+            metrics.record ('send', t4 - t3)
+            metrics.record ('frame', t4 - t0)
+            queued_time = getattr (frame, 'queued_time', None)
+            if queued_time is not None:
+                metrics.record ('latency', t4 - queued_time)
+            metrics.increment ('frames')
+            metrics.tick ()
+
+        self.metrics.publish ()
+
+
+    # Function: synth_main_pipelined
+    # ------------------------------
+    # synth_main with capture/hand state and classification on separate
+    # threads; see Synth_Pipeline
+    def synth_main_pipelined (self, max_frames=None):
 
+        ### Step 1: start the max patch ###
+        self.max_interface.send_gesture ('Start')
 
+        ### Step 2: load the model and run the pipeline ###
+        print_message ("Entering Main Loop: Continuous Gesture Recognition (pipelined)")
+        self.gesture_recognizer.load_model ()
+        synth_pipeline = Synth_Pipeline (self.frame_source, self.gesture_recognizer, self.max_interface, self.metrics, self.motion_gate, self.frame_interval, self.max_hands, self.scheduler, self.segmenter, self.window_lengths)
+        synth_pipeline.run (max_frames)
 
-                
+        self.metrics.publish ()
 
 
 
@@ -420,12 +617,63 @@ class Leap_Synth:
 # contains all main operation of the program
 def main():
 
+    parser = argparse.ArgumentParser (description="Leap Receiver for Max MSP")
+    parser.add_argument ('--workers', type=int, default=Gesture_Recognizer.num_training_workers, help="train mode: number of processes to fit hmms with")
+    parser.add_argument ('--seed', type=int, default=Gesture_Recognizer.hmm_random_seed, help="train mode: base random seed for the hmms")
+    parser.add_argument ('--no-diagnostics', action='store_true', help="train mode: don't score/decode training examples after fitting")
+    parser.add_argument ('--full', action='store_true', help="train mode: refit every hmm from scratch instead of training incrementally from the saved model")
+    parser.add_argument ('--transport', choices=Max_Interface.transports, default=Max_Interface.TEXT, help="how hand state/gestures are sent to max")
+    parser.add_argument ('--source', default='leap', help="where frames come from: 'leap', 'synthetic', a .npy file of recorded frames (see Frame_Source.py) or a frame log directory")
+    parser.add_argument ('--ring-size', type=int, default=Leap_Synth.ring_size, help="continuous record mode: number of frames kept to cut marked gestures out of")
+    parser.add_argument ('--log', default=None, help="record modes: also capture the raw frames, and when each gesture was made, to this frame log directory (see Frame_Log.py)")
+    parser.add_argument ('--speed', type=float, default=1.0, help="replay speed for recorded/synthetic frames, as a multiple of real time (0 = as fast as possible)")
+    parser.add_argument ('--hands', type=int, default=1, help="synth mode: number of hands to follow at once, each with its own gesture window")
+    parser.add_argument ('--pipeline', action='store_true', help="synth mode: classify on a worker thread so hand state is never held up by classification")
+    parser.add_argument ('--gate', action='store_true', help="synth mode: only classify while the hand is moving (see Motion_Gate.py)")
+    parser.add_argument ('--gate-open', type=float, default=Motion_Gate.open_threshold, help="motion energy at which the gate opens")
+    parser.add_argument ('--gate-close', type=float, default=Motion_Gate.close_threshold, help="motion energy below which the gate starts to close")
+    parser.add_argument ('--gate-hold', type=int, default=Motion_Gate.hold_frames, help="quiet frames before the gate closes")
+    parser.add_argument ('--segment', action='store_true', help="synth mode: classify each gesture once, when the hand's motion shows it has ended, instead of every window (see Gesture_Segmenter.py; takes the --gate-* thresholds)")
+    parser.add_argument ('--window-lengths', default=None, help="synth mode: comma-separated lengths (in frames) of windows to score at once, e.g. 30,40,60, so faster and slower performances are caught; default " + str(Gesture.gesture_length))
+    parser.add_argument ('--stride', type=int, default=None, help="synth mode: classify every STRIDE'th window (a divisor or multiple of the frames between those of the hmm rep: 5 at 100 fps, 3 at 60 fps); default every window")
+    parser.add_argument ('--max-stride', type=int, default=None, help="synth mode: back off up to this stride while nothing looks like a gesture (a multiple of --stride that, like it, divides or is a multiple of the frames between those of the hmm rep, and at most the shortest window length; see Classification_Scheduler.py)")
+    parser.add_argument ('--cpu-budget', type=float, default=None, help="synth mode, with --max-stride: fraction of frame time classification may use")
+    parser.add_argument ('--stats-interval', type=float, default=5.0, help="synth mode: seconds between metrics dumps")
+    parser.add_argument ('--quiet-stats', action='store_true', help="synth mode: don't print the metrics (they are still served with --stats-port)")
+    parser.add_argument ('--stats-port', type=int, default=None, help="synth mode: answer UDP datagrams on localhost:PORT with the latest metrics as JSON")
+    parser.add_argument ('--mode', choices=['r', 'c', 't', 's'], default=None, help="enter this mode directly instead of asking")
+    args = parser.parse_args ()
+
     ### Step 1: create Leap_Synth object, sleep until its ready to go ###
-    leap_synth = Leap_Synth ()
+    frame_source = get_frame_source (args.source, args.speed or None)
+    leap_synth = Leap_Synth (args.transport, frame_source, args.stats_interval, not args.quiet_stats, args.stats_port)
+    leap_synth.pipelined                                = args.pipeline
+    leap_synth.max_hands                                = args.hands
+    leap_synth.incremental_training                     = not args.full
+    leap_synth.ring_size                                = args.ring_size
+    if args.log:
+        leap_synth.frame_log                            = Frame_Log_Writer (args.log)
+        leap_synth.frame_log.start ()
+    if args.window_lengths:
+        leap_synth.window_lengths                       = [int(length) for length in args.window_lengths.split (',')]
+    if args.stride or args.max_stride:
+        frame_reduction_const                           = get_frame_reduction_const (leap_synth.frame_interval)
+        leap_synth.scheduler                            = Classification_Scheduler (args.stride or frame_reduction_const, args.max_stride, args.max_stride is not None, cpu_budget=args.cpu_budget, frame_reduction_const=frame_reduction_const, window_lengths=leap_synth.window_lengths)
+    if args.gate:
+        leap_synth.motion_gate                          = Motion_Gate (args.gate_open, args.gate_close, args.gate_hold)
+    if args.segment:
+        leap_synth.segmenter                            = Gesture_Segmenter (args.gate_open, args.gate_close, args.gate_hold)
+    leap_synth.gesture_recognizer.num_training_workers  = args.workers
+    leap_synth.gesture_recognizer.hmm_random_seed       = args.seed
+    leap_synth.gesture_recognizer.print_hmm_diagnostics = not args.no_diagnostics
     time.sleep (0.7)
 
-    ### Step 2: enter main interface ###
-    leap_synth.interface_main ()
+    ### Step 2: enter main interface; whatever way it is left, write out the frame log ###
+    try:
+        leap_synth.interface_main (args.mode)
+    finally:
+        if leap_synth.frame_log:
+            leap_synth.frame_log.close ()
     
 
 